@@ -0,0 +1,211 @@
+"""Долгосрочные тренды питания на NumPy.
+
+История пользователя из daily_stats читается одним запросом в столбцовые
+массивы на непрерывной календарной шкале (дни без записей - нули с маской),
+после чего все ряды считаются векторно через накопленные суммы:
+скользящие средние калорий за 7/30 дней, доли БЖУ за 30 дней и их дрейф,
+серии дней подряд и отклонение от нормы калорий (nutrition_targets).
+
+Ряды кэшируются на пользователя вместе с версией дневника (users.diary_version)
+и пересчитываются, когда версия в БД изменилась - в том числе после записи
+в другом воркере. В своем процессе запись сбрасывается сразу после commit
+(mark_changed из daily_stats)."""
+from datetime import date
+
+import numpy as np
+from sqlalchemy import String, cast, event, select
+from sqlalchemy.orm import Session
+
+from cache import TTLCache
+from current_user import read_diary_version
+from models import db, DailyStat
+from nutrition_targets import KCAL_PER_GRAM
+
+MACROS = ('proteins', 'fats', 'carbs')
+_MACRO_KCAL = np.array([KCAL_PER_GRAM[name] for name in MACROS], dtype=float)
+
+# День "в норме", если калории отличаются от нормы не больше чем на 10%
+TARGET_TOLERANCE = 0.1
+
+_CHANGED_KEY = 'analytics_changed_users'
+_ALL_USERS = object()
+
+
+def mark_changed(user_id=None):
+    """Помечает итоги пользователя (None - всех) измененными в текущей транзакции"""
+    db.session.info.setdefault(_CHANGED_KEY, set()).add(_ALL_USERS if user_id is None else user_id)
+
+
+def load_history(user_id):
+    """Одним запросом загружает daily_stats пользователя в массивы по календарным дням.
+
+    Возвращает (days, values, logged): days - datetime64[D] от первого до последнего дня,
+    values - массив (5, n) граммов, калорий, белков, жиров, углеводов,
+    logged - маска дней с записями. Без истории - None."""
+    # Core-запрос без ORM; дата строкой 'ГГГГ-ММ-ДД' - numpy разбирает её
+    # на порядок быстрее, чем объекты date
+    stats = DailyStat.__table__
+    rows = db.session.connection().execute(
+        select(cast(stats.c.date, String), stats.c.total_grams, stats.c.total_calories,
+               stats.c.total_proteins, stats.c.total_fats, stats.c.total_carbs)
+        .where(stats.c.user_id == user_id)
+        .order_by(stats.c.date)
+    ).all()
+    if not rows:
+        return None
+
+    columns = list(zip(*rows))
+    stat_days = np.array(columns[0], dtype='datetime64[D]')
+    stat_values = np.nan_to_num(np.array(columns[1:], dtype=float))
+
+    offsets = (stat_days - stat_days[0]).astype(np.int64)
+    days = stat_days[0] + np.arange(offsets[-1] + 1)
+    values = np.zeros((stat_values.shape[0], days.size))
+    values[:, offsets] = stat_values
+    logged = np.zeros(days.size, dtype=bool)
+    logged[offsets] = (stat_values[0] > 0) | (stat_values[1] > 0)
+    return days, values, logged
+
+
+def rolling_sum(values, window):
+    """Сумма за последние window элементов (по последней оси) через накопленную сумму"""
+    cumsum = np.cumsum(values, axis=-1)
+    shifted = np.zeros_like(cumsum)
+    shifted[..., window:] = cumsum[..., :-window]
+    return cumsum - shifted
+
+
+def rolling_mean(values, logged, window):
+    """Среднее за окно по дням с записями; окно без записей - NaN"""
+    sums = rolling_sum(np.where(logged, values, 0), window)
+    counts = rolling_sum(logged.astype(float), window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def streaks(mask, alive=True):
+    """(текущая, самая длинная) серия True подряд; текущая - если серия доходит до конца
+    и alive (последний день истории - сегодня или вчера)"""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    lengths = edges[1::2] - edges[::2]
+    if not lengths.size:
+        return 0, 0
+    current = int(lengths[-1]) if alive and edges[-1] == mask.size else 0
+    return current, int(lengths.max())
+
+
+def _series(values):
+    """Массив -> список для JSON: округление до 0.1, NaN -> None"""
+    rounded = np.round(values, 1)
+    return np.where(np.isnan(rounded), None, rounded).tolist()
+
+
+def compute_trends(days, values, logged):
+    """Ряды, не зависящие от нормы калорий"""
+    calories = values[1]
+    macro_kcal = values[2:] * _MACRO_KCAL[:, None]
+    macro_30 = rolling_sum(macro_kcal * logged, 30)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        macro_percent = np.where(
+            macro_30.sum(axis=0) > 0, macro_30 * 100 / macro_30.sum(axis=0), np.nan
+        )
+
+    # Дрейф долей БЖУ: текущее 30-дневное окно против окна 30 днями ранее
+    if days.size > 30:
+        drift = macro_percent[:, -1] - macro_percent[:, -31]
+    else:
+        drift = np.full(len(MACROS), np.nan)
+
+    return {
+        'days': days,
+        'calories': np.where(logged, calories, np.nan),
+        'logged': logged,
+        'avg_7': rolling_mean(calories, logged, 7),
+        'avg_30': rolling_mean(calories, logged, 30),
+        'macro_percent_30': macro_percent,
+        'macro_drift_30': drift,
+    }
+
+
+class TrendAnalytics:
+    """Кэш трендов на пользователя поверх compute_trends"""
+
+    def __init__(self, maxsize=256, ttl=3600):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        event.listen(Session, 'after_commit', self._after_commit)
+        event.listen(Session, 'after_rollback', self._after_rollback)
+
+    def _after_commit(self, session):
+        for user_id in session.info.pop(_CHANGED_KEY, ()):
+            if user_id is _ALL_USERS:
+                self.cache.clear()
+            else:
+                self.cache.pop(user_id)
+
+    def _after_rollback(self, session):
+        session.info.pop(_CHANGED_KEY, None)
+
+    def invalidate(self, user_id):
+        self.cache.pop(user_id)
+
+    def trends(self, user_id):
+        version = read_diary_version(user_id)
+        cached = self.cache.get(user_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        history = load_history(user_id)
+        trends = compute_trends(*history) if history else {}
+        self.cache.set(user_id, (version, trends))
+        return trends
+
+    def report(self, user_id, target=None, last_days=365, today=None):
+        """Тренды за последние last_days дней истории + сводка для API"""
+        trends = self.trends(user_id)
+        if not trends:
+            return {'days': [], 'summary': None}
+
+        days, calories, logged = trends['days'], trends['calories'], trends['logged']
+        today = np.datetime64(today or date.today(), 'D')
+        alive = days[-1] >= today - 1
+        current, longest = streaks(logged, alive)
+
+        tail = slice(-last_days, None)
+        report = {
+            'days': np.datetime_as_string(days[tail]).tolist(),
+            'calories': _series(calories[tail]),
+            'avg_7': _series(trends['avg_7'][tail]),
+            'avg_30': _series(trends['avg_30'][tail]),
+            'macro_percent_30': {
+                name: _series(series[tail]) for name, series in zip(MACROS, trends['macro_percent_30'])
+            },
+        }
+        summary = {
+            'logged_days': int(logged.sum()),
+            'avg_7': _series(trends['avg_7'][-1:])[0],
+            'avg_30': _series(trends['avg_30'][-1:])[0],
+            'macro_drift_30': dict(zip(MACROS, _series(trends['macro_drift_30']))),
+            'streak_current': current,
+            'streak_longest': longest,
+        }
+
+        if target:
+            # Отклонение от нормы и серии дней в пределах TARGET_TOLERANCE
+            deviation = calories - target
+            on_target = logged & (np.abs(np.nan_to_num(deviation)) <= target * TARGET_TOLERANCE)
+            recent = logged[-30:]
+            report['deviation'] = _series(deviation[tail])
+            summary.update({
+                'target': target,
+                'avg_deviation_30': _series(
+                    np.array([deviation[-30:][recent].mean() if recent.any() else np.nan])
+                )[0],
+                'on_target_share_30': round(float(on_target[-30:].sum() / recent.sum()), 3) if recent.any() else None,
+                'on_target_streak_current': streaks(on_target, alive)[0],
+                'on_target_streak_longest': streaks(on_target)[1],
+            })
+
+        report['summary'] = summary
+        return report
+
+    def stats(self):
+        return self.cache.stats()
@@ -0,0 +1,113 @@
+"""Статические CSS/JS с отпечатком содержимого в URL и заранее сжатыми вариантами.
+
+При старте файлы static/css и static/js читаются в память, для каждого
+считается отпечаток (sha256 содержимого) и готовятся gzip и brotli варианты
+(brotli - если установлен пакет brotli). В шаблонах адрес берется через
+asset_url('css/style.css') -> /assets/<отпечаток>/css/style.css: такой URL
+меняется вместе с файлом, поэтому отдается с Cache-Control immutable на год.
+В режиме отладки измененный файл перечитывается при следующем запросе."""
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+
+from flask import abort, current_app, request, url_for
+
+try:
+    import brotli
+except ImportError:  # Без brotli отдаем gzip
+    brotli = None
+
+ASSET_DIRS = ('css', 'js')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Мелкие файлы не сжимаем - выигрыш меньше накладных расходов
+MIN_COMPRESS_SIZE = 512
+
+
+class Asset:
+
+    def __init__(self, path, data, mtime):
+        self.path = path
+        self.mtime = mtime
+        self.fingerprint = hashlib.sha256(data).hexdigest()[:16]
+        self.mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.variants = {'identity': data}
+        if len(data) >= MIN_COMPRESS_SIZE:
+            self.variants['gzip'] = gzip.compress(data, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.variants['br'] = brotli.compress(data, quality=11)
+
+    def choose(self, accept_encoding):
+        """Лучший вариант, который понимает клиент: (кодировка, байты)"""
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and accept_encoding[encoding]:
+                return encoding, self.variants[encoding]
+        return 'identity', self.variants['identity']
+
+
+class AssetManifest:
+    """Отпечатки и сжатые варианты файлов из static/css и static/js"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.assets = {}
+        self._lock = threading.Lock()
+        for subdir in ASSET_DIRS:
+            root = os.path.join(directory, subdir)
+            if not os.path.isdir(root):
+                continue
+            for name in sorted(os.listdir(root)):
+                self._load(f'{subdir}/{name}')
+
+    def _load(self, filename):
+        path = os.path.join(self.directory, *filename.split('/'))
+        with open(path, 'rb') as source:
+            data = source.read()
+        asset = Asset(filename, data, os.path.getmtime(path))
+        with self._lock:
+            self.assets[filename] = asset
+        return asset
+
+    def get(self, filename):
+        asset = self.assets.get(filename)
+        if asset is not None and current_app.debug:
+            path = os.path.join(self.directory, *filename.split('/'))
+            if os.path.getmtime(path) != asset.mtime:
+                asset = self._load(filename)
+        return asset
+
+    def url(self, filename):
+        asset = self.get(filename)
+        if asset is None:
+            # Файлы вне манифеста - обычной статикой
+            return url_for('static', filename=filename)
+        return url_for('asset', fingerprint=asset.fingerprint, filename=filename)
+
+    def view(self, fingerprint, filename):
+        asset = self.get(filename)
+        if asset is None:
+            abort(404)
+        encoding, body = asset.choose(request.accept_encodings)
+        response = current_app.response_class(body, mimetype=asset.mimetype)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.set_etag(f'{asset.fingerprint}-{encoding}')
+        # Устаревший отпечаток (страница от прошлой версии) - отдаем текущий файл, но не навсегда
+        response.headers['Cache-Control'] = IMMUTABLE if fingerprint == asset.fingerprint else 'no-cache'
+        return response.make_conditional(request)
+
+    def stats(self):
+        return {
+            'files': len(self.assets),
+            'brotli': brotli is not None,
+            'bytes': {encoding: sum(len(asset.variants.get(encoding, asset.variants['identity']))
+                                    for asset in self.assets.values())
+                      for encoding in ('identity', 'gzip') + (('br',) if brotli is not None else ())},
+        }
+
+    def init_app(self, app, path='/assets'):
+        app.add_url_rule(f'{path}/<fingerprint>/<path:filename>', 'asset', self.view)
+        app.jinja_env.globals['asset_url'] = self.url
+
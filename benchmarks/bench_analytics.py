@@ -0,0 +1,77 @@
+"""Бенчмарк analytics.py: 10 лет дневной статистики одного пользователя.
+
+Запуск из корня проекта:  python benchmarks/bench_analytics.py [--years 10] [--repeat 50]
+
+Меряет отдельно загрузку истории одним запросом, векторный расчет рядов,
+сборку отчета и ответ из кэша. База - SQLite в памяти."""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from analytics import TrendAnalytics, compute_trends, load_history
+from models import db, User, DailyStat
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), min(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        user = User(login='bench@example.com', password='-', age=30, height=180, weight=80, gender='male')
+        db.session.add(user)
+        db.session.commit()
+
+        # Пропускаем ~10% дней, чтобы были разрывы в сериях
+        first_day = date.today() - timedelta(days=365 * args.years)
+        rng = random.Random(1)
+        rows = [
+            {'user_id': user.id, 'date': first_day + timedelta(days=i),
+             'total_grams': rng.uniform(800, 2500), 'total_calories': rng.uniform(1500, 3200),
+             'total_proteins': rng.uniform(50, 200), 'total_fats': rng.uniform(40, 130),
+             'total_carbs': rng.uniform(150, 400)}
+            for i in range(365 * args.years + 1) if rng.random() > 0.1
+        ]
+        db.session.execute(DailyStat.__table__.insert(), rows)
+        db.session.commit()
+
+        analytics = TrendAnalytics()
+        history = load_history(user.id)
+        results = [
+            ('загрузка истории (1 запрос)', timed(lambda: load_history(user.id), args.repeat)),
+            ('расчет рядов', timed(lambda: compute_trends(*history), args.repeat)),
+            ('отчет без кэша', timed(lambda: (analytics.invalidate(user.id),
+                                              analytics.report(user.id, target=2500)), args.repeat)),
+            ('отчет из кэша', timed(lambda: analytics.report(user.id, target=2500), args.repeat)),
+        ]
+
+    print(f'{len(rows)} дней статистики ({args.years} лет), повторов: {args.repeat}')
+    for name, (median, best) in results:
+        print(f'{name:32} медиана {median:8.3f} мс   лучший {best:8.3f} мс')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Общее для бенчмарков: генератор данных, статистика замеров и запись результатов в JSON.
+
+seed_database заполняет базу N пользователей x M дней x K приемов пищи
+(детерминированно по seed) и пересобирает daily_stats и stat_rollups так же,
+как flask rebuild-stats. Вызывать внутри app_context приложения, к которому
+подключен models.db."""
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from models import db, User, Meal
+from daily_stats import rebuild_daily_stats
+
+BENCH_PASSWORD = 'bench-password'
+MEAL_TYPES = ('breakfast', 'lunch', 'dinner', 'snack')
+FOOD_NAMES = ('Овсянка', 'Гречка', 'Куриная грудка', 'Творог', 'Яблоко', 'Рис', 'Омлет',
+              'Салат', 'Борщ', 'Йогурт', 'Банан', 'Макароны', 'Сыр', 'Хлеб')
+
+# Вставка приемов пищи пачками - память не растет с объемом данных
+_INSERT_BATCH = 5000
+
+
+def bench_login(index):
+    return f'bench{index}@example.com'
+
+
+def seed_database(users=10, days=90, meals_per_day=4, seed=1, password_hash=None, end=None):
+    """Создает пользователей bench<i>@example.com (пароль BENCH_PASSWORD) с историей.
+
+    password_hash - готовый хеш пароля (хешировать медленной KDF один раз на всех).
+    Возвращает список id пользователей."""
+    rng = random.Random(seed)
+    end = end or date.today()
+    if password_hash is None:
+        from passwords import PasswordHasher
+        password_hash = PasswordHasher().hash(BENCH_PASSWORD)
+
+    accounts = [
+        User(login=bench_login(i), password=password_hash, age=rng.randint(18, 70),
+             height=rng.randint(150, 200), weight=rng.randint(50, 120),
+             gender=rng.choice(('male', 'female')))
+        for i in range(users)
+    ]
+    db.session.add_all(accounts)
+    db.session.commit()
+    user_ids = [user.id for user in accounts]
+
+    batch = []
+    for user_id in user_ids:
+        for offset in range(days):
+            day = end - timedelta(days=offset)
+            for _ in range(meals_per_day):
+                grams = rng.uniform(50, 400)
+                batch.append({
+                    'user_id': user_id, 'date': day, 'meal_type': rng.choice(MEAL_TYPES),
+                    'name': rng.choice(FOOD_NAMES), 'grams': round(grams, 1),
+                    'calories': round(grams * rng.uniform(0.5, 3.5), 1),
+                    'proteins': round(grams * rng.uniform(0.01, 0.25), 1),
+                    'fats': round(grams * rng.uniform(0.01, 0.2), 1),
+                    'carbs': round(grams * rng.uniform(0.02, 0.6), 1),
+                })
+                if len(batch) >= _INSERT_BATCH:
+                    db.session.execute(Meal.__table__.insert(), batch)
+                    batch = []
+    if batch:
+        db.session.execute(Meal.__table__.insert(), batch)
+    db.session.commit()
+    rebuild_daily_stats()
+    return user_ids
+
+
+def summarize(samples_ms):
+    """p50/p95/p99 и прочее по замерам в миллисекундах"""
+    if not samples_ms:
+        return {'count': 0}
+    ordered = sorted(samples_ms)
+
+    def percentile(fraction):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))], 3)
+
+    return {
+        'count': len(ordered),
+        'min': round(ordered[0], 3),
+        'mean': round(statistics.fmean(ordered), 3),
+        'stddev': round(statistics.pstdev(ordered), 3),
+        'p50': percentile(0.5),
+        'p95': percentile(0.95),
+        'p99': percentile(0.99),
+        'max': round(ordered[-1], 3),
+    }
+
+
+def measure(fn, rounds, warmup=1, setup=None):
+    """Как pytest-benchmark: прогрев, затем rounds замеров fn() (setup() - вне замера)"""
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+    samples = []
+    for _ in range(rounds):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return summarize(samples)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def write_results(path, kind, params, results):
+    """Результаты с окружением запуска - чтобы сравнивать прогоны между коммитами"""
+    document = {
+        'kind': kind,
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'params': params,
+        'results': results,
+    }
+    if path == '-':
+        json.dump(document, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+        return
+    with open(path, 'w', encoding='utf-8') as out:
+        json.dump(document, out, ensure_ascii=False, indent=2)
+    print(f'результаты записаны в {path}')
@@ -0,0 +1,88 @@
+"""Бенчмарк хеширования паролей: стоимость KDF против задержки входа.
+
+Запуск из корня проекта:
+    python benchmarks/bench_passwords.py [--scheme scrypt] [--log-n 14] [--workers 4] [--burst 64]
+    python benchmarks/bench_passwords.py --scheme pbkdf2_sha256 --iterations 600000
+
+Сначала меряется одиночная проверка пароля, затем "наплыв входов": --burst
+потоков (как воркеры веб-сервера) одновременно проверяют пароль через общий
+PasswordHasher. Печатаются p50/p99 задержки и сколько запросов отклонено
+из-за переполненной очереди - по ним подбираются стоимость и PASSWORD_HASH_*."""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passwords import PasswordHasher, PasswordHasherBusy
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scheme', default='scrypt', choices=['scrypt', 'pbkdf2_sha256'])
+    parser.add_argument('--log-n', type=int, default=14)
+    parser.add_argument('--r', type=int, default=8)
+    parser.add_argument('--p', type=int, default=1)
+    parser.add_argument('--iterations', type=int, default=600000)
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument('--queue', type=int, default=32)
+    parser.add_argument('--burst', type=int, default=64)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    hasher = PasswordHasher(
+        scheme=args.scheme, scrypt_log_n=args.log_n, scrypt_r=args.r, scrypt_p=args.p,
+        pbkdf2_iterations=args.iterations, workers=args.workers, queue_size=args.queue, timeout=60
+    )
+    stored = hasher.hash('correct horse battery staple')
+    print(f'схема {args.scheme} {hasher.stats()["params"]}, длина хеша {len(stored)}')
+
+    single = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        hasher.verify('correct horse battery staple', stored)
+        single.append((time.perf_counter() - started) * 1000)
+    print(f'одиночная проверка: медиана {statistics.median(single):.1f} мс')
+
+    latencies = []
+    rejected = []
+    lock = threading.Lock()
+    start = threading.Event()
+
+    def login():
+        start.wait()
+        started = time.perf_counter()
+        try:
+            hasher.verify('correct horse battery staple', stored)
+            outcome = latencies
+        except PasswordHasherBusy:
+            outcome = rejected
+        with lock:
+            outcome.append((time.perf_counter() - started) * 1000)
+
+    threads = [threading.Thread(target=login) for _ in range(args.burst)]
+    for thread in threads:
+        thread.start()
+    started = time.perf_counter()
+    start.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    print(f'наплыв из {args.burst} входов, пул {args.workers} + очередь {args.queue}: '
+          f'{elapsed:.2f} с, {len(latencies) / elapsed:.1f} входов/с')
+    if latencies:
+        print(f'  p50 {percentile(latencies, 0.5):.1f} мс   p99 {percentile(latencies, 0.99):.1f} мс')
+    print(f'  отклонено сразу: {len(rejected)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Микробенчмарки статистики и агрегатов дневника.
+
+Запуск из корня проекта:
+    python benchmarks/bench_stats.py [--users 20] [--days 365] [--meals 4] [--rounds 200] [--json out.json]
+
+База - временный файл SQLite, заполненный bench_common.seed_database. Каждый
+замер - прогрев и --rounds повторов, печатаются mean/p50/p95/p99 в мс, с --json -
+те же числа в файл для сравнения прогонов (python -m json.tool, jq, diff)."""
+import argparse
+import os
+import random
+import sys
+import tempfile
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_common import measure, seed_database, write_results
+
+from flask import Flask
+
+from daily_stats import (meal_snapshot, record_meal_change, recompute_daily_stat,
+                         recompute_daily_stats, rebuild_daily_stats)
+from diary import load_diary
+from models import db, Meal
+from nutrients import NutrientStore
+from nutrition_targets import compute_targets, progress_vs_target
+from rollups import load_stats_range
+from storage import configure_storage, install_sqlite_pragmas
+from fatsecret_stub import make_food
+
+
+def make_app(path, mode):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['DAILY_STATS_MODE'] = mode
+    configure_storage(app)
+    db.init_app(app)
+    with app.app_context():
+        install_sqlite_pragmas(db.engine, app.config)
+        db.create_all()
+    return app
+
+
+def add_meal(user_id, day):
+    # Путь записи /add_meal: прием пищи и итоги дня одним коммитом
+    meal = Meal(user_id=user_id, date=day, meal_type='lunch', name='bench', grams=150,
+                calories=300, proteins=20, fats=10, carbs=30)
+    db.session.add(meal)
+    record_meal_change(after=meal_snapshot(meal))
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--meals', type=int, default=4, help='Приемов пищи в день')
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--mode', default='incremental', choices=['incremental', 'recompute'])
+    parser.add_argument('--json', help='Файл для результатов ("-" - stdout)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-stats-')
+    app = make_app(os.path.join(workdir, 'bench.db'), args.mode)
+    today = date.today()
+    rng = random.Random(2)
+
+    with app.app_context():
+        user_ids = seed_database(args.users, args.days, args.meals, password_hash='-', end=today)
+        user_id = user_ids[0]
+        day = lambda: today - timedelta(days=rng.randrange(args.days))
+        week = [today - timedelta(days=i) for i in range(7)]
+        targets = compute_targets(30, 180, 80, 'male')
+        totals = [[rng.uniform(1500, 3000) for _ in range(30)] for _ in range(4)]
+
+        store = NutrientStore()
+        foods = [make_food(i) for i in range(1, 21)]
+        items = [(food, 150.0, None) for food in foods]
+
+        cases = [
+            ('add_meal + итоги дня (запись)', lambda: add_meal(user_id, day())),
+            ('recompute_daily_stat (один день)', lambda: (recompute_daily_stat(user_id, day()),
+                                                          db.session.commit())),
+            ('recompute_daily_stats (неделя)', lambda: (recompute_daily_stats(user_id, week),
+                                                        db.session.commit())),
+            ('load_diary (день)', lambda: load_diary(user_id, day())),
+            ('load_stats_range 30 дней по дням', lambda: load_stats_range(
+                user_id, today - timedelta(days=29), today, 'day')),
+            ('load_stats_range год по неделям', lambda: load_stats_range(
+                user_id, today - timedelta(days=364), today, 'week')),
+            ('load_stats_range год по месяцам', lambda: load_stats_range(
+                user_id, today - timedelta(days=364), today, 'month')),
+            ('progress_vs_target 30 дней', lambda: progress_vs_target(*totals, targets)),
+            ('NutrientStore.calculate (кэш)', lambda: store.calculate(foods[0], 150.0)),
+            ('NutrientStore.calculate_many 20 продуктов', lambda: store.calculate_many(items)),
+        ]
+        results = {}
+        for name, fn in cases:
+            results[name] = measure(fn, args.rounds)
+        # Полная пересборка дорогая - меряем несколько раз
+        results['rebuild_daily_stats (все пользователи)'] = measure(rebuild_daily_stats, max(3, args.rounds // 50))
+
+    print(f'{args.users} польз. x {args.days} дней x {args.meals} приемов, режим {args.mode}, '
+          f'повторов {args.rounds}')
+    for name, stats in results.items():
+        print(f"{name:44} mean {stats['mean']:8.3f}  p50 {stats['p50']:8.3f}  "
+              f"p95 {stats['p95']:8.3f}  p99 {stats['p99']:8.3f} мс")
+    if args.json:
+        params = {key: value for key, value in vars(args).items() if key != 'json'}
+        write_results(args.json, 'micro', params, results)
+
+
+if __name__ == '__main__':
+    main()
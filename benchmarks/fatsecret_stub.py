@@ -0,0 +1,129 @@
+"""Заглушка REST API FatSecret для нагрузочных тестов.
+
+Отвечает на foods.search и food.get в формате FatSecret (продукты
+детерминированно генерируются по запросу и food_id), подпись OAuth не
+проверяет. Задержка ответа и доля ошибок настраиваются.
+
+Отдельно:  python benchmarks/fatsecret_stub.py --port 8099 --latency 0.15 --jitter 0.05
+затем      FATSECRET_API_URL=http://127.0.0.1:8099/rest/server.api \\
+           FATSECRET_CONSUMER_KEY=x FATSECRET_CONSUMER_SECRET=x python main.py"""
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+API_PATH = '/rest/server.api'
+
+
+def make_food(food_id):
+    rng = random.Random(int(food_id))
+    per_100g = {
+        'calories': rng.uniform(20, 600), 'protein': rng.uniform(0, 40),
+        'fat': rng.uniform(0, 50), 'carbohydrate': rng.uniform(0, 80),
+    }
+    servings = []
+    for index, grams in enumerate((100, rng.choice((30, 150, 250)))):
+        servings.append(dict(
+            serving_id=str(int(food_id) * 10 + index),
+            serving_description=f'{grams} г',
+            metric_serving_amount=f'{grams:.3f}',
+            metric_serving_unit='g',
+            **{name: f'{value * grams / 100:.2f}' for name, value in per_100g.items()}
+        ))
+    return {'food_id': str(food_id), 'food_name': f'Stub food {food_id}', 'food_type': 'Generic',
+            'servings': {'serving': servings}}
+
+
+def search_foods(expression, max_results=12):
+    # Одинаковый запрос - одинаковые продукты
+    base = zlib.crc32(expression.lower().encode()) % 1000000
+    foods = []
+    for offset in range(max_results):
+        food = make_food(base * 100 + offset)
+        serving = food['servings']['serving'][0]
+        foods.append({
+            'food_id': food['food_id'],
+            'food_name': f'{expression} {offset}',
+            'food_type': 'Generic',
+            'food_description': f"Per 100g - Calories: {float(serving['calories']):.0f}kcal",
+        })
+    return foods
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != API_PATH:
+            return self._send(404, {'error': {'code': 404, 'message': 'not found'}})
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        server = self.server
+        delay = max(0.0, server.latency + random.uniform(-server.jitter, server.jitter))
+        if delay:
+            time.sleep(delay)
+        with server.lock:
+            server.requests += 1
+        if server.error_rate and random.random() < server.error_rate:
+            return self._send(503, {'error': {'code': 503, 'message': 'stub failure'}})
+
+        method = params.get('method')
+        if method == 'foods.search':
+            foods = search_foods(params.get('search_expression', ''), int(params.get('max_results', 12)))
+            return self._send(200, {'foods': {'food': foods, 'total_results': str(len(foods))}})
+        if method == 'food.get':
+            try:
+                return self._send(200, {'food': make_food(int(params.get('food_id', '')))})
+            except ValueError:
+                return self._send(200, {'error': {'code': 106, 'message': 'Invalid ID'}})
+        return self._send(200, {'error': {'code': 2, 'message': f'Unknown method {method}'}})
+
+
+def start_stub(host='127.0.0.1', port=0, latency=0.1, jitter=0.0, error_rate=0.0):
+    """Запускает заглушку в фоновом потоке. Возвращает (сервер, URL API)"""
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.jitter = jitter
+    server.error_rate = error_rate
+    server.requests = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}{API_PATH}'
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.1, help='Средняя задержка ответа, сек')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Разброс задержки +-, сек')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов 503')
+    args = parser.parse_args()
+
+    server, url = start_stub(args.host, args.port, args.latency, args.jitter, args.error_rate)
+    print(f'заглушка FatSecret: {url} (задержка {args.latency}+-{args.jitter} с, ошибок {args.error_rate:.0%})')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
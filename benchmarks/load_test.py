@@ -0,0 +1,213 @@
+"""Нагрузочный тест основных страниц и API с заглушкой FatSecret.
+
+Запуск из корня проекта (приложение поднимается в этом же процессе на временной
+базе, FatSecret заменен benchmarks/fatsecret_stub.py):
+    python benchmarks/load_test.py [--users 20] [--days 90] [--concurrency 8] [--duration 30]
+                                   [--stub-latency 0.15] [--json load.json]
+
+Против уже запущенного сервера (база заранее заполнена тем же генератором):
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/load_test.py --seed-only --users 20
+    python benchmarks/load_test.py --base-url http://127.0.0.1:5000 --users 20
+
+Каждый поток входит под своим пользователем bench<i>@example.com и в течение
+--duration секунд выбирает запросы по весам --mix. Итог по каждому эндпоинту:
+запросы/с, ошибки, p50/p95/p99 в мс; с --json - в файл для сравнения прогонов."""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+
+from bench_common import BENCH_PASSWORD, bench_login, summarize, write_results
+from fatsecret_stub import start_stub
+
+SEARCH_WORDS = ('apple', 'banana', 'chicken breast', 'rice', 'buckwheat', 'oatmeal', 'cheese',
+                'yogurt', 'salmon', 'egg', 'bread', 'pasta', 'potato', 'tomato', 'milk', 'beef')
+
+DEFAULT_MIX = 'index=30,add_meal=15,add_from_fatsecret=10,search_food=15,stats=15,api_stats=15'
+
+
+def endpoints(rng):
+    """Имя -> функция (session, base_url) -> response"""
+    def add_meal(session, base):
+        return session.post(f'{base}/add_meal', data={
+            'meal_type': rng.choice(('breakfast', 'lunch', 'dinner', 'snack')), 'name': 'load test',
+            'grams': 150, 'calories': 250, 'proteins': 12, 'fats': 8, 'carbs': 30,
+        }, allow_redirects=False)
+
+    def add_from_fatsecret(session, base):
+        return session.post(f'{base}/add-from-fatsecret', json={
+            'food_id': str(rng.randint(1, 500)), 'grams': rng.choice((50, 100, 150, 200)),
+            'meal_type': 'lunch',
+        })
+
+    def search_food(session, base):
+        return session.get(f'{base}/search-food',
+                           params={'query': rng.choice(SEARCH_WORDS), 'translate': '0'})
+
+    return {
+        'index': lambda session, base: session.get(f'{base}/index'),
+        'add_meal': add_meal,
+        'add_from_fatsecret': add_from_fatsecret,
+        'search_food': search_food,
+        'stats': lambda session, base: session.get(f'{base}/stats'),
+        'api_stats': lambda session, base: session.get(f'{base}/api/stats', params={'granularity': 'auto'}),
+    }
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def login(base, index):
+    session = requests.Session()
+    response = session.post(f'{base}/login', data={'email': bench_login(index), 'password': BENCH_PASSWORD},
+                            allow_redirects=False)
+    if response.status_code != 302:
+        raise SystemExit(f'не удалось войти как {bench_login(index)}: HTTP {response.status_code}')
+    return session
+
+
+def start_app(args):
+    """Поднимает main.app на временной базе в фоновом потоке. Возвращает (URL, заглушка)"""
+    stub, api_url = start_stub(latency=args.stub_latency, jitter=args.stub_jitter,
+                               error_rate=args.stub_error_rate)
+    workdir = tempfile.mkdtemp(prefix='bench-load-')
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    os.environ['FATSECRET_API_URL'] = api_url
+    os.environ.setdefault('FATSECRET_CONSUMER_KEY', 'stub')
+    os.environ.setdefault('FATSECRET_CONSUMER_SECRET', 'stub')
+    os.environ.setdefault('TRANSLATOR_BACKEND', 'stub')
+    # Кэш продуктов и каталог - во временном каталоге, а не в instance/ проекта
+    os.environ.setdefault('INSTANCE_PATH', workdir)
+
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    import main
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    seed(main, args)
+    server = make_server('127.0.0.1', 0, main.app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}', stub
+
+
+def seed(main, args):
+    from bench_common import seed_database
+    with main.app.app_context():
+        if main.User.query.filter_by(login=bench_login(0)).first() is None:
+            seed_database(args.users, args.days, args.meals,
+                          password_hash=main.hash_password(BENCH_PASSWORD))
+
+
+def run(base, args):
+    mix = parse_mix(args.mix)
+    unknown = set(mix) - set(endpoints(random.Random()))
+    if unknown:
+        raise SystemExit(f'неизвестные эндпоинты в --mix: {", ".join(sorted(unknown))}')
+    samples = {name: [] for name in mix}
+    errors = {name: 0 for name in mix}
+    lock = threading.Lock()
+    sessions = [login(base, i % args.users) for i in range(args.concurrency)]
+    start = threading.Barrier(args.concurrency + 1)
+
+    def worker(index):
+        rng = random.Random(index)
+        calls = endpoints(rng)
+        names, weights = list(mix), list(mix.values())
+        session = sessions[index]
+        for _ in range(args.warmup):
+            calls[rng.choices(names, weights)[0]](session, base)
+        start.wait()
+        deadline = time.monotonic() + args.duration
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                failed = calls[name](session, base).status_code >= 400
+            except requests.RequestException:
+                failed = True
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                samples[name].append(elapsed)
+                errors[name] += failed
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    results = {}
+    for name in mix:
+        stats = summarize(samples[name])
+        stats['errors'] = errors[name]
+        stats['rps'] = round(len(samples[name]) / elapsed, 2)
+        results[name] = stats
+    total = summarize([value for values in samples.values() for value in values])
+    total['errors'] = sum(errors.values())
+    total['rps'] = round(total['count'] / elapsed, 2)
+    results['total'] = total
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--base-url', help='Адрес запущенного сервера (иначе - в этом процессе)')
+    parser.add_argument('--seed-only', action='store_true', help='Только заполнить DATABASE_URL')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--meals', type=int, default=4, help='Приемов пищи в день')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30, help='Секунд')
+    parser.add_argument('--warmup', type=int, default=5, help='Запросов на поток до замера')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Веса эндпоинтов: имя=вес,...')
+    parser.add_argument('--stub-latency', type=float, default=0.15)
+    parser.add_argument('--stub-jitter', type=float, default=0.05)
+    parser.add_argument('--stub-error-rate', type=float, default=0.0)
+    parser.add_argument('--json', help='Файл для результатов ("-" - stdout)')
+    args = parser.parse_args()
+
+    if args.seed_only:
+        import main as app_main
+        seed(app_main, args)
+        print(f'создано пользователей: {args.users}, пароль {BENCH_PASSWORD}')
+        return
+
+    stub = None
+    base = args.base_url.rstrip('/') if args.base_url else None
+    if base is None:
+        base, stub = start_app(args)
+    results = run(base, args)
+
+    print(f'{args.concurrency} потоков, {args.duration:.0f} с, {args.users} польз. x {args.days} дней'
+          + (f', задержка FatSecret {args.stub_latency}+-{args.stub_jitter} с' if stub else ''))
+    for name, stats in results.items():
+        if not stats['count']:
+            continue
+        print(f"{name:20} {stats['rps']:8.1f} зап/с  ошибок {stats['errors']:5}  "
+              f"p50 {stats['p50']:8.1f}  p95 {stats['p95']:8.1f}  p99 {stats['p99']:8.1f} мс")
+    if stub:
+        print(f'запросов к заглушке FatSecret: {stub.requests}')
+    if args.json:
+        params = {key: value for key, value in vars(args).items() if key not in ('json', 'seed_only')}
+        write_results(args.json, 'load', params, results)
+
+
+if __name__ == '__main__':
+    main()
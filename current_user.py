@@ -0,0 +1,111 @@
+"""Текущий пользователь запроса без повторных SELECT по users.
+
+Страницам (index, dci, bmi, profile) нужны только поля профиля, поэтому
+вместо ORM-объекта отдается UserProfile: он один раз за запрос берется из
+flask.g, а между запросами - из TTL-кэша. Запись кэша сбрасывается после
+commit транзакции, в которой изменилась строка пользователя (в том числе
+bump_diary_version при записи приемов пищи). Сброс действует только в своем
+процессе, поэтому версию дневника для ETag и кэшей страниц берет diary_version() -
+из БД по первичному ключу."""
+from flask import g, session
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+
+from cache import TTLCache
+from models import db, User
+
+PROFILE_FIELDS = ('id', 'login', 'age', 'height', 'weight', 'gender', 'diary_version')
+
+_CHANGED_KEY = 'current_user_changed'
+
+
+def _changed_objects(session):
+    # В after_flush коллекции сессии еще в состоянии до сброса
+    yield from session.dirty
+    yield from session.deleted
+
+
+def bump_diary_version(user_id=None):
+    """+1 к версии дневника пользователя (None - всех) в текущей транзакции"""
+    statement = update(User).values(diary_version=User.diary_version + 1)
+    if user_id is not None:
+        statement = statement.where(User.id == user_id)
+    db.session.execute(statement, execution_options={'synchronize_session': False})
+    # UPDATE мимо ORM не попадает в session.dirty - отмечаем сами
+    db.session.info.setdefault(_CHANGED_KEY, set()).add(user_id)
+
+
+def read_diary_version(user_id):
+    """users.diary_version прямо из БД (поиск по первичному ключу). Кэш профиля сбрасывается
+    только в процессе, сделавшем commit, а эта версия одна для всех воркеров"""
+    return db.session.execute(select(User.diary_version).where(User.id == user_id)).scalar()
+
+
+class UserProfile:
+    """Только для чтения: поля профиля пользователя для шаблонов и расчетов"""
+    __slots__ = PROFILE_FIELDS
+
+    def __init__(self, **fields):
+        for name in PROFILE_FIELDS:
+            setattr(self, name, fields.get(name))
+
+
+class CurrentUserLoader:
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        event.listen(Session, 'after_flush', self._after_flush)
+        event.listen(Session, 'after_commit', self._after_commit)
+        event.listen(Session, 'after_rollback', self._after_rollback)
+
+    def _after_flush(self, session, flush_context):
+        changed = {obj.id for obj in _changed_objects(session) if isinstance(obj, User)}
+        if changed:
+            session.info.setdefault(_CHANGED_KEY, set()).update(changed)
+
+    def _after_commit(self, session):
+        changed = session.info.pop(_CHANGED_KEY, ())
+        if None in changed:
+            self.cache.clear()
+            return
+        for user_id in changed:
+            self.cache.pop(user_id)
+
+    def _after_rollback(self, session):
+        session.info.pop(_CHANGED_KEY, None)
+
+    def get(self, user_id):
+        profile = self.cache.get(user_id)
+        if profile is None:
+            row = db.session.execute(
+                select(*[getattr(User, name) for name in PROFILE_FIELDS]).where(User.id == user_id)
+            ).first()
+            if row is None:
+                return None
+            profile = UserProfile(**dict(zip(PROFILE_FIELDS, row)))
+            self.cache.set(user_id, profile)
+        return profile
+
+    def current(self):
+        """Пользователь из session['user_id'] - не больше одного запроса за HTTP-запрос"""
+        if 'current_user' not in g:
+            user_id = session.get('user_id')
+            g.current_user = self.get(user_id) if user_id is not None else None
+        return g.current_user
+
+    def diary_version(self):
+        """Версия дневника текущего пользователя прямо из БД - один запрос за HTTP-запрос.
+        Профиль в кэше со старой версией (запись в другом воркере) перечитывается"""
+        if 'diary_version' not in g:
+            user = self.current()
+            g.diary_version = read_diary_version(user.id) if user is not None else None
+            if user is not None and user.diary_version != g.diary_version:
+                self.cache.pop(user.id)
+                g.pop('current_user', None)
+        return g.diary_version
+
+    def invalidate(self, user_id):
+        self.cache.pop(user_id)
+
+    def stats(self):
+        return self.cache.stats()
@@ -0,0 +1,185 @@
+from datetime import date
+
+from flask import current_app
+from sqlalchemy import delete, func, insert, select
+
+from models import db, insert_on_conflict, Meal, DailyStat
+from rollups import rebuild_rollups, refresh_rollups
+from analytics import mark_changed
+from current_user import bump_diary_version
+
+# Колонка Meal -> колонка DailyStat
+STAT_COLUMNS = (
+    ('grams', 'total_grams'),
+    ('calories', 'total_calories'),
+    ('proteins', 'total_proteins'),
+    ('fats', 'total_fats'),
+    ('carbs', 'total_carbs'),
+)
+
+# Допустимое расхождение сумм при сверке (накопленная ошибка float)
+RECONCILE_TOLERANCE = 1e-6
+
+# Дней в одном запросе пакетного пересчета
+RECOMPUTE_CHUNK = 500
+
+
+def meal_snapshot(meal):
+    """Запоминает ключ дня и значения приема пищи - до изменения или после"""
+    values = {total: getattr(meal, column) or 0 for column, total in STAT_COLUMNS}
+    return meal.user_id, meal.date or date.today(), values
+
+
+def _upsert_daily_stat(user_id, day, values, set_):
+    """UPSERT строки дня по уникальному ключу uq_daily_stats_user_date + обновление сводок"""
+    db.session.execute(insert_on_conflict(
+        DailyStat, dict(user_id=user_id, date=day, **values), ['user_id', 'date'], set_
+    ))
+    refresh_rollups(user_id, day)
+    mark_changed(user_id)
+
+
+def apply_meal_delta(user_id, day, values, sign=1):
+    """Прибавляет (sign=1) или вычитает (sign=-1) значения приема пищи из итогов дня
+    одним UPSERT с SET total = total + ? в текущей транзакции"""
+    deltas = {total: sign * values[total] for _, total in STAT_COLUMNS}
+    _upsert_daily_stat(user_id, day, deltas, lambda excluded: {
+        total: func.coalesce(getattr(DailyStat, total), 0) + getattr(excluded, total)
+        for total in deltas
+    })
+
+
+def recompute_daily_stat(user_id, day):
+    """Полный пересчет итогов одного дня по таблице meals"""
+    db.session.flush()
+    sums = db.session.execute(
+        select(*[func.coalesce(func.sum(getattr(Meal, column)), 0) for column, _ in STAT_COLUMNS])
+        .where(Meal.user_id == user_id, Meal.date == day)
+    ).one()
+    values = {total: value for (_, total), value in zip(STAT_COLUMNS, sums)}
+    _upsert_daily_stat(user_id, day, values, lambda excluded: {
+        total: getattr(excluded, total) for total in values
+    })
+
+
+def recompute_daily_stats(user_id, days):
+    """Пакетный пересчет итогов многих дней пользователя (после импорта): на каждые
+    RECOMPUTE_CHUNK дней - DELETE и INSERT ... SELECT ... GROUP BY date, как в
+    rebuild_daily_stats; сводки пересчитываются по разу на неделю и месяц"""
+    db.session.flush()
+    days = sorted(set(days))
+    for i in range(0, len(days), RECOMPUTE_CHUNK):
+        chunk = days[i:i + RECOMPUTE_CHUNK]
+        db.session.execute(
+            delete(DailyStat).where(DailyStat.user_id == user_id, DailyStat.date.in_(chunk))
+        )
+        db.session.execute(insert(DailyStat).from_select(
+            ['user_id', 'date'] + [total for _, total in STAT_COLUMNS],
+            select(Meal.user_id, Meal.date,
+                   *[func.coalesce(func.sum(getattr(Meal, column)), 0) for column, _ in STAT_COLUMNS])
+            .where(Meal.user_id == user_id, Meal.date.in_(chunk))
+            .group_by(Meal.user_id, Meal.date)
+        ))
+    refresh_rollups(user_id, *days)
+    mark_changed(user_id)
+    bump_diary_version(user_id)
+
+
+def record_meal_change(before=None, after=None):
+    """Переносит изменение приема пищи в daily_stats в той же транзакции, что и сам прием пищи.
+
+    before/after - результаты meal_snapshot() до и после изменения
+    (None для добавления и удаления соответственно)."""
+    bump_diary_version((after or before)[0])
+    if current_app.config.get('DAILY_STATS_MODE', 'incremental') == 'recompute':
+        for key in {snap[:2] for snap in (before, after) if snap}:
+            recompute_daily_stat(*key)
+        return
+
+    if before and after and before[:2] == after[:2]:
+        user_id, day, new_values = after
+        old_values = before[2]
+        apply_meal_delta(user_id, day, {
+            total: new_values[total] - old_values[total] for _, total in STAT_COLUMNS
+        })
+        return
+
+    if before:
+        apply_meal_delta(*before, sign=-1)
+    if after:
+        apply_meal_delta(*after)
+
+
+def reconcile_daily_stats(user_id=None, since=None):
+    """Сверяет daily_stats с суммами по meals и исправляет расхождения.
+
+    Возвращает количество исправленных строк."""
+    sums_query = select(
+        Meal.user_id, Meal.date,
+        *[func.coalesce(func.sum(getattr(Meal, column)), 0) for column, _ in STAT_COLUMNS]
+    ).group_by(Meal.user_id, Meal.date)
+    stats_query = select(DailyStat)
+    if user_id is not None:
+        sums_query = sums_query.where(Meal.user_id == user_id)
+        stats_query = stats_query.where(DailyStat.user_id == user_id)
+    if since is not None:
+        sums_query = sums_query.where(Meal.date >= since)
+        stats_query = stats_query.where(DailyStat.date >= since)
+
+    expected = {
+        (row[0], row[1]): dict(zip((total for _, total in STAT_COLUMNS), row[2:]))
+        for row in db.session.execute(sums_query)
+    }
+    zero = {total: 0 for _, total in STAT_COLUMNS}
+
+    changed = []
+    for stat in db.session.scalars(stats_query):
+        values = expected.pop((stat.user_id, stat.date), zero)
+        if any(abs((getattr(stat, total) or 0) - value) > RECONCILE_TOLERANCE
+               for total, value in values.items()):
+            for total, value in values.items():
+                setattr(stat, total, value)
+            changed.append((stat.user_id, stat.date))
+
+    # Дни с приемами пищи, для которых строки статистики нет вовсе
+    for (stat_user_id, day), values in expected.items():
+        db.session.add(DailyStat(user_id=stat_user_id, date=day, **values))
+        changed.append((stat_user_id, day))
+
+    db.session.flush()
+    by_user = {}
+    for stat_user_id, day in changed:
+        by_user.setdefault(stat_user_id, []).append(day)
+    for stat_user_id, days in by_user.items():
+        refresh_rollups(stat_user_id, *days)
+        mark_changed(stat_user_id)
+        bump_diary_version(stat_user_id)
+    db.session.commit()
+    return len(changed)
+
+
+def rebuild_daily_stats(user_id=None):
+    """Пересобирает daily_stats с нуля: один INSERT ... SELECT ... GROUP BY user_id, date
+    в одной транзакции вместо пересчета по пользователям в Python.
+
+    Возвращает количество записанных строк."""
+    sums = select(
+        Meal.user_id, Meal.date,
+        *[func.coalesce(func.sum(getattr(Meal, column)), 0) for column, _ in STAT_COLUMNS]
+    ).where(Meal.date.is_not(None)).group_by(Meal.user_id, Meal.date)
+    delete_stats = delete(DailyStat)
+    if user_id is not None:
+        sums = sums.where(Meal.user_id == user_id)
+        delete_stats = delete_stats.where(DailyStat.user_id == user_id)
+
+    db.session.execute(delete_stats)
+    result = db.session.execute(
+        insert(DailyStat).from_select(
+            ['user_id', 'date'] + [total for _, total in STAT_COLUMNS], sums
+        )
+    )
+    rebuild_rollups(db.session.connection(), user_id=user_id)
+    mark_changed(user_id)
+    bump_diary_version(user_id)
+    db.session.commit()
+    return result.rowcount
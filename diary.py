@@ -0,0 +1,36 @@
+from sqlalchemy import func, select
+
+from models import db, Meal
+
+MEAL_TYPES = ('breakfast', 'lunch', 'dinner', 'snack')
+MEAL_TITLES = {'breakfast': 'Завтрак', 'lunch': 'Обед', 'dinner': 'Ужин', 'snack': 'Перекус'}
+
+_FOOD_COLUMNS = ('id', 'name', 'grams', 'calories', 'proteins', 'fats', 'carbs')
+
+
+def load_diary(user_id, day):
+    """Дневник за день: приемы пищи по типам и итоги одним запросом.
+
+    Выбираются только нужные колонки (без ORM-объектов), итоги по типу
+    приема пищи считает сама БД оконной функцией SUM() OVER (PARTITION BY meal_type)."""
+    by_type = Meal.meal_type
+    rows = db.session.execute(
+        select(
+            Meal.meal_type,
+            *[getattr(Meal, column) for column in _FOOD_COLUMNS],
+            func.coalesce(func.sum(Meal.calories).over(partition_by=by_type), 0),
+            func.coalesce(func.sum(Meal.grams).over(partition_by=by_type), 0),
+        )
+        .where(Meal.user_id == user_id, Meal.date == day, Meal.meal_type.in_(MEAL_TYPES))
+        .order_by(Meal.id)
+    )
+
+    diary = {meal_type: {'total': 0, 'grams': 0, 'foods': []} for meal_type in MEAL_TYPES}
+    for row in rows:
+        section = diary[row[0]]
+        section['foods'].append(dict(zip(_FOOD_COLUMNS, row[1:8])))
+        section['total'] = row[8]
+        section['grams'] = row[9]
+
+    diary['calories'] = sum(diary[meal_type]['total'] for meal_type in MEAL_TYPES)
+    return diary
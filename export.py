@@ -0,0 +1,89 @@
+"""Потоковая выгрузка дневника пользователя в CSV или NDJSON (опционально gzip).
+
+Строки читаются порциями (yield_per; на PostgreSQL - серверным курсором)
+и сразу отдаются клиенту генератором, поэтому память не зависит от длины
+истории, а заголовок CSV уходит до выполнения запроса."""
+import csv
+import io
+import json
+import zlib
+from datetime import date
+
+from sqlalchemy import select
+
+from models import db, Meal, DailyStat
+
+# Таблица -> (модель, выгружаемые колонки)
+EXPORTS = {
+    'meals': (Meal, ('id', 'date', 'meal_type', 'name', 'grams', 'calories', 'proteins', 'fats', 'carbs')),
+    'daily_stats': (DailyStat, ('date', 'total_grams', 'total_calories', 'total_proteins',
+                                'total_fats', 'total_carbs')),
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Строк за одно чтение из курсора и в одном отправляемом куске
+BATCH_SIZE = 1000
+
+
+def iter_rows(table, user_id):
+    """Строки таблицы пользователя порциями по BATCH_SIZE без загрузки всей истории"""
+    model, columns = EXPORTS[table]
+    order = [model.date, model.id]
+    result = db.session.execute(
+        select(*[getattr(model, column) for column in columns])
+        .where(model.user_id == user_id)
+        .order_by(*order)
+        .execution_options(yield_per=BATCH_SIZE)
+    )
+    try:
+        for batch in result.partitions():
+            yield batch
+    finally:
+        result.close()
+
+
+def _value(value):
+    return value.isoformat() if isinstance(value, date) else value
+
+
+def csv_chunks(table, user_id):
+    _, columns = EXPORTS[table]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    # BOM - чтобы Excel открыл кириллицу в UTF-8
+    writer.writerow(columns)
+    yield '\ufeff' + buffer.getvalue()
+
+    for batch in iter_rows(table, user_id):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_value(value) for value in row] for row in batch)
+        yield buffer.getvalue()
+
+
+def ndjson_chunks(table, user_id):
+    _, columns = EXPORTS[table]
+    for batch in iter_rows(table, user_id):
+        yield ''.join(
+            json.dumps(dict(zip(columns, map(_value, row))), ensure_ascii=False) + '\n'
+            for row in batch
+        )
+
+
+def gzip_chunks(chunks):
+    """Сжимает поток кусков в формат gzip на лету; каждый кусок дожимается
+    Z_SYNC_FLUSH, чтобы клиент получал данные сразу, а не после всего файла"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        yield compressor.compress(chunk.encode('utf-8')) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def export_stream(table, user_id, fmt='csv', gzip=False):
+    chunks = csv_chunks(table, user_id) if fmt == 'csv' else ndjson_chunks(table, user_id)
+    return gzip_chunks(chunks) if gzip else chunks
@@ -0,0 +1,200 @@
+"""Клиент FatSecret REST API с пулом соединений, таймаутами, повторами и предохранителем.
+
+Заменяет fatsecret.Fatsecret: те же методы foods_search/food_get, но
+- одна requests.Session с keep-alive пулом на все потоки;
+- жесткие таймауты на подключение и чтение;
+- ограниченное число повторов с экспоненциальной задержкой и jitter,
+  причем общее время вызова не превышает бюджета;
+- предохранитель (circuit breaker): после серии сбоев запросы сразу
+  отклоняются, не занимая воркер, пока FatSecret не восстановится.
+
+AsyncFatSecretGateway - asyncio-вариант для параллельных запросов."""
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests_oauthlib import OAuth1
+
+API_URL = 'https://platform.fatsecret.com/rest/server.api'
+
+
+class FatSecretError(Exception):
+    pass
+
+
+class FatSecretUnavailable(FatSecretError):
+    """FatSecret не ответил за отведенное время или предохранитель разомкнут"""
+
+
+class FatSecretApiError(FatSecretError):
+    def __init__(self, code, message):
+        super().__init__(f'{code}: {message}')
+        self.code = code
+        self.message = message
+
+
+class CircuitBreaker:
+    """Размыкается после failure_threshold сбоев подряд и через reset_timeout
+    пропускает одну пробную попытку (half-open)"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class FatSecretGateway:
+
+    def __init__(self, consumer_key, consumer_secret, connect_timeout=3.05, read_timeout=8,
+                 retries=2, backoff=0.2, max_backoff=2.0, budget=15, pool_size=20,
+                 breaker=None, on_request=None, api_url=API_URL):
+        self.api_url = api_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budget = budget
+        self.breaker = breaker or CircuitBreaker()
+        # on_request(method, seconds, outcome) - после каждой попытки (метрики)
+        self.on_request = on_request
+
+        self.session = requests.Session()
+        # FatSecret принимает OAuth 1.0 с подписью HMAC-SHA1 в параметрах запроса
+        self.session.auth = OAuth1(consumer_key, consumer_secret, signature_type='query')
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def close(self):
+        self.session.close()
+
+    def _sleep_before_retry(self, attempt, deadline):
+        # Full jitter: случайная задержка от 0 до экспоненциального предела
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if time.monotonic() + delay >= deadline:
+            return False
+        time.sleep(delay)
+        return True
+
+    def _observe(self, method, started, outcome):
+        if self.on_request is not None:
+            self.on_request(method, time.perf_counter() - started, outcome)
+
+    def call(self, method, **params):
+        """Выполняет метод REST API и возвращает разобранный JSON"""
+        params = {key: value for key, value in params.items() if value is not None}
+        params.update(method=method, format='json')
+        deadline = time.monotonic() + self.budget
+        last_error = None
+
+        for attempt in range(self.retries + 1):
+            # Попытка не должна выйти за бюджет: таймауты урезаются до оставшегося времени
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            timeout = tuple(min(limit, remaining) for limit in self.timeout)
+            started = time.perf_counter()
+            if not self.breaker.allow():
+                self._observe(method, started, 'rejected')
+                raise FatSecretUnavailable('FatSecret временно недоступен (предохранитель разомкнут)')
+
+            try:
+                response = self.session.get(self.api_url, params=params, timeout=timeout)
+                if response.status_code >= 500 or response.status_code == 429:
+                    raise requests.HTTPError(f'HTTP {response.status_code}', response=response)
+                data = response.json()
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError, ValueError) as e:
+                self._observe(method, started, 'timeout' if isinstance(e, requests.Timeout) else 'error')
+                self.breaker.record_failure()
+                last_error = e
+                if attempt == self.retries or not self._sleep_before_retry(attempt, deadline):
+                    break
+                continue
+
+            self.breaker.record_success()
+            error = data.get('error') if isinstance(data, dict) else None
+            self._observe(method, started, 'api_error' if error else 'ok')
+            if error:
+                raise FatSecretApiError(error.get('code'), error.get('message'))
+            return data
+
+        raise FatSecretUnavailable(f'FatSecret не ответил: {last_error or "бюджет времени исчерпан"}')
+
+    def foods_search(self, search_expression, page_number=None, max_results=None,
+                     region=None, language=None):
+        data = self.call('foods.search', search_expression=search_expression,
+                         page_number=page_number, max_results=max_results,
+                         region=region, language=language)
+        foods = (data.get('foods') or {}).get('food') or []
+        # При единственном результате API возвращает объект, а не список
+        return [foods] if isinstance(foods, dict) else foods
+
+    def food_get(self, food_id):
+        return self.call('food.get', food_id=food_id).get('food')
+
+
+class AsyncFatSecretGateway:
+    """asyncio-обертка: вызовы выполняются в ограниченном пуле потоков поверх
+    общего keep-alive пула соединений, не более max_concurrency одновременно"""
+
+    def __init__(self, gateway, max_concurrency=8):
+        self.gateway = gateway
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency,
+                                            thread_name_prefix='fatsecret')
+
+    async def _run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: fn(*args, **kwargs))
+
+    async def foods_search(self, search_expression, **kwargs):
+        return await self._run(self.gateway.foods_search, search_expression, **kwargs)
+
+    async def food_get(self, food_id):
+        return await self._run(self.gateway.food_get, food_id)
+
+    async def food_get_many(self, food_ids):
+        """Параллельно загружает несколько продуктов. Возвращает {food_id: продукт или исключение}"""
+        results = await asyncio.gather(
+            *[self.food_get(food_id) for food_id in food_ids],
+            return_exceptions=True
+        )
+        return dict(zip(food_ids, results))
@@ -0,0 +1,102 @@
+import json
+import sqlite3
+import threading
+import time
+
+from cache import TTLCache
+from storage import apply_pragmas
+
+
+class FoodStore:
+    """Постоянное хранилище ответов food.get в отдельной SQLite базе"""
+
+    def __init__(self, path, ttl=30 * 24 * 3600, pragmas=()):
+        self.path = path
+        self.ttl = ttl
+        self.pragmas = pragmas
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS food_details ('
+                ' food_id TEXT PRIMARY KEY,'
+                ' data TEXT NOT NULL,'
+                ' fetched_at REAL NOT NULL)'
+            )
+
+    def _connect(self):
+        # Каждому потоку своё соединение - sqlite3 не любит общие соединения
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            apply_pragmas(conn, self.pragmas)
+            self._local.conn = conn
+        return conn
+
+    def get(self, food_id):
+        row = self._connect().execute(
+            'SELECT data, fetched_at FROM food_details WHERE food_id = ?',
+            (food_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        data, fetched_at = row
+        if self.ttl and fetched_at + self.ttl < time.time():
+            return None
+        return json.loads(data)
+
+    def put(self, food_id, food):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO food_details (food_id, data, fetched_at) VALUES (?, ?, ?)',
+                (food_id, json.dumps(food, ensure_ascii=False), time.time())
+            )
+
+
+class FoodCache:
+    """Двухуровневый кэш деталей продуктов FatSecret: LRU в памяти поверх SQLite"""
+
+    def __init__(self, path, maxsize=1024, ttl=3600, persist_ttl=30 * 24 * 3600, pragmas=()):
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.store = FoodStore(path, ttl=persist_ttl, pragmas=pragmas)
+        self.store_hits = 0
+        self.misses = 0
+
+    def get(self, food_id):
+        food_id = str(food_id)
+        food = self.memory.get(food_id)
+        if food is not None:
+            return food
+
+        food = self.store.get(food_id)
+        if food is not None:
+            self.store_hits += 1
+            self.memory.set(food_id, food)
+            return food
+
+        self.misses += 1
+        return None
+
+    def put(self, food_id, food):
+        food_id = str(food_id)
+        self.memory.set(food_id, food)
+        self.store.put(food_id, food)
+
+    def get_or_fetch(self, food_id, fetch):
+        """Возвращает продукт из кэша, при промахе вызывает fetch(food_id) и сохраняет результат"""
+        food = self.get(food_id)
+        if food is None:
+            food = fetch(food_id)
+            if food:
+                self.put(food_id, food)
+        return food
+
+    def stats(self):
+        memory = self.memory.stats()
+        return {
+            'memory_hits': memory['hits'],
+            'store_hits': self.store_hits,
+            'misses': self.misses,
+            'evictions': memory['evictions'],
+            'memory_size': memory['size'],
+            'memory_maxsize': memory['maxsize'],
+        }
@@ -0,0 +1,211 @@
+import json
+import re
+import sqlite3
+import threading
+from difflib import SequenceMatcher
+from itertools import chain
+
+from nutrients import parse_food
+from storage import apply_pragmas
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+# Минимальная похожесть слов запроса на название продукта для нечёткого поиска.
+# При 0.75 проходили соседние слова из 4 букв (beef -> beer, milk -> mild)
+FUZZY_THRESHOLD = 0.85
+
+
+def _tokens(text):
+    return _WORD_RE.findall((text or '').lower())
+
+
+def _fts_phrase(token):
+    return '"' + token.replace('"', '""') + '"'
+
+
+def _similarity(query_tokens, name):
+    words = _tokens(name)
+    if not words:
+        return 0.0
+    # Опечатки в первой букве редки - слова с другой первой буквой не сравниваем
+    return sum(
+        max((SequenceMatcher(None, token, word).ratio() for word in words if word[0] == token[0]), default=0.0)
+        for token in query_tokens
+    ) / len(query_tokens)
+
+
+def describe_food(food):
+    """Строит food_description в формате foods.search по первой порции из food.get"""
+    try:
+        serving = parse_food(food).serving()
+    except ValueError:
+        return ''
+    calories, protein, fat, carbohydrate = (value * 100 for value in serving.per_gram)
+    return 'Per 100g - Calories: {:.0f}kcal | Fat: {:.2f}g | Carbs: {:.2f}g | Protein: {:.2f}g'.format(
+        calories, fat, carbohydrate, protein
+    )
+
+
+class FoodCatalog:
+    """Локальный полнотекстовый каталог продуктов (SQLite FTS5).
+
+    Пополняется продуктами, прошедшими через FatSecret, и дампами.
+    Поиск: сначала по префиксам слов (bm25), затем нечётко по триграммам
+    с доранжированием по похожести слов - это прощает опечатки."""
+
+    def __init__(self, path, pragmas=()):
+        self.path = path
+        self.pragmas = pragmas
+        self._local = threading.local()
+        self.fuzzy = True
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS catalog_foods ('
+                ' food_id TEXT PRIMARY KEY,'
+                ' food_name TEXT NOT NULL,'
+                ' brand_name TEXT,'
+                ' food_type TEXT,'
+                ' food_url TEXT,'
+                ' food_description TEXT)'
+            )
+            conn.execute(
+                'CREATE VIRTUAL TABLE IF NOT EXISTS catalog_fts USING fts5('
+                " food_name, brand_name, prefix='2 3')"
+            )
+            try:
+                conn.execute(
+                    'CREATE VIRTUAL TABLE IF NOT EXISTS catalog_trigram USING fts5('
+                    " food_name, tokenize='trigram')"
+                )
+            except sqlite3.OperationalError:
+                # Триграммный токенизатор есть только в SQLite >= 3.34
+                self.fuzzy = False
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            apply_pragmas(conn, self.pragmas)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def add(self, food):
+        self.add_many([food])
+
+    def add_many(self, foods):
+        """Добавляет или обновляет продукты (ответы food.get, элементы foods.search или записи дампа)"""
+        rows = []
+        for food in foods:
+            if not food or not food.get('food_id') or not food.get('food_name'):
+                continue
+            rows.append((
+                str(food['food_id']),
+                food['food_name'],
+                food.get('brand_name'),
+                food.get('food_type'),
+                food.get('food_url'),
+                food.get('food_description') or describe_food(food),
+            ))
+        if not rows:
+            return 0
+
+        conn = self._connect()
+        with conn:
+            for row in rows:
+                # UPSERT сохраняет rowid, по нему связаны FTS-таблицы
+                conn.execute(
+                    'INSERT INTO catalog_foods '
+                    '(food_id, food_name, brand_name, food_type, food_url, food_description) '
+                    'VALUES (?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT(food_id) DO UPDATE SET food_name = excluded.food_name, '
+                    'brand_name = excluded.brand_name, food_type = excluded.food_type, '
+                    'food_url = excluded.food_url, food_description = excluded.food_description',
+                    row
+                )
+                rowid = conn.execute(
+                    'SELECT rowid FROM catalog_foods WHERE food_id = ?', (row[0],)
+                ).fetchone()[0]
+                conn.execute('DELETE FROM catalog_fts WHERE rowid = ?', (rowid,))
+                conn.execute(
+                    'INSERT INTO catalog_fts (rowid, food_name, brand_name) VALUES (?, ?, ?)',
+                    (rowid, row[1], row[2] or '')
+                )
+                if self.fuzzy:
+                    conn.execute('DELETE FROM catalog_trigram WHERE rowid = ?', (rowid,))
+                    conn.execute(
+                        'INSERT INTO catalog_trigram (rowid, food_name) VALUES (?, ?)',
+                        (rowid, row[1])
+                    )
+        return len(rows)
+
+    def import_dump(self, fp, batch_size=1000):
+        """Импорт дампа: JSON-массив продуктов или по одному JSON-объекту на строку"""
+        head = fp.read(1)
+        while head and head.isspace():
+            head = fp.read(1)
+        if head == '[':
+            foods = json.loads(head + fp.read())
+            for i in range(0, len(foods), batch_size):
+                self.add_many(foods[i:i + batch_size])
+            return len(foods)
+
+        total = 0
+        batch = []
+        for line in chain([head + fp.readline()], fp):
+            line = line.strip()
+            if not line:
+                continue
+            batch.append(json.loads(line))
+            if len(batch) >= batch_size:
+                total += self.add_many(batch)
+                batch = []
+        total += self.add_many(batch)
+        return total
+
+    def search(self, query, limit=12, fuzzy=True):
+        """fuzzy=False - только совпадения по префиксам слов (без нечётких добавок)"""
+        tokens = _tokens(query)
+        if not tokens:
+            return []
+
+        conn = self._connect()
+        match = ' AND '.join(_fts_phrase(token) + '*' for token in tokens)
+        rows = conn.execute(
+            'SELECT f.* FROM catalog_fts '
+            'JOIN catalog_foods f ON f.rowid = catalog_fts.rowid '
+            'WHERE catalog_fts MATCH ? ORDER BY bm25(catalog_fts) LIMIT ?',
+            (match, limit)
+        ).fetchall()
+        results = [dict(row) for row in rows]
+
+        if len(results) < limit and fuzzy and self.fuzzy:
+            seen = {food['food_id'] for food in results}
+            results.extend(self._fuzzy_search(conn, tokens, seen, limit - len(results)))
+        return results
+
+    def _fuzzy_search(self, conn, tokens, seen, limit):
+        trigrams = {token[i:i + 3] for token in tokens for i in range(len(token) - 2)}
+        if not trigrams:
+            return []
+        match = ' OR '.join(_fts_phrase(trigram) for trigram in trigrams)
+        rows = conn.execute(
+            'SELECT f.* FROM catalog_trigram '
+            'JOIN catalog_foods f ON f.rowid = catalog_trigram.rowid '
+            'WHERE catalog_trigram MATCH ? ORDER BY bm25(catalog_trigram) LIMIT 200',
+            (match,)
+        ).fetchall()
+
+        scored = []
+        for row in rows:
+            if row['food_id'] in seen:
+                continue
+            score = _similarity(tokens, row['food_name'])
+            if score >= FUZZY_THRESHOLD:
+                scored.append((score, dict(row)))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [food for _, food in scored[:limit]]
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM catalog_foods').fetchone()[0]
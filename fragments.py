@@ -0,0 +1,26 @@
+"""Кэш отрисованных фрагментов страниц.
+
+Фрагмент - готовый HTML блока (например, карточка приема пищи на главной).
+Ключ включает все, от чего блок зависит: для дневника это id пользователя,
+users.diary_version и дата, так что любая запись приемов пищи дает новый ключ
+и старые фрагменты просто вытесняются по LRU/TTL - явный сброс не нужен."""
+from markupsafe import Markup
+
+from cache import TTLCache
+
+
+class FragmentCache:
+
+    def __init__(self, maxsize=4096, ttl=3600):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def fragment(self, key, render):
+        """HTML фрагмента по ключу; при промахе вызывает render() и запоминает результат"""
+        html = self.cache.get(key)
+        if html is None:
+            html = Markup(render())
+            self.cache.set(key, html)
+        return html
+
+    def stats(self):
+        return self.cache.stats()
@@ -0,0 +1,61 @@
+"""Условные GET: ETag и ответ 304 без рендеринга шаблона и запросов к БД.
+
+ETag страницы строится из того, от чего зависит ответ: версия дневника
+пользователя (users.diary_version, растет при каждой записи приемов пищи),
+поля профиля, дата, параметры запроса и версия кода и шаблонов. Профиль берется
+из кэша (current_user.py), а версия дневника - одним запросом по первичному ключу,
+чтобы запись в другом воркере сразу меняла ETag. На совпавший If-None-Match
+представление не вызывается вовсе."""
+import hashlib
+import os
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+
+# Для страниц пользователя: браузер хранит копию, но каждый раз сверяет ETag
+PRIVATE_REVALIDATE = 'private, no-cache'
+
+
+def code_version(*directories):
+    """Хеш исходников, шаблонов и статики: после выкладки ETag меняются, а воркеры одной версии дают одинаковые"""
+    digest = hashlib.sha1()
+    for directory in directories:
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(('.py', '.html', '.css', '.js')):
+                with open(os.path.join(directory, name), 'rb') as source:
+                    digest.update(name.encode())
+                    digest.update(source.read())
+    return digest.hexdigest()[:12]
+
+
+def make_etag(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:32]
+
+
+def conditional(etag_parts, cache_control=PRIVATE_REVALIDATE):
+    """Декоратор представления: etag_parts(*args, **kwargs) -> кортеж, от которого зависит
+    ответ, или None - тогда ответ не кэшируется. ETag и Cache-Control ставятся только на 200."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            parts = etag_parts(*args, **kwargs)
+            # Флеш-сообщения показываются один раз - такой ответ не кэшируем
+            if parts is None or '_flashes' in session:
+                return view(*args, **kwargs)
+
+            etag = make_etag(current_app.config.get('ETAG_VERSION'), *parts)
+            if request.if_none_match.contains(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = cache_control
+            return response
+
+        return wrapper
+
+    return decorator
@@ -1,99 +1,317 @@
+import io
 import os
-import fatsecret
+import asyncio
 import requests
 import sys
 from urllib.parse import quote, urlencode
 from pathlib import Path
 from datetime import datetime
-from datetime import date
+from datetime import date, timedelta
 from requests_oauthlib import OAuth1
-from fatsecret import Fatsecret
-from flask import Flask, abort, flash, render_template, request, redirect, url_for, session, request, jsonify
-from flask_sqlalchemy import SQLAlchemy
+from fatsecret_gateway import API_URL, FatSecretGateway, AsyncFatSecretGateway, CircuitBreaker, FatSecretUnavailable
+from flask import Flask, Response, abort, flash, render_template, request, redirect, url_for, session, request, jsonify, stream_with_context
+from models import db, User, Meal, DailyStat, Recipe
+from diary import MEAL_TITLES, MEAL_TYPES, load_diary
+from storage import configure_storage, install_sqlite_pragmas, sqlite_pragmas
+from migrations import upgrade as upgrade_schema, explain_hot_queries
+from meal_import import import_meals
+from export import EXPORTS, FORMATS, export_stream
+from current_user import PROFILE_FIELDS, CurrentUserLoader
+from http_cache import code_version, conditional
+from assets import AssetManifest
+from fragments import FragmentCache
+from jinja2 import FileSystemBytecodeCache
+from analytics import TrendAnalytics
+from nutrition_targets import ACTIVITY_LEVELS, FORMULAS, progress_vs_target, targets_for
+from rollups import GRANULARITIES, choose_granularity, load_stats_range
+from daily_stats import (meal_snapshot, record_meal_change, recompute_daily_stat,
+                         reconcile_daily_stats, rebuild_daily_stats)
 import decimal
-import hashlib  # Для хеширования паролей
+from passwords import PasswordHasher, PasswordHasherBusy
+from metrics import Metrics
+from sessions import ServerSessionInterface, create_store, login_required
+from food_cache import FoodCache
+from nutrients import NutrientStore
+from recipes import (MAX_INGREDIENTS, meal_from_recipe, new_recipe, parse_ingredient, parse_ingredients,
+                     recipe_as_dict, recompute_recipe)
+from search_cache import SearchCache
+from food_catalog import FoodCatalog
+from translation import Translator, TranslationStore, GoogleTranslateBackend, StubTranslator
+import click
 
-app = Flask(__name__)
+# Каталог instance (nutrition.db, foods.db) можно переопределить абсолютным путем INSTANCE_PATH
+app = Flask(__name__, instance_path=os.getenv('INSTANCE_PATH') or None)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///nutrition.db'  # Используем существующую БД
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key')
+# Кэш деталей продуктов FatSecret (секунды / количество записей)
+app.config['FOOD_CACHE_SIZE'] = int(os.getenv('FOOD_CACHE_SIZE', 2048))
+app.config['FOOD_CACHE_TTL'] = int(os.getenv('FOOD_CACHE_TTL', 3600))
+app.config['FOOD_CACHE_PERSIST_TTL'] = int(os.getenv('FOOD_CACHE_PERSIST_TTL', 30 * 24 * 3600))
+# Кэш результатов поиска FatSecret
+app.config['SEARCH_CACHE_SIZE'] = int(os.getenv('SEARCH_CACHE_SIZE', 1024))
+app.config['SEARCH_CACHE_TTL'] = int(os.getenv('SEARCH_CACHE_TTL', 600))
+# Сколько результатов из локального каталога достаточно, чтобы не ходить в FatSecret
+app.config['CATALOG_MIN_RESULTS'] = int(os.getenv('CATALOG_MIN_RESULTS', 3))
+# 'incremental' - итоги дня меняются дельтой в той же транзакции, 'recompute' - полный пересчет дня
+app.config['DAILY_STATS_MODE'] = os.getenv('DAILY_STATS_MODE', 'incremental')
+# Клиент FatSecret: таймауты (сек), повторы, общий бюджет времени на вызов, пул соединений, предохранитель
+app.config['FATSECRET_CONNECT_TIMEOUT'] = float(os.getenv('FATSECRET_CONNECT_TIMEOUT', 3.05))
+app.config['FATSECRET_READ_TIMEOUT'] = float(os.getenv('FATSECRET_READ_TIMEOUT', 8))
+app.config['FATSECRET_RETRIES'] = int(os.getenv('FATSECRET_RETRIES', 2))
+app.config['FATSECRET_BUDGET'] = float(os.getenv('FATSECRET_BUDGET', 15))
+app.config['FATSECRET_POOL_SIZE'] = int(os.getenv('FATSECRET_POOL_SIZE', 20))
+app.config['FATSECRET_BREAKER_THRESHOLD'] = int(os.getenv('FATSECRET_BREAKER_THRESHOLD', 5))
+app.config['FATSECRET_BREAKER_RESET'] = float(os.getenv('FATSECRET_BREAKER_RESET', 30))
+app.config['FATSECRET_CONCURRENCY'] = int(os.getenv('FATSECRET_CONCURRENCY', 8))
+# Адрес REST API FatSecret (для нагрузочных тестов - заглушка benchmarks/fatsecret_stub.py)
+app.config['FATSECRET_API_URL'] = os.getenv('FATSECRET_API_URL', API_URL)
+# Перевод запросов на сервере: 'google' или 'stub' (словарь без сети)
+app.config['TRANSLATOR_BACKEND'] = os.getenv('TRANSLATOR_BACKEND', 'google')
+app.config['TRANSLATOR_TIMEOUT'] = float(os.getenv('TRANSLATOR_TIMEOUT', 2))
+# Максимум продуктов в одном запросе /api/foods/batch
+app.config['FOODS_BATCH_MAX'] = int(os.getenv('FOODS_BATCH_MAX', 24))
+# Кэш трендов /api/analytics/trends (на пользователя, сбрасывается при записи приемов пищи)
+app.config['ANALYTICS_CACHE_SIZE'] = int(os.getenv('ANALYTICS_CACHE_SIZE', 256))
+app.config['ANALYTICS_CACHE_TTL'] = int(os.getenv('ANALYTICS_CACHE_TTL', 3600))
+# Кэш полей профиля текущего пользователя (сбрасывается при изменении пользователя)
+app.config['USER_CACHE_SIZE'] = int(os.getenv('USER_CACHE_SIZE', 1024))
+app.config['USER_CACHE_TTL'] = int(os.getenv('USER_CACHE_TTL', 300))
+# Хеширование паролей: схема 'scrypt' или 'pbkdf2_sha256', стоимость, размер пула и очереди
+app.config['PASSWORD_SCHEME'] = os.getenv('PASSWORD_SCHEME', 'scrypt')
+app.config['PASSWORD_SCRYPT_LOG_N'] = int(os.getenv('PASSWORD_SCRYPT_LOG_N', 14))
+app.config['PASSWORD_SCRYPT_R'] = int(os.getenv('PASSWORD_SCRYPT_R', 8))
+app.config['PASSWORD_SCRYPT_P'] = int(os.getenv('PASSWORD_SCRYPT_P', 1))
+app.config['PASSWORD_PBKDF2_ITERATIONS'] = int(os.getenv('PASSWORD_PBKDF2_ITERATIONS', 600000))
+app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1)))
+app.config['PASSWORD_HASH_QUEUE'] = int(os.getenv('PASSWORD_HASH_QUEUE', 32))
+app.config['PASSWORD_HASH_TIMEOUT'] = float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
+# Серверные сессии: хранилище 'sqlite', 'memory' или 'redis', скользящий срок (сек),
+# как часто продлевать срок в хранилище и сколько держать сессию в кэше процесса
+app.config['SESSION_BACKEND'] = os.getenv('SESSION_BACKEND', 'sqlite')
+app.config['SESSION_REDIS_URL'] = os.getenv('SESSION_REDIS_URL', 'redis://localhost:6379/0')
+app.config['SESSION_LIFETIME'] = int(os.getenv('SESSION_LIFETIME', 14 * 24 * 3600))
+app.config['SESSION_REFRESH'] = int(os.getenv('SESSION_REFRESH', 300))
+app.config['SESSION_CACHE_SIZE'] = int(os.getenv('SESSION_CACHE_SIZE', 10000))
+app.config['SESSION_CACHE_TTL'] = int(os.getenv('SESSION_CACHE_TTL', 30))
+# HTTP-кэш: версия для ETag (по умолчанию - хеш кода и шаблонов) и срок кэширования деталей продуктов
+app.config['ETAG_VERSION'] = os.getenv('ETAG_VERSION') or code_version(
+    app.root_path, *[os.path.join(app.root_path, *parts) for parts in (('templates',), ('static', 'css'), ('static', 'js'))]
+)
+app.config['FOOD_DETAILS_MAX_AGE'] = int(os.getenv('FOOD_DETAILS_MAX_AGE', 7 * 24 * 3600))
+# Шаблоны: скомпилированный байткод на диске (instance/jinja-cache), кэш отрисованных блоков дневника
+app.config['TEMPLATE_BYTECODE_CACHE'] = os.getenv('TEMPLATE_BYTECODE_CACHE', '1') == '1'
+app.config['FRAGMENT_CACHE_SIZE'] = int(os.getenv('FRAGMENT_CACHE_SIZE', 4096))
+app.config['FRAGMENT_CACHE_TTL'] = int(os.getenv('FRAGMENT_CACHE_TTL', 3600))
+# Метрики Prometheus на /metrics (0 - выключены, без накладных расходов)
+app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', '1') == '1'
 
-CONSUMER_KEY = ''
-CONSUMER_SECRET = ''
+metrics = Metrics(enabled=app.config['METRICS_ENABLED'])
+metrics.init_app(app)
+
+CONSUMER_KEY = os.getenv('FATSECRET_CONSUMER_KEY', '')
+CONSUMER_SECRET = os.getenv('FATSECRET_CONSUMER_SECRET', '')
 
 if CONSUMER_KEY and CONSUMER_SECRET:
-    fs = fatsecret.Fatsecret(CONSUMER_KEY, CONSUMER_SECRET)
+    fs = FatSecretGateway(
+        CONSUMER_KEY, CONSUMER_SECRET,
+        connect_timeout=app.config['FATSECRET_CONNECT_TIMEOUT'],
+        read_timeout=app.config['FATSECRET_READ_TIMEOUT'],
+        retries=app.config['FATSECRET_RETRIES'],
+        budget=app.config['FATSECRET_BUDGET'],
+        pool_size=app.config['FATSECRET_POOL_SIZE'],
+        breaker=CircuitBreaker(
+            failure_threshold=app.config['FATSECRET_BREAKER_THRESHOLD'],
+            reset_timeout=app.config['FATSECRET_BREAKER_RESET']
+        ),
+        on_request=metrics.fatsecret_observer(),
+        api_url=app.config['FATSECRET_API_URL']
+    )
+    fs_async = AsyncFatSecretGateway(fs, max_concurrency=app.config['FATSECRET_CONCURRENCY'])
     print("✅ FatSecret инициализирован")
 else:
     print("❌ Ключи FatSecret не найдены")
     fs = None
+    fs_async = None
+
+configure_storage(app)
+db.init_app(app)
+
+with app.app_context():
+    install_sqlite_pragmas(db.engine, app.config)
+    metrics.instrument_engine(db.engine)
+    db.create_all()
+    upgrade_schema(db.engine)
+
+os.makedirs(app.instance_path, exist_ok=True)
+if app.config['TEMPLATE_BYTECODE_CACHE']:
+    # Воркеры после перезапуска не компилируют шаблоны заново
+    os.makedirs(os.path.join(app.instance_path, 'jinja-cache'), exist_ok=True)
+    app.jinja_options = {**app.jinja_options,
+                         'bytecode_cache': FileSystemBytecodeCache(os.path.join(app.instance_path, 'jinja-cache'))}
+assets = AssetManifest(app.static_folder)
+assets.init_app(app)
+fragment_cache = FragmentCache(
+    maxsize=app.config['FRAGMENT_CACHE_SIZE'],
+    ttl=app.config['FRAGMENT_CACHE_TTL']
+)
+app.session_interface = ServerSessionInterface(
+    create_store(
+        app.config['SESSION_BACKEND'],
+        path=os.path.join(app.instance_path, 'sessions.db'),
+        redis_url=app.config['SESSION_REDIS_URL'],
+        pragmas=sqlite_pragmas(app.config)
+    ),
+    lifetime=app.config['SESSION_LIFETIME'],
+    refresh=app.config['SESSION_REFRESH'],
+    cache_size=app.config['SESSION_CACHE_SIZE'],
+    cache_ttl=app.config['SESSION_CACHE_TTL']
+)
+food_cache = FoodCache(
+    os.path.join(app.instance_path, 'foods.db'),
+    maxsize=app.config['FOOD_CACHE_SIZE'],
+    ttl=app.config['FOOD_CACHE_TTL'],
+    persist_ttl=app.config['FOOD_CACHE_PERSIST_TTL'],
+    pragmas=sqlite_pragmas(app.config)
+)
+search_cache = SearchCache(
+    maxsize=app.config['SEARCH_CACHE_SIZE'],
+    ttl=app.config['SEARCH_CACHE_TTL']
+)
+food_catalog = FoodCatalog(os.path.join(app.instance_path, 'foods.db'), pragmas=sqlite_pragmas(app.config))
+
+translator = Translator(
+    TranslationStore(os.path.join(app.instance_path, 'foods.db'), pragmas=sqlite_pragmas(app.config)),
+    GoogleTranslateBackend(timeout=app.config['TRANSLATOR_TIMEOUT'])
+    if app.config['TRANSLATOR_BACKEND'] == 'google' else StubTranslator()
+)
+
+user_loader = CurrentUserLoader(
+    maxsize=app.config['USER_CACHE_SIZE'],
+    ttl=app.config['USER_CACHE_TTL']
+)
+
+password_hasher = PasswordHasher(
+    scheme=app.config['PASSWORD_SCHEME'],
+    scrypt_log_n=app.config['PASSWORD_SCRYPT_LOG_N'],
+    scrypt_r=app.config['PASSWORD_SCRYPT_R'],
+    scrypt_p=app.config['PASSWORD_SCRYPT_P'],
+    pbkdf2_iterations=app.config['PASSWORD_PBKDF2_ITERATIONS'],
+    workers=app.config['PASSWORD_HASH_WORKERS'],
+    queue_size=app.config['PASSWORD_HASH_QUEUE'],
+    timeout=app.config['PASSWORD_HASH_TIMEOUT']
+)
+
+nutrient_store = NutrientStore(maxsize=app.config['FOOD_CACHE_SIZE'])
+
+trend_analytics = TrendAnalytics(
+    maxsize=app.config['ANALYTICS_CACHE_SIZE'],
+    ttl=app.config['ANALYTICS_CACHE_TTL']
+)
+
+def food_cache_counters():
+    # Попадание - из памяти или из SQLite-хранилища
+    stats = food_cache.stats()
+    return {'hits': stats['memory_hits'] + stats['store_hits'], 'misses': stats['misses'],
+            'size': stats['memory_size']}
+
+metrics.register_cache('food', food_cache_counters)
+metrics.register_cache('search', search_cache.stats)
+metrics.register_cache('translations', translator.stats)
+metrics.register_cache('nutrients', nutrient_store.results.stats)
+metrics.register_cache('users', user_loader.stats)
+metrics.register_cache('analytics', trend_analytics.stats)
+metrics.register_cache('fragments', fragment_cache.stats)
+if app.session_interface.cache is not None:
+    metrics.register_cache('sessions', app.session_interface.cache.stats)
+
+def fatsecret_search_upstream(query, region, language, max_results):
+    foods = fs.foods_search(query, max_results=max_results, region=region, language=language)
+    food_catalog.add_many(foods)
+    return foods
 
-db = SQLAlchemy(app)
+def fatsecret_food_upstream(food_id):
+    food = fs.food_get(food_id)
+    if food:
+        food_catalog.add(food)
+    return food
 
-# Функция для хеширования паролей (базовое хеширование)
+def diary_etag(*args, **kwargs):
+    """Страницы дневника зависят от профиля, версии дневника, даты и параметров запроса.
+    Версия читается из БД: кэш профиля в других воркерах может быть старым"""
+    version = user_loader.diary_version()
+    user = user_loader.current()
+    if user is None:
+        return None
+    return tuple(getattr(user, name) for name in PROFILE_FIELDS) + (
+        version, date.today().isoformat(), request.full_path
+    )
+
+def food_etag(food_id):
+    # Данные FatSecret о продукте не меняются - достаточно id и параметров
+    return 'food', food_id, request.full_path
+
+def index_etag():
+    # В шапке главной - текущее время, поэтому ETag живет не дольше минуты
+    parts = diary_etag()
+    return parts and parts + (datetime.now().strftime('%H:%M'),)
+
+FOOD_CACHE_CONTROL = f"public, max-age={app.config['FOOD_DETAILS_MAX_AGE']}"
+
+def load_food(food_id):
+    """Детали продукта из кэша, при промахе - из FatSecret (если он настроен)"""
+    return food_cache.get_or_fetch(food_id, fatsecret_food_upstream) if fs else food_cache.get(food_id)
+
+@app.cli.command('import-foods')
+@click.argument('dump', type=click.File('r', encoding='utf-8'))
+def import_foods_command(dump):
+    """Загружает дамп продуктов (JSON-массив или NDJSON) в локальный каталог"""
+    count = food_catalog.import_dump(dump)
+    click.echo(f'Импортировано продуктов: {count}, всего в каталоге: {len(food_catalog)}')
+
+@app.cli.command('purge-sessions')
+def purge_sessions_command():
+    """Удаляет истекшие сессии из хранилища"""
+    click.echo(f'Удалено сессий: {app.session_interface.store.purge_expired()}')
+
+@app.cli.command('import-meals')
+@click.argument('source', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--user-id', type=int, required=True, help='Чей дневник пополнить')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'json']), default=None,
+              help='По умолчанию определяется по содержимому')
+def import_meals_command(source, user_id, fmt):
+    """Импортирует приемы пищи из CSV, NDJSON или JSON-массива"""
+    if db.session.get(User, user_id) is None:
+        raise click.ClickException(f'Пользователь {user_id} не найден')
+    report = import_meals(source, user_id, fmt)
+    click.echo(f'Импортировано: {report.imported}, пропущено: {report.skipped}, дней: {len(report.days)}')
+    for error in report.errors:
+        click.echo(f"  строка {error['line']}: {error['error']}")
+
+# Хеширование паролей медленной KDF в ограниченном пуле (passwords.py)
 def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
-class User(db.Model):
-    __tablename__ = 'users'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    login = db.Column(db.String(80), unique=True, nullable=False)
-    password = db.Column(db.String(120), nullable=False)
-    age = db.Column(db.Integer)
-    height = db.Column(db.Integer)
-    weight = db.Column(db.Float)
-    gender = db.Column(db.String(10))    
-    meals = db.relationship('Meal', backref='user', lazy=True)
-
-class Meal(db.Model):
-    __tablename__ = 'meals'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    date = db.Column(db.Date, default=date.today)
-    meal_type = db.Column(db.String(10))  # 'breakfast', 'lunch', 'dinner'
-    name = db.Column(db.String(100))
-    grams = db.Column(db.Float)
-    calories = db.Column(db.Float)
-    proteins = db.Column(db.Float)
-    fats = db.Column(db.Float)
-    carbs = db.Column(db.Float)
-
-class DailyStat(db.Model):
-    __tablename__ = 'daily_stats'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    date = db.Column(db.Date, default=date.today)
-    total_grams = db.Column(db.Float)
-    total_calories = db.Column(db.Float)
-    total_proteins = db.Column(db.Float)
-    total_fats = db.Column(db.Float)
-    total_carbs = db.Column(db.Float)
-    
-    # Добавляем связь с пользователем
-    user = db.relationship('User', backref='daily_stats')
+    return password_hasher.hash(password)
+
+def check_password(user, password):
+    """Проверяет пароль; старый SHA-256 или устаревшие параметры KDF перехешируются"""
+    ok, needs_rehash = password_hasher.verify(password, user.password)
+    if ok and needs_rehash:
+        user.password = password_hasher.hash(password)
+        db.session.commit()
+    return ok
 
 @app.route('/')
 def home():
     return redirect(url_for('login'))
 
 @app.route('/fatsecret')
+@login_required
 def fatsecret_search():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
     return render_template('fatsecret.html')
 
 @app.route('/search-food')
 def search_food():
     try:
-        if not fs:
-            return jsonify({
-                "error": "FatSecret не настроен",
-                "message": "Проверьте API ключи"
-            }), 500
-
         query = request.args.get('query', '')
         region = request.args.get('region', 'RU')
         language = request.args.get('language', 'ru')
@@ -101,21 +319,51 @@ def search_food():
         if not query:
             return jsonify({"error": "Введите запрос для поиска"}), 400
 
-        print(f"🔍 Поиск: '{query}', region: {region}, language: {language}")
-        
-        foods = fs.foods_search(query, max_results=12, region=region, language=language)
-        
-        print(f"✅ Найдено продуктов: {len(foods) if foods else 0}")
+        # FatSecret ищет по английским названиям - русский запрос переводим на сервере
+        search_query = translator.translate(query) if request.args.get('translate', '1') != '0' else query
+
+        def found(foods, source):
+            return jsonify({
+                "foods": {
+                    "food": foods or []
+                },
+                "source": source,
+                "query": query,
+                "translated_query": search_query
+            })
         
-        if foods:
-            print(f"Пример данных: {foods[0] if len(foods) > 0 else 'Нет данных'}")
+        # Сначала ищем в локальном каталоге, FatSecret - только при промахе.
+        # Порог считаем только по точным совпадениям: нечёткие (опечатки) - лишь запасной ответ
+        local_foods = food_catalog.search(search_query, limit=12, fuzzy=False)
+        if len(local_foods) >= app.config['CATALOG_MIN_RESULTS']:
+            return found(local_foods, "local")
+
+        if not fs:
+            local_foods = food_catalog.search(search_query, limit=12)
+            if local_foods:
+                return found(local_foods, "local")
+            return jsonify({
+                "error": "FatSecret не настроен",
+                "message": "Проверьте API ключи"
+            }), 500
+
+        try:
+            foods = search_cache.get_or_search(search_query, region, language, 12, fatsecret_search_upstream)
+        except Exception as e:
+            # API недоступен или упёрлись в лимит - отдаём то, что есть локально, с нечёткими совпадениями
+            local_foods = food_catalog.search(search_query, limit=12)
+            if local_foods:
+                print(f"⚠️ FatSecret недоступен, ответ из локального каталога: {str(e)}")
+                return found(local_foods, "local")
+            raise
         
-        return jsonify({
-            "foods": {
-                "food": foods or []
-            }
-        })
+        return found(foods, "fatsecret")
 
+    except FatSecretUnavailable as e:
+        return jsonify({
+            "error": str(e),
+            "message": "FatSecret временно недоступен, попробуйте позже"
+        }), 503
     except Exception as e:
         print(f"❌ Ошибка поиска: {str(e)}")
         return jsonify({
@@ -124,89 +372,133 @@ def search_food():
         }), 500
 
 @app.route('/get-food-details/<food_id>')
+@conditional(food_etag, FOOD_CACHE_CONTROL)
 def get_food_details(food_id):
     try:
         if not fs:
             return jsonify({"error": "FatSecret не настроен"}), 500
 
-        food = fs.food_get(food_id)
+        food = food_cache.get_or_fetch(food_id, fatsecret_food_upstream)
         
         if not food:
             return jsonify({"error": "Продукт не найден"}), 404
             
         return jsonify({"food": food})
 
+    except FatSecretUnavailable as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         print(f"❌ Ошибка получения деталей: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-def extract_nutrition_info(serving, grams=100):
-    """Извлекает информацию о питательной ценности из serving для указанного количества граммов"""
-    if isinstance(serving, list):
-        serving = serving[0] if serving else {}
-    
-    # Получаем граммы в стандартной порции
-    serving_grams = float(serving.get('metric_serving_amount', serving.get('grams', 100)))
-    
-    # Рассчитываем коэффициент для указанного количества граммов
-    ratio = grams / serving_grams
-    
-    return {
-        'grams': grams,
-        'calories': round(float(serving.get('calories', 0)) * ratio),
-        'protein': round(float(serving.get('protein', 0)) * ratio, 1),
-        'fat': round(float(serving.get('fat', 0)) * ratio, 1),
-        'carbohydrate': round(float(serving.get('carbohydrate', 0)) * ratio, 1)
-    }
+@app.route('/api/foods/<food_id>/nutrition')
+@conditional(food_etag, FOOD_CACHE_CONTROL)
+def food_nutrition(food_id):
+    """Пищевая ценность количества продукта: ?grams=150 или ?serving_id=...&units=2"""
+    try:
+        grams = float(request.args['grams']) if request.args.get('grams') else None
+        units = float(request.args['units']) if request.args.get('units') else None
+    except ValueError:
+        return jsonify({"error": "grams и units должны быть числами"}), 400
+    if grams is None and units is None:
+        grams = 100
 
+    try:
+        food = load_food(food_id)
+        if not food:
+            return jsonify({"error": "Продукт не найден"}), 404
+        nutrition = nutrient_store.calculate(food, grams, request.args.get('serving_id'), units)
+    except FatSecretUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    servings = nutrient_store.parsed(food).servings
+    return jsonify({
+        "nutrition": nutrition,
+        "servings": [
+            {"serving_id": serving.serving_id, "description": serving.description, "grams": serving.grams}
+            for serving in servings
+        ]
+    })
+
+
+@app.route('/api/foods/batch', methods=['POST'])
+@login_required(api=True)
+def foods_batch():
+    """Детали нескольких продуктов за один запрос: из кэша, промахи - параллельно из FatSecret"""
+    data = request.get_json(silent=True) or {}
+    food_ids = data.get('ids')
+    if not isinstance(food_ids, list) or not food_ids:
+        return jsonify({"error": "Передайте список ids"}), 400
+    if len(food_ids) > app.config['FOODS_BATCH_MAX']:
+        return jsonify({"error": f"Не более {app.config['FOODS_BATCH_MAX']} продуктов за запрос"}), 400
+
+    # Убираем дубли, сохраняя порядок
+    food_ids = list(dict.fromkeys(str(food_id) for food_id in food_ids))
+    foods = {}
+    misses = []
+    for food_id in food_ids:
+        food = food_cache.get(food_id)
+        if food is None:
+            misses.append(food_id)
+        else:
+            foods[food_id] = food
+
+    errors = {}
+    if misses and fs_async:
+        for food_id, result in asyncio.run(fs_async.food_get_many(misses)).items():
+            if isinstance(result, Exception):
+                errors[food_id] = str(result)
+            elif result:
+                food_cache.put(food_id, result)
+                foods[food_id] = result
+        food_catalog.add_many([foods[food_id] for food_id in misses if food_id in foods])
+    elif misses:
+        errors = {food_id: "FatSecret не настроен" for food_id in misses}
+
+    return jsonify({
+        "foods": foods,
+        "missing": [food_id for food_id in food_ids if food_id not in foods],
+        "errors": errors
+    })
 
 @app.route('/add-from-fatsecret', methods=['POST'])
+@login_required(api=True)
 def add_from_fatsecret():
     try:
-        if 'user_id' not in session:
-            return jsonify({"error": "Требуется авторизация"}), 401
-
         data = request.json
         food_id = data.get('food_id')
         meal_type = data.get('meal_type', 'lunch')
-        user_grams = data.get('grams', 100)  # Получаем граммы от пользователя
-        nutrition_data = data.get('nutrition_data')  # Получаем рассчитанные данные
+        nutrition_data = data.get('nutrition_data') or {}  # Рассчитанные клиентом данные
+        user_grams = data.get('grams', nutrition_data.get('grams'))  # Граммы от пользователя
+        units = data.get('units')  # или число порций serving_id
+        if user_grams is None and units is None:
+            user_grams = 100
 
         if not food_id:
             return jsonify({"error": "Не указан ID продукта"}), 400
 
-        # Получаем детали продукта
-        food = fs.food_get(food_id)
+        # Получаем детали продукта (обычно они уже в кэше после /get-food-details)
+        food = food_cache.get_or_fetch(food_id, fatsecret_food_upstream)
         if not food:
             return jsonify({"error": "Продукт не найден"}), 404
 
-        # Обрабатываем информацию о порциях
-        servings = food.get('servings', {})
-        serving_data = servings.get('serving', [])
-        
-        if not serving_data:
-            return jsonify({"error": "Нет информации о порциях"}), 400
-
-        # Берем первую порцию для расчета
-        serving = serving_data[0] if isinstance(serving_data, list) else serving_data
-        
-        # Если есть предварительно рассчитанные данные, используем их
-        if nutrition_data:
-            calories = nutrition_data['calories']
-            protein = nutrition_data['protein']
-            fat = nutrition_data['fat']
-            carbs = nutrition_data['carbs']
-            grams = nutrition_data['grams']
-        else:
-            # Иначе рассчитываем вручную на основе стандартной порции
-            serving_grams = float(serving.get('metric_serving_amount', serving.get('grams', 100)))
-            ratio = user_grams / serving_grams
-            
-            calories = round(float(serving.get('calories', 0)) * ratio)
-            protein = round(float(serving.get('protein', 0)) * ratio, 1)
-            fat = round(float(serving.get('fat', 0)) * ratio, 1)
-            carbs = round(float(serving.get('carbohydrate', 0)) * ratio, 1)
-            grams = user_grams
+        # Считаем на сервере по выбранной (или первой) порции FatSecret
+        try:
+            nutrition = nutrient_store.calculate(
+                food,
+                float(user_grams) if user_grams is not None else None,
+                data.get('serving_id'),
+                float(units) if units is not None else None
+            )
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+        grams = nutrition['grams']
+        calories = nutrition['calories']
+        protein = nutrition['protein']
+        fat = nutrition['fat']
+        carbs = nutrition['carbohydrate']
 
         # Создаем запись в базе
         new_meal = Meal(
@@ -221,10 +513,8 @@ def add_from_fatsecret():
         )
         
         db.session.add(new_meal)
-        db.session.commit()
-        
-        # Обновляем статистику
-        update_daily_stats(session['user_id'])
+        # Статистика обновляется в той же транзакции, что и прием пищи
+        record_meal_change(after=meal_snapshot(new_meal))
         db.session.commit()
         
         return jsonify({
@@ -234,10 +524,126 @@ def add_from_fatsecret():
             "grams": grams
         })
 
+    except FatSecretUnavailable as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         db.session.rollback()
         print(f"❌ Ошибка добавления: {str(e)}")
         return jsonify({"error": str(e)}), 500
+
+def _user_recipe(recipe_id):
+    return Recipe.query.filter_by(id=recipe_id, user_id=session['user_id']).first_or_404()
+
+@app.route('/api/recipes', methods=['GET', 'POST'])
+@login_required(api=True)
+def api_recipes():
+    """Рецепты пользователя; POST {"name": ..., "ingredients": [{"food_id"|"name", "grams", ...}]}"""
+    if request.method == 'GET':
+        recipes = Recipe.query.filter_by(user_id=session['user_id']).order_by(Recipe.name).all()
+        return jsonify({"recipes": [recipe_as_dict(recipe) for recipe in recipes]})
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        ingredients = parse_ingredients(data.get('ingredients') or [], load_food, nutrient_store)
+        recipe = new_recipe(session['user_id'], data.get('name'), ingredients)
+    except FatSecretUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    db.session.add(recipe)
+    db.session.commit()
+    return jsonify(recipe_as_dict(recipe)), 201
+
+@app.route('/api/recipes/<int:recipe_id>', methods=['GET', 'PATCH', 'DELETE'])
+@login_required(api=True)
+def api_recipe(recipe_id):
+    """Рецепт; PATCH {"name": ...} - переименование"""
+    recipe = _user_recipe(recipe_id)
+    if request.method == 'DELETE':
+        db.session.delete(recipe)
+        db.session.commit()
+        return jsonify({"success": True})
+    
+    if request.method == 'PATCH':
+        name = str((request.get_json(silent=True) or {}).get('name') or '').strip()
+        if not name:
+            return jsonify({"error": "Укажите название рецепта"}), 400
+        recipe.name = name[:100]
+        db.session.commit()
+    return jsonify(recipe_as_dict(recipe))
+
+@app.route('/api/recipes/<int:recipe_id>/ingredients', methods=['POST'])
+@login_required(api=True)
+def api_recipe_add_ingredient(recipe_id):
+    recipe = _user_recipe(recipe_id)
+    if len(recipe.ingredients) >= MAX_INGREDIENTS:
+        return jsonify({"error": f"Не более {MAX_INGREDIENTS} ингредиентов"}), 400
+    try:
+        ingredient = parse_ingredient(request.get_json(silent=True), load_food, nutrient_store)
+    except FatSecretUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    recipe.ingredients.append(ingredient)
+    recompute_recipe(recipe)
+    db.session.commit()
+    return jsonify(recipe_as_dict(recipe)), 201
+
+@app.route('/api/recipes/<int:recipe_id>/ingredients/<int:ingredient_id>', methods=['PUT', 'DELETE'])
+@login_required(api=True)
+def api_recipe_ingredient(recipe_id, ingredient_id):
+    """PUT - замена ингредиента (тело как при добавлении), DELETE - удаление"""
+    recipe = _user_recipe(recipe_id)
+    position = next((i for i, item in enumerate(recipe.ingredients) if item.id == ingredient_id), None)
+    if position is None:
+        abort(404)
+    
+    if request.method == 'DELETE':
+        if len(recipe.ingredients) == 1:
+            return jsonify({"error": "Нельзя удалить последний ингредиент"}), 400
+        del recipe.ingredients[position]
+    else:
+        try:
+            recipe.ingredients[position] = parse_ingredient(request.get_json(silent=True), load_food, nutrient_store)
+        except FatSecretUnavailable as e:
+            return jsonify({"error": str(e)}), 503
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    
+    # Итог на 100 г пересчитывается только здесь - при изменении состава
+    recompute_recipe(recipe)
+    db.session.commit()
+    return jsonify(recipe_as_dict(recipe))
+
+@app.route('/api/recipes/<int:recipe_id>/log', methods=['POST'])
+@login_required(api=True)
+def api_recipe_log(recipe_id):
+    """Запись порции рецепта в дневник: {"grams": 250, "meal_type": "lunch", "date": "ГГГГ-ММ-ДД"}"""
+    recipe = _user_recipe(recipe_id)
+    data = request.get_json(silent=True) or {}
+    try:
+        grams = float(data.get('grams') or recipe.total_grams)
+        day = date.fromisoformat(data['date']) if data.get('date') else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "grams - число, date - ГГГГ-ММ-ДД"}), 400
+    if grams <= 0:
+        return jsonify({"error": "grams должно быть больше нуля"}), 400
+    
+    new_meal = meal_from_recipe(recipe, session['user_id'], grams, data.get('meal_type', 'lunch'), day)
+    db.session.add(new_meal)
+    record_meal_change(after=meal_snapshot(new_meal))
+    db.session.commit()  # Прием пищи и статистика - одним коммитом
+    
+    return jsonify({
+        "success": True,
+        "message": "Рецепт добавлен в дневник",
+        "food": recipe.name,
+        "grams": grams,
+        "calories": new_meal.calories
+    })
     
 @app.route('/debug/fatsecret')
 def debug_fatsecret():
@@ -259,15 +665,38 @@ def debug_fatsecret():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/debug/cache')
+def debug_cache():
+    """Счетчики кэша деталей продуктов"""
+    return jsonify({
+        "food_cache": food_cache.stats(),
+        "search_cache": search_cache.stats(),
+        "catalog_size": len(food_catalog),
+        "translations": translator.stats(),
+        "analytics": trend_analytics.stats(),
+        "passwords": password_hasher.stats(),
+        "users": user_loader.stats(),
+        "nutrients": nutrient_store.stats(),
+        "sessions": app.session_interface.stats(),
+        "fragments": fragment_cache.stats(),
+        "assets": assets.stats()
+    })
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     error = None
     if request.method == 'POST':
         user = User.query.filter_by(login=request.form['email']).first()
-        if user and user.password == hash_password(request.form['password']):
-            session['user_id'] = user.id  # Сохраняем ID пользователя в сессии
-            return redirect(url_for('index'))
-        error = 'Неверный логин или пароль'
+        try:
+            if user is None:
+                password_hasher.dummy_verify(request.form['password'])
+            elif check_password(user, request.form['password']):
+                session.regenerate()  # Новый id сессии после входа
+                session['user_id'] = user.id  # Сохраняем ID пользователя в сессии
+                return redirect(url_for('index'))
+            error = 'Неверный логин или пароль'
+        except PasswordHasherBusy:
+            return render_template('login.html', error='Сервер перегружен, попробуйте войти через минуту'), 503
     return render_template('login.html', error=error)
 
 @app.route('/register', methods=['GET', 'POST'])
@@ -303,135 +732,168 @@ def register():
     return render_template('register.html', error=error, genders=genders)
 
 @app.route('/index')
+@login_required
+@conditional(index_etag)
 def index():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    
-    user = User.query.get(session['user_id'])
-    
-    # Get today's meals from database
+    # Версия дневника - из БД, а не из кэша профиля: запись могла быть в другом воркере
+    diary_version = user_loader.diary_version()
+    user = user_loader.current()
     today = date.today()
-    meals = Meal.query.filter_by(
-        user_id=session['user_id'],
-        date=today
-    ).all()
-    
-    # Organize meals by type
-    breakfast_items = []
-    lunch_items = []
-    dinner_items = []
-    snack_items = []  # Добавляем список для перекусов
-    
-    for meal in meals:
-        if meal.meal_type == 'breakfast':
-            breakfast_items.append({
-                'id': meal.id,
-                'name': meal.name,
-                'grams': meal.grams,
-                'calories': meal.calories,
-                'proteins': meal.proteins,
-                'fats': meal.fats,
-                'carbs': meal.carbs
-            })
-        elif meal.meal_type == 'lunch':
-            lunch_items.append({
-                'id': meal.id,
-                'name': meal.name,
-                'grams': meal.grams,
-                'calories': meal.calories,
-                'proteins': meal.proteins,
-                'fats': meal.fats,
-                'carbs': meal.carbs
-            })
-        elif meal.meal_type == 'dinner':
-            dinner_items.append({
-                'id': meal.id,
-                'name': meal.name,
-                'grams': meal.grams,
-                'calories': meal.calories,
-                'proteins': meal.proteins,
-                'fats': meal.fats,
-                'carbs': meal.carbs
-            })
-        elif meal.meal_type == 'snack':  # Добавляем обработку перекусов
-            snack_items.append({
-                'id': meal.id,
-                'name': meal.name,
-                'grams': meal.grams,
-                'calories': meal.calories,
-                'proteins': meal.proteins,
-                'fats': meal.fats,
-                'carbs': meal.carbs
-            })
-    
-    # Calculate totals
-    breakfast_total = sum(item['calories'] for item in breakfast_items)
-    lunch_total = sum(item['calories'] for item in lunch_items)
-    dinner_total = sum(item['calories'] for item in dinner_items)
-    snack_total = sum(item['calories'] for item in snack_items)  # Добавляем перекусы
-    daily_total = breakfast_total + lunch_total + dinner_total + snack_total
-    
+    # Блоки дневника кэшируются по версии дневника: пока приемы пищи не менялись,
+    # главная собирается из готового HTML без запросов к meals
+    version = (user.id, diary_version, today.isoformat())
+    diary = {}
+
+    def day_diary():
+        # Приемы пищи за сегодня по типам и итоги - одним запросом, только при промахе
+        if not diary:
+            diary.update(load_diary(user.id, today))
+        return diary
+
+    sections = {
+        meal_type: fragment_cache.fragment(version + (meal_type,), lambda meal_type=meal_type: render_template(
+            '_meal_section.html', meal_type=meal_type, title=MEAL_TITLES[meal_type], section=day_diary()[meal_type]
+        ))
+        for meal_type in MEAL_TYPES
+    }
+    calories = fragment_cache.fragment(version + ('calories',), lambda: str(day_diary()['calories']))
     daily_data = {
         "date": datetime.now().strftime("%d %B %Y"),
         "time": datetime.now().strftime("%H:%M"),
-        "calories": daily_total,
-        "breakfast": {
-            "total": breakfast_total,
-            "foods": breakfast_items
-        },
-        "lunch": {
-            "total": lunch_total,
-            "foods": lunch_items
-        },
-        "dinner": {
-            "total": dinner_total,
-            "foods": dinner_items
-        },
-        "snack": {  # Добавляем данные перекуса
-            "total": snack_total,
-            "foods": snack_items
-        }
     }
     
     return render_template('index.html',
                          user=user,
-                         daily_data=daily_data)
+                         daily_data=daily_data,
+                         meal_types=MEAL_TYPES,
+                         sections=sections,
+                         calories=calories,
+                         targets=targets_for(user))
+
+@app.route('/api/diary/<day>')
+@login_required(api=True)
+@conditional(diary_etag)
+def api_diary(day):
+    try:
+        diary_day = date.today() if day == 'today' else date.fromisoformat(day)
+    except ValueError:
+        return jsonify({"error": "Дата должна быть в формате ГГГГ-ММ-ДД"}), 400
+    
+    diary = load_diary(session['user_id'], diary_day)
+    diary["date"] = diary_day.isoformat()
+    return jsonify(diary)
+
+@app.route('/api/stats')
+@login_required(api=True)
+@conditional(diary_etag)
+def api_stats():
+    """Статистика за диапазон: ?from=ГГГГ-ММ-ДД&to=ГГГГ-ММ-ДД&granularity=day|week|month|auto"""
+    try:
+        end = date.fromisoformat(request.args['to']) if request.args.get('to') else date.today()
+        start = date.fromisoformat(request.args['from']) if request.args.get('from') else end - timedelta(days=29)
+    except ValueError:
+        return jsonify({"error": "Даты должны быть в формате ГГГГ-ММ-ДД"}), 400
+    if start > end:
+        return jsonify({"error": "Начало диапазона позже конца"}), 400
+    
+    granularity = request.args.get('granularity', 'auto')
+    if granularity == 'auto':
+        granularity = choose_granularity(start, end)
+    elif granularity != 'day' and granularity not in GRANULARITIES:
+        return jsonify({"error": "granularity: day, week, month или auto"}), 400
+    
+    return jsonify({
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "granularity": granularity,
+        "points": load_stats_range(session['user_id'], start, end, granularity)
+    })
+
+@app.route('/export/<table>')
+@login_required(api=True)
+def export_table(table):
+    """Выгрузка meals или daily_stats: ?format=csv|ndjson&gzip=1"""
+    fmt = request.args.get('format', 'csv')
+    if table not in EXPORTS or fmt not in FORMATS:
+        abort(404)
+    gzip = request.args.get('gzip') == '1'
+    
+    filename = f"{table}-{date.today().isoformat()}.{fmt}" + (".gz" if gzip else "")
+    return Response(
+        stream_with_context(export_stream(table, session['user_id'], fmt, gzip)),
+        mimetype='application/gzip' if gzip else FORMATS[fmt],
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            # Не буферизовать ответ в nginx - строки уходят по мере чтения
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+@app.route('/import/meals', methods=['POST'])
+@login_required(api=True)
+def import_meals_upload():
+    """Импорт приемов пищи: файл в поле file (multipart) или тело запроса; ?format=csv|json"""
+    fmt = request.args.get('format')
+    if fmt not in (None, 'csv', 'json'):
+        return jsonify({"error": "format: csv или json"}), 400
+    
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    report = import_meals(io.TextIOWrapper(stream, encoding='utf-8-sig'), session['user_id'], fmt)
+    return jsonify(report.as_dict())
+
+@app.route('/api/analytics/trends')
+@login_required(api=True)
+def api_trends():
+    """Тренды: ?days=365&activity=1.2&formula=mifflin|harris (норма калорий как в /dci)"""
+    try:
+        last_days = int(request.args.get('days', 365))
+        activity = float(request.args.get('activity', ACTIVITY_LEVELS[0]))
+    except ValueError:
+        return jsonify({"error": "days и activity должны быть числами"}), 400
+    formula = request.args.get('formula', 'mifflin')
+    if last_days < 1 or activity not in ACTIVITY_LEVELS or formula not in FORMULAS:
+        return jsonify({"error": "Неверные параметры"}), 400
+    
+    targets = targets_for(user_loader.current(), activity, formula)
+    return jsonify(trend_analytics.report(session['user_id'], targets.dci if targets else None, last_days))
+
+@app.route('/api/targets')
+@login_required(api=True)
+def api_targets():
+    """Нормы пользователя: ?activity=1.2&formula=mifflin|harris"""
+    try:
+        activity = float(request.args.get('activity', ACTIVITY_LEVELS[0]))
+    except ValueError:
+        return jsonify({"error": "activity должно быть числом"}), 400
+    formula = request.args.get('formula', 'mifflin')
+    if activity not in ACTIVITY_LEVELS or formula not in FORMULAS:
+        return jsonify({"error": "Неверные параметры"}), 400
+    
+    targets = targets_for(user_loader.current(), activity, formula)
+    return jsonify(dict(targets._asdict(), activity=activity, formula=formula))
 
 @app.route('/dci')
+@login_required
 def dci():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    
-    # Получаем данные пользователя из базы данных
-    user = User.query.get(session['user_id'])
+    # Поля профиля - из кэша пользователя
+    user = user_loader.current()
     return render_template('dci.html', user=user)
 
 @app.route('/logout')
 def logout():
-    session.pop('user_id', None)
+    session.clear()  # Пустая сессия удаляется из хранилища
     return redirect(url_for('login'))
 
 @app.route('/bmi')
+@login_required
 def bmi():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
+    user = user_loader.current()
     
-    user = User.query.get(session['user_id'])
-    
-    # Рассчитываем ИМТ
-    bmi_value = None
-    bmi_category = None
-    if user.height and user.weight:
-        bmi_value = round(user.weight / ((user.height / 100) ** 2), 1)
-        
-        if bmi_value < 18.5:
-            bmi_category = "Недостаточный вес"
-        elif 18.5 <= bmi_value < 25:
-            bmi_category = "Нормальный вес"
-        elif 25 <= bmi_value < 30:
-            bmi_category = "Избыточный вес"
-        else:
-            bmi_category = "Ожирение"
+    # ИМТ и категория - из кэшируемых норм пользователя
+    targets = targets_for(user)
+    bmi_value = targets.bmi if targets else None
+    bmi_category = targets.bmi_category if targets else None
     
     return render_template('bmi.html', 
                          user=user,
@@ -439,10 +901,8 @@ def bmi():
                          bmi_category=bmi_category)
 
 @app.route('/add_meal', methods=['GET', 'POST'])
+@login_required
 def add_meal():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    
     meal_types = ['breakfast', 'lunch', 'dinner', 'snack']
     
     if request.method == 'POST':
@@ -458,11 +918,8 @@ def add_meal():
                 carbs=float(request.form['carbs'])
             )
             db.session.add(new_meal)
-            db.session.commit()  # Сначала коммитим meal
-            
-            # Теперь обновляем статистику
-            update_daily_stats(session['user_id'])
-            db.session.commit()  # Коммитим статистику
+            record_meal_change(after=meal_snapshot(new_meal))
+            db.session.commit()  # Прием пищи и статистика - одним коммитом
             
             return redirect(url_for('index'))
         except Exception as e:
@@ -477,10 +934,8 @@ def add_meal():
                          default_meal_type=meal_type)
 
 @app.route('/edit_meal/<int:id>', methods=['GET', 'POST'])
+@login_required
 def edit_meal(id):
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    
     meal = Meal.query.get_or_404(id)
     if meal.user_id != session['user_id']:
         abort(403)
@@ -489,6 +944,7 @@ def edit_meal(id):
     
     if request.method == 'POST':
         try:
+            before = meal_snapshot(meal)
             meal.meal_type = request.form['meal_type']
             meal.name = request.form['name']
             meal.grams = float(request.form['grams'])
@@ -497,8 +953,7 @@ def edit_meal(id):
             meal.fats = float(request.form['fats'])
             meal.carbs = float(request.form['carbs'])
             
-            db.session.commit()
-            update_daily_stats(session['user_id'])
+            record_meal_change(before=before, after=meal_snapshot(meal))
             db.session.commit()
             
             flash('Блюдо успешно обновлено!', 'success')
@@ -514,53 +969,46 @@ def edit_meal(id):
                          meal=meal,
                          meal_types=meal_types)
 
-def update_daily_stats(user_id):
-    today = date.today()
-    
-    # Проверяем, существует ли запись за сегодня
-    stat = DailyStat.query.filter_by(
-        user_id=user_id,
-        date=today
-    ).first()
-    
-    # Суммируем все приемы пищи за сегодня
-    meals = Meal.query.filter_by(
-        user_id=user_id,
-        date=today
-    ).all()
-    
-    # Рассчитываем итоги
-    total_grams = sum(m.grams for m in meals)
-    total_calories = sum(m.calories for m in meals)
-    total_proteins = sum(m.proteins for m in meals)
-    total_fats = sum(m.fats for m in meals)
-    total_carbs = sum(m.carbs for m in meals)
-    
-    if not stat:
-        # Создаем новую запись
-        stat = DailyStat(
-            user_id=user_id,
-            date=today,
-            total_grams=total_grams,
-            total_calories=total_calories,
-            total_proteins=total_proteins,
-            total_fats=total_fats,
-            total_carbs=total_carbs
-        )
-        db.session.add(stat)
-    else:
-        # Обновляем существующую запись
-        stat.total_grams = total_grams
-        stat.total_calories = total_calories
-        stat.total_proteins = total_proteins
-        stat.total_fats = total_fats
-        stat.total_carbs = total_carbs
+def update_daily_stats(user_id, day=None):
+    """Пересчитывает итоги за день приема пищи (по умолчанию - за сегодня)"""
+    recompute_daily_stat(user_id, day or date.today())
+
+@app.cli.command('reconcile-stats')
+@click.option('--days', type=int, default=None, help='Проверять только последние N дней')
+def reconcile_stats_command(days):
+    """Сверяет daily_stats с meals и исправляет накопившиеся расхождения (для cron)"""
+    since = date.today() - timedelta(days=days) if days else None
+    fixed = reconcile_daily_stats(since=since)
+    click.echo(f'Исправлено строк статистики: {fixed}')
+
+@app.cli.command('rebuild-stats')
+@click.option('--user-id', type=int, default=None, help='Пересобрать только одного пользователя')
+def rebuild_stats_command(user_id):
+    """Пересобирает daily_stats целиком одним GROUP BY по meals"""
+    count = rebuild_daily_stats(user_id=user_id)
+    click.echo(f'Пересобрано строк статистики: {count}')
+
+@app.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Применяет миграции схемы (они также применяются при запуске приложения)"""
+    applied = upgrade_schema(db.engine)
+    click.echo(f'Применены миграции: {applied}' if applied else 'Схема актуальна')
+
+@app.cli.command('explain-queries')
+def explain_queries_command():
+    """Проверяет через EXPLAIN QUERY PLAN, что горячие запросы идут по индексам"""
+    failed = False
+    for name, plan, ok in explain_hot_queries(db.engine):
+        click.echo(f"{'✅' if ok else '❌'} {name}")
+        for line in plan:
+            click.echo(f'    {line}')
+        failed = failed or not ok
+    if failed:
+        raise SystemExit(1)
 
 @app.route('/debug/stats')
+@login_required
 def debug_stats():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    
     today = date.today()
     
     # Получаем все meals за сегодня
@@ -589,45 +1037,44 @@ def debug_stats():
     })
 
 @app.route('/delete_meal/<int:id>', methods=['POST'])
+@login_required
 def delete_meal(id):
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    
     meal = Meal.query.get_or_404(id)
     if meal.user_id != session['user_id']:
         abort(403)
     
+    before = meal_snapshot(meal)
     db.session.delete(meal)
-    db.session.commit()  # Сначала удаляем meal
-    
-    # Теперь обновляем статистику
-    update_daily_stats(session['user_id'])
-    db.session.commit()  # Коммитим статистику
+    # В режиме recompute день пересчитывается по meals - удаление должно уже быть в БД
+    db.session.flush()
+    record_meal_change(before=before)
+    db.session.commit()  # Удаление и статистика - одним коммитом
     
     return redirect(url_for('index'))
 
 @app.route('/stats')
+@login_required
+@conditional(diary_etag)
 def stats():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    
     # Получаем статистику и сортируем по дате (новые сверху)
     stats = DailyStat.query.filter_by(
         user_id=session['user_id']
     ).order_by(DailyStat.date.desc()).limit(30).all()
     
-    # Дебаг вывод
-    print(f"📊 Найдено записей статистики: {len(stats)}")
-    for stat in stats:
-        print(f"📅 {stat.date}: {stat.total_calories} ккал")
+    # Выполнение нормы калорий - сразу для всех дней
+    targets = targets_for(user_loader.current())
+    progress = progress_vs_target(
+        [stat.total_calories for stat in stats], [stat.total_proteins for stat in stats],
+        [stat.total_fats for stat in stats], [stat.total_carbs for stat in stats], targets
+    )
+    calories_progress = {stat.date: value for stat, value in zip(stats, progress[:, 0].tolist())}
     
-    return render_template('stats.html', stats=stats)
+    return render_template('stats.html', stats=stats, targets=targets,
+                           calories_progress=calories_progress)
 
 @app.route('/save_day', methods=['POST'])
+@login_required
 def save_day():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    
     update_daily_stats(session['user_id'])
     db.session.commit()
     
@@ -635,13 +1082,11 @@ def save_day():
     return redirect(url_for('index'))
 
 @app.route('/profile', methods=['GET', 'POST'])
+@login_required
 def profile():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-
-    user = User.query.get(session['user_id'])
-    
     if request.method == 'POST':
+        # Для изменения нужен ORM-объект; кэш профиля сбросится после commit
+        user = db.session.get(User, session['user_id'])
         form_type = request.form.get('form_type')
         
         if form_type == 'profile':
@@ -664,26 +1109,29 @@ def profile():
             new_password = request.form.get('new_password')
             confirm_password = request.form.get('confirm_password')
             
-            # Проверяем текущий пароль
-            if user.password != hash_password(current_password):
-                flash('Текущий пароль неверен', 'error')
-            elif not new_password:
-                flash('Введите новый пароль', 'error')
-            elif len(new_password) < 6:
-                flash('Пароль должен содержать не менее 6 символов', 'error')
-            elif new_password != confirm_password:
-                flash('Новый пароль и подтверждение не совпадают', 'error')
-            else:
-                # Обновляем пароль
-                user.password = hash_password(new_password)
-                db.session.commit()
-                flash('Пароль успешно изменен!', 'success')
-                return redirect(url_for('profile'))
+            try:
+                # Проверяем текущий пароль
+                if not password_hasher.verify(current_password or '', user.password)[0]:
+                    flash('Текущий пароль неверен', 'error')
+                elif not new_password:
+                    flash('Введите новый пароль', 'error')
+                elif len(new_password) < 6:
+                    flash('Пароль должен содержать не менее 6 символов', 'error')
+                elif new_password != confirm_password:
+                    flash('Новый пароль и подтверждение не совпадают', 'error')
+                else:
+                    # Обновляем пароль
+                    user.password = hash_password(new_password)
+                    db.session.commit()
+                    # Остальные сессии пользователя больше не действуют
+                    app.session_interface.revoke_user(user.id, keep=session.sid)
+                    session.regenerate()
+                    flash('Пароль успешно изменен!', 'success')
+                    return redirect(url_for('profile'))
+            except PasswordHasherBusy:
+                flash('Сервер перегружен, попробуйте сменить пароль через минуту', 'error')
     
-    return render_template('profile.html', user=user)
+    return render_template('profile.html', user=user_loader.current())
 
 if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
-    
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,170 @@
+"""Массовый импорт приемов пищи из CSV, NDJSON или JSON-массива.
+
+Файл разбирается потоково (в памяти только текущая порция строк), каждая
+строка проверяется, корректные вставляются пачками по chunk_size одним
+executemany в отдельной транзакции. Итоги дней (daily_stats) и сводки
+пересчитываются один раз в конце - по разу на каждый затронутый день.
+
+Колонки совпадают с выгрузкой /export/meals: date, meal_type, name, grams,
+calories, proteins, fats, carbs (id игнорируется), так что выгрузку можно
+загрузить обратно."""
+import csv
+import json
+from datetime import date
+from itertools import chain
+
+from sqlalchemy import insert
+
+from daily_stats import recompute_daily_stats
+from diary import MEAL_TYPES
+from models import db, Meal
+
+REQUIRED_FIELDS = ('date', 'meal_type', 'name', 'grams', 'calories')
+NUTRIENT_FIELDS = ('grams', 'calories', 'proteins', 'fats', 'carbs')
+
+# Сколько ошибок строк возвращать в отчете
+MAX_REPORTED_ERRORS = 50
+
+
+class ImportReport:
+
+    def __init__(self):
+        self.imported = 0
+        self.skipped = 0
+        self.errors = []
+        self.days = set()
+
+    def error(self, line, message):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    def as_dict(self):
+        return {
+            'imported': self.imported,
+            'skipped': self.skipped,
+            'days': len(self.days),
+            'errors': self.errors,
+        }
+
+
+def _iter_json_array(fp, chunk_size=64 * 1024):
+    """Объекты JSON-массива по одному, без чтения всего файла в память"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    while True:
+        buffer = buffer.lstrip(' \t\r\n,')
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = fp.read(chunk_size)
+            if not chunk:
+                raise ValueError('JSON-массив оборван')
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+def iter_records(fp, fmt=None):
+    """(номер строки/элемента, словарь) из CSV, NDJSON или JSON-массива.
+    fmt=None - формат определяется по первому символу"""
+    head = fp.read(1)
+    while head and head.isspace():
+        head = fp.read(1)
+    if not head:
+        return
+
+    if fmt == 'csv' or (fmt is None and head not in '[{'):
+        reader = csv.DictReader(chain([head + fp.readline()], fp))
+        for record in reader:
+            yield reader.line_num, record
+        return
+
+    if head == '[':
+        yield from enumerate(_iter_json_array(fp), 1)
+        return
+
+    for number, line in enumerate(chain([head + fp.readline()], fp), 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield number, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield number, ValueError(f'Неверный JSON: {e.msg}')
+
+
+def validate_record(record, user_id):
+    """Проверяет строку и возвращает словарь колонок Meal; ValueError с описанием ошибки"""
+    if isinstance(record, Exception):
+        raise record
+    if not isinstance(record, dict):
+        raise ValueError('Ожидается объект с полями приема пищи')
+
+    missing = [field for field in REQUIRED_FIELDS if record.get(field) in (None, '')]
+    if missing:
+        raise ValueError('Не заполнены поля: ' + ', '.join(missing))
+
+    try:
+        meal_date = date.fromisoformat(str(record['date']).strip())
+    except ValueError:
+        raise ValueError(f"Дата должна быть в формате ГГГГ-ММ-ДД: {record['date']}")
+
+    meal_type = str(record['meal_type']).strip()
+    if meal_type not in MEAL_TYPES:
+        raise ValueError(f'Неизвестный прием пищи: {meal_type}')
+
+    name = str(record['name']).strip()
+    if len(name) > 100:
+        raise ValueError('Название длиннее 100 символов')
+
+    values = {}
+    for field in NUTRIENT_FIELDS:
+        raw = record.get(field)
+        try:
+            value = float(raw) if raw not in (None, '') else 0.0
+        except (TypeError, ValueError):
+            raise ValueError(f'{field}: не число ({raw})')
+        if not 0 <= value < 100000:
+            raise ValueError(f'{field}: недопустимое значение {value}')
+        values[field] = value
+
+    return dict(user_id=user_id, date=meal_date, meal_type=meal_type, name=name, **values)
+
+
+def import_meals(fp, user_id, fmt=None, chunk_size=1000):
+    """Импортирует приемы пищи пользователя из текстового потока fp. Возвращает ImportReport"""
+    report = ImportReport()
+    batch = []
+
+    def flush():
+        if batch:
+            db.session.execute(insert(Meal), batch)
+            db.session.commit()
+            report.imported += len(batch)
+            batch.clear()
+
+    try:
+        for line, record in iter_records(fp, fmt):
+            try:
+                row = validate_record(record, user_id)
+            except ValueError as e:
+                report.error(line, str(e))
+                continue
+            batch.append(row)
+            report.days.add(row['date'])
+            if len(batch) >= chunk_size:
+                flush()
+        flush()
+    except (ValueError, csv.Error) as e:
+        db.session.rollback()
+        report.error(None, f'Файл не разобран до конца: {e}')
+    finally:
+        # Итоги пересчитываются и для уже записанных пачек, даже если файл оборван
+        if report.imported:
+            recompute_daily_stats(user_id, report.days)
+            db.session.commit()
+    return report
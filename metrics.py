@@ -0,0 +1,217 @@
+"""Метрики приложения в текстовом формате Prometheus (GET /metrics).
+
+Собираются:
+- задержка запросов по маршруту (шаблон URL, а не сам путь), методу и статусу
+  и число SQL-запросов на один HTTP-запрос;
+- время SQL-запросов по типу операции и таблице (события engine SQLAlchemy);
+- время обращений к FatSecret по методу API и исходу (каждая попытка отдельно);
+- попадания и промахи кэшей - читаются из их stats() только при выдаче /metrics.
+
+Счетчики - в памяти процесса, без сторонних библиотек. При METRICS_ENABLED=0
+обработчики и события не регистрируются вовсе, так что накладных расходов нет."""
+import bisect
+import re
+import threading
+import time
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+
+# Границы корзин гистограмм задержек, секунды
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Границы корзин числа SQL-запросов на HTTP-запрос
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_SQL_OPERATION = re.compile(r'^\s*(\w+)')
+_SQL_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE)\s+["`]?(\w+)', re.IGNORECASE)
+# Сколько разных текстов SQL помнить при разборе на (операция, таблица)
+_STATEMENT_CACHE_SIZE = 2048
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help_text}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in values:
+            yield f'{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}'
+
+
+class Histogram:
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # label_values -> [счетчики по корзинам (+Inf последней), сумма]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help_text}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            series = [(label_values, list(counts), total)
+                      for label_values, (counts, total) in self._series.items()]
+        for label_values, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f'{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}'
+            labels = _format_labels(self.labels, label_values)
+            yield f'{self.name}_sum{labels} {total!r}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+class Metrics:
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._statements = {}
+        self._caches = {}
+
+        self.http_seconds = Histogram(
+            'http_request_duration_seconds', 'Время обработки HTTP-запроса',
+            ('route', 'method', 'status'))
+        self.http_queries = Histogram(
+            'http_request_sql_queries', 'Число SQL-запросов на HTTP-запрос',
+            ('route',), buckets=QUERY_COUNT_BUCKETS)
+        self.sql_seconds = Histogram(
+            'sql_query_duration_seconds', 'Время выполнения SQL-запроса',
+            ('operation', 'table'))
+        self.fatsecret_seconds = Histogram(
+            'fatsecret_request_duration_seconds', 'Время попытки запроса к FatSecret',
+            ('method', 'outcome'))
+        self.fatsecret_rejected = Counter(
+            'fatsecret_breaker_rejections_total', 'Запросы к FatSecret, отклоненные предохранителем',
+            ('method',))
+        self.registry = [self.http_seconds, self.http_queries, self.sql_seconds,
+                         self.fatsecret_seconds, self.fatsecret_rejected]
+
+    def init_app(self, app, path='/metrics'):
+        if not self.enabled:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule(path, 'metrics', self.view)
+
+    def _before_request(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_queries = 0
+
+    def _after_request(self, response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            # Для потоковых ответов (выгрузка) - время до начала отдачи тела
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            self.http_seconds.observe(time.perf_counter() - started,
+                                      route, request.method, str(response.status_code))
+            self.http_queries.observe(g.pop('metrics_queries', 0), route)
+        return response
+
+    def instrument_engine(self, engine):
+        if not self.enabled:
+            return
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    # Время старта - в контексте выполнения, а не в стеке на соединении: упавший запрос
+    # не доходит до after_cursor_execute и сбил бы замеры на этом соединении из пула
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._metrics_started
+        self.sql_seconds.observe(elapsed, *self._statement_labels(statement))
+        if has_request_context() and 'metrics_queries' in g:
+            g.metrics_queries += 1
+
+    def _statement_labels(self, statement):
+        labels = self._statements.get(statement)
+        if labels is None:
+            operation = _SQL_OPERATION.match(statement)
+            table = _SQL_TABLE.search(statement)
+            labels = (operation.group(1).upper() if operation else 'OTHER',
+                      table.group(1).lower() if table else '')
+            if len(self._statements) < _STATEMENT_CACHE_SIZE:
+                self._statements[statement] = labels
+        return labels
+
+    def fatsecret_observer(self):
+        """Функция для FatSecretGateway(on_request=...) или None, если метрики выключены"""
+        return self.observe_fatsecret if self.enabled else None
+
+    def observe_fatsecret(self, method, seconds, outcome):
+        if outcome == 'rejected':
+            self.fatsecret_rejected.inc(method)
+        else:
+            self.fatsecret_seconds.observe(seconds, method, outcome)
+
+    def register_cache(self, name, stats):
+        """stats() -> словарь с hits, misses и size; вызывается только при выдаче метрик"""
+        self._caches[name] = stats
+
+    def _render_caches(self):
+        caches = [(name, stats()) for name, stats in self._caches.items()]
+        for metric, kind, help_text, value in (
+            ('cache_hits_total', 'counter', 'Попадания в кэш', lambda s: s['hits']),
+            ('cache_misses_total', 'counter', 'Промахи кэша', lambda s: s['misses']),
+            ('cache_entries', 'gauge', 'Записей в кэше', lambda s: s['size']),
+            ('cache_hit_ratio', 'gauge', 'Доля попаданий с запуска процесса',
+             lambda s: round(s['hits'] / (s['hits'] + s['misses']), 4) if s['hits'] + s['misses'] else 0.0),
+        ):
+            yield f'# HELP {metric} {help_text}'
+            yield f'# TYPE {metric} {kind}'
+            for name, stats in caches:
+                yield f'{metric}{_format_labels(("cache",), (name,))} {_format_value(value(stats))}'
+
+    def render(self):
+        lines = []
+        for metric in self.registry:
+            lines.extend(metric.render())
+        lines.extend(self._render_caches())
+        return '\n'.join(lines) + '\n'
+
+    def view(self):
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,132 @@
+"""Встроенные версионные миграции схемы.
+
+Каждая миграция - (версия, описание, шаги). Шаг - SQL-строка или функция,
+принимающая соединение. Примененные версии хранятся в schema_migrations,
+каждая миграция выполняется в своей транзакции."""
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from models import Recipe, RecipeIngredient, StatRollup
+from rollups import rebuild_rollups
+
+
+def _dedupe_daily_stats(conn):
+    # До уникального ключа за один день могли появиться дубли строк статистики:
+    # оставляем последнюю и пересчитываем её по meals
+    duplicates = conn.execute(text(
+        'SELECT user_id, date FROM daily_stats GROUP BY user_id, date HAVING COUNT(*) > 1'
+    )).fetchall()
+    for user_id, day in duplicates:
+        conn.execute(text(
+            'DELETE FROM daily_stats WHERE user_id = :user_id AND date = :day AND id <> '
+            '(SELECT MAX(id) FROM daily_stats WHERE user_id = :user_id AND date = :day)'
+        ), {'user_id': user_id, 'day': day})
+        conn.execute(text(
+            'UPDATE daily_stats SET '
+            'total_grams = (SELECT COALESCE(SUM(grams), 0) FROM meals m WHERE m.user_id = :user_id AND m.date = :day), '
+            'total_calories = (SELECT COALESCE(SUM(calories), 0) FROM meals m WHERE m.user_id = :user_id AND m.date = :day), '
+            'total_proteins = (SELECT COALESCE(SUM(proteins), 0) FROM meals m WHERE m.user_id = :user_id AND m.date = :day), '
+            'total_fats = (SELECT COALESCE(SUM(fats), 0) FROM meals m WHERE m.user_id = :user_id AND m.date = :day), '
+            'total_carbs = (SELECT COALESCE(SUM(carbs), 0) FROM meals m WHERE m.user_id = :user_id AND m.date = :day) '
+            'WHERE user_id = :user_id AND date = :day'
+        ), {'user_id': user_id, 'day': day})
+
+
+def _add_diary_version(conn):
+    # В новых БД колонку уже создал create_all
+    if 'diary_version' not in {column['name'] for column in inspect(conn).get_columns('users')}:
+        conn.execute(text('ALTER TABLE users ADD COLUMN diary_version INTEGER NOT NULL DEFAULT 0'))
+
+
+MIGRATIONS = [
+    (1, 'Составные индексы (user_id, date) и уникальный ключ daily_stats', [
+        # Покрывающий индекс: суммы за день и пересборка статистики читаются без обращения к таблице
+        'CREATE INDEX IF NOT EXISTS ix_meals_user_date ON meals '
+        '(user_id, date, grams, calories, proteins, fats, carbs)',
+        _dedupe_daily_stats,
+        'CREATE UNIQUE INDEX IF NOT EXISTS uq_daily_stats_user_date ON daily_stats (user_id, date)',
+    ]),
+    (2, 'Недельные и месячные сводки stat_rollups', [
+        lambda conn: StatRollup.__table__.create(conn, checkfirst=True),
+        rebuild_rollups,
+    ]),
+    (3, 'Рецепты recipes и recipe_ingredients', [
+        lambda conn: Recipe.__table__.create(conn, checkfirst=True),
+        lambda conn: RecipeIngredient.__table__.create(conn, checkfirst=True),
+    ]),
+    (4, 'Версия дневника users.diary_version для ETag', [
+        _add_diary_version,
+    ]),
+]
+
+
+def applied_versions(conn):
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_migrations ('
+        ' version INTEGER PRIMARY KEY,'
+        ' name VARCHAR(200) NOT NULL,'
+        ' applied_at VARCHAR(32) NOT NULL)'
+    ))
+    return {row[0] for row in conn.execute(text('SELECT version FROM schema_migrations'))}
+
+
+def upgrade(engine):
+    """Применяет все еще не примененные миграции. Возвращает список примененных версий."""
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+
+    applied = []
+    for version, name, steps in MIGRATIONS:
+        if version in done:
+            continue
+        with engine.begin() as conn:
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(text(step))
+            conn.execute(
+                text('INSERT INTO schema_migrations (version, name, applied_at) VALUES (:version, :name, :applied_at)'),
+                {'version': version, 'name': name, 'applied_at': datetime.utcnow().isoformat()}
+            )
+        applied.append(version)
+    return applied
+
+
+# Горячие запросы приложения: (название, индекс, SQL, допустима ли сортировка).
+# Дневник за день сортирует несколько строк своего дня для оконной функции - это нормально,
+# а последние 30 дней статистики должны читаться прямо по индексу без сортировки.
+HOT_QUERIES = [
+    ('дневник за день', 'ix_meals_user_date',
+     'SELECT meal_type, id, name, grams, calories, proteins, fats, carbs, '
+     'SUM(calories) OVER (PARTITION BY meal_type), SUM(grams) OVER (PARTITION BY meal_type) '
+     "FROM meals WHERE user_id = 1 AND date = '2025-01-01' "
+     "AND meal_type IN ('breakfast', 'lunch', 'dinner', 'snack') ORDER BY id", True),
+    ('сумма за день', 'ix_meals_user_date',
+     'SELECT SUM(grams), SUM(calories), SUM(proteins), SUM(fats), SUM(carbs) FROM meals '
+     "WHERE user_id = 1 AND date = '2025-01-01'", False),
+    ('строка статистики за день', 'uq_daily_stats_user_date',
+     "SELECT * FROM daily_stats WHERE user_id = 1 AND date = '2025-01-01'", False),
+    ('последние 30 дней статистики', 'uq_daily_stats_user_date',
+     'SELECT * FROM daily_stats WHERE user_id = 1 ORDER BY date DESC LIMIT 30', False),
+    ('помесячная статистика за год', 'uq_stat_rollups_period',
+     "SELECT * FROM stat_rollups WHERE user_id = 1 AND granularity = 'month' "
+     "AND period_start >= '2025-01-01' AND period_start <= '2025-12-31' ORDER BY period_start", False),
+]
+
+
+def explain_hot_queries(engine):
+    """EXPLAIN QUERY PLAN для горячих запросов (только SQLite).
+
+    Возвращает список (название, план, ок). Запрос ок, если ищет по ожидаемому
+    индексу, не сканирует таблицу целиком и не сортирует там, где это не ожидается."""
+    report = []
+    with engine.connect() as conn:
+        for name, index, sql, allow_sort in HOT_QUERIES:
+            plan = [row[-1] for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql)]
+            ok = any(line.startswith('SEARCH') and index in line for line in plan) \
+                and not any(line.startswith('SCAN') and 'subquery' not in line for line in plan) \
+                and (allow_sort or not any('TEMP B-TREE' in line for line in plan))
+            report.append((name, plan, ok))
+    return report
@@ -0,0 +1,116 @@
+from datetime import date
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects import postgresql, sqlite
+
+db = SQLAlchemy()
+
+
+def insert_on_conflict(model, values, index_elements, set_):
+    """INSERT ... ON CONFLICT (index_elements) DO UPDATE для SQLite и PostgreSQL.
+
+    set_ получает excluded-строку и возвращает словарь обновляемых колонок."""
+    dialect = postgresql if db.session.get_bind().dialect.name == 'postgresql' else sqlite
+    stmt = dialect.insert(model).values(**values)
+    return stmt.on_conflict_do_update(index_elements=index_elements, set_=set_(stmt.excluded))
+
+class User(db.Model):
+    __tablename__ = 'users'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    login = db.Column(db.String(80), unique=True, nullable=False)
+    password = db.Column(db.String(120), nullable=False)
+    age = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    weight = db.Column(db.Float)
+    gender = db.Column(db.String(10))    
+    # Растет при каждом изменении дневника - из нее строятся ETag страниц (http_cache.py)
+    diary_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Связи не подгружаются неявно (N+1 из шаблонов) - только явным selectinload()
+    meals = db.relationship('Meal', backref='user', lazy='raise_on_sql')
+
+class Meal(db.Model):
+    __tablename__ = 'meals'
+    # Индексы создаются миграцией 1 (migrations.py), здесь - для новых БД
+    __table_args__ = (
+        db.Index('ix_meals_user_date', 'user_id', 'date', 'grams', 'calories', 'proteins', 'fats', 'carbs'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    date = db.Column(db.Date, default=date.today)
+    meal_type = db.Column(db.String(10))  # 'breakfast', 'lunch', 'dinner'
+    name = db.Column(db.String(100))
+    grams = db.Column(db.Float)
+    calories = db.Column(db.Float)
+    proteins = db.Column(db.Float)
+    fats = db.Column(db.Float)
+    carbs = db.Column(db.Float)
+
+class DailyStat(db.Model):
+    __tablename__ = 'daily_stats'
+    __table_args__ = (
+        db.Index('uq_daily_stats_user_date', 'user_id', 'date', unique=True),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    date = db.Column(db.Date, default=date.today)
+    total_grams = db.Column(db.Float)
+    total_calories = db.Column(db.Float)
+    total_proteins = db.Column(db.Float)
+    total_fats = db.Column(db.Float)
+    total_carbs = db.Column(db.Float)
+    
+    # Добавляем связь с пользователем
+    user = db.relationship('User', backref=db.backref('daily_stats', lazy='raise_on_sql'))
+
+# Недельные и месячные агрегаты daily_stats (поддерживаются rollups.py)
+class StatRollup(db.Model):
+    __tablename__ = 'stat_rollups'
+    __table_args__ = (
+        db.Index('uq_stat_rollups_period', 'user_id', 'granularity', 'period_start', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    granularity = db.Column(db.String(5), nullable=False)  # 'week', 'month'
+    period_start = db.Column(db.Date, nullable=False)
+    days = db.Column(db.Integer, nullable=False)  # дней с записями о питании
+    sum_grams = db.Column(db.Float)
+    sum_calories = db.Column(db.Float)
+    sum_proteins = db.Column(db.Float)
+    sum_fats = db.Column(db.Float)
+    sum_carbs = db.Column(db.Float)
+    min_calories = db.Column(db.Float)
+    max_calories = db.Column(db.Float)
+
+# Рецепт: состав и сохраненная пищевая ценность на 100 г (пересчитывается recipes.py при изменении состава)
+class Recipe(db.Model):
+    __tablename__ = 'recipes'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    name = db.Column(db.String(100), nullable=False)
+    total_grams = db.Column(db.Float, default=0)
+    calories_100g = db.Column(db.Float, default=0)
+    proteins_100g = db.Column(db.Float, default=0)
+    fats_100g = db.Column(db.Float, default=0)
+    carbs_100g = db.Column(db.Float, default=0)
+
+    ingredients = db.relationship('RecipeIngredient', backref='recipe', lazy='selectin',
+                                  cascade='all, delete-orphan', order_by='RecipeIngredient.id')
+
+# Ингредиент рецепта: продукт FatSecret (food_id) или ручной ввод, ценность - на указанные граммы
+class RecipeIngredient(db.Model):
+    __tablename__ = 'recipe_ingredients'
+
+    id = db.Column(db.Integer, primary_key=True)
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipes.id'), nullable=False, index=True)
+    food_id = db.Column(db.String(20))  # None - ручной ввод
+    serving_id = db.Column(db.String(20))
+    name = db.Column(db.String(100), nullable=False)
+    grams = db.Column(db.Float, nullable=False)
+    calories = db.Column(db.Float, default=0)
+    proteins = db.Column(db.Float, default=0)
+    fats = db.Column(db.Float, default=0)
+    carbs = db.Column(db.Float, default=0)
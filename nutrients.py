@@ -0,0 +1,147 @@
+"""Пищевая ценность продуктов FatSecret в пересчете на грамм.
+
+Ответ food.get содержит несколько порций (serving) со строковыми полями.
+parse_food разбирает их один раз: для каждой порции - вес в граммах и
+вектор калорий/белков/жиров/углеводов на 1 г (array('d') в __slots__-записи).
+Дальше любой расчет (продукт, порция, количество) - умножение вектора,
+а пакетный расчет для рецептов и планов питания - одно матричное умножение."""
+from array import array
+
+import numpy as np
+
+from cache import TTLCache
+
+# Поля порции FatSecret в порядке вектора
+NUTRIENTS = ('calories', 'protein', 'fat', 'carbohydrate')
+
+# Граммов в единице metric_serving_unit (мл считаем за граммы, как и раньше)
+UNIT_GRAMS = {'g': 1.0, 'ml': 1.0, 'oz': 28.3495}
+
+
+def _number(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class Serving:
+    __slots__ = ('serving_id', 'description', 'grams', 'per_gram')
+
+    def __init__(self, serving_id, description, grams, per_gram):
+        self.serving_id = serving_id
+        self.description = description
+        self.grams = grams
+        self.per_gram = per_gram
+
+
+class FoodNutrients:
+    __slots__ = ('food_id', 'name', 'servings', 'default')
+
+    def __init__(self, food_id, name, servings):
+        self.food_id = food_id
+        self.name = name
+        self.servings = servings
+        # Порция по умолчанию - первая, как в ответе FatSecret
+        self.default = servings[0] if servings else None
+
+    def serving(self, serving_id=None):
+        if self.default is None:
+            raise ValueError('Нет информации о порциях')
+        if serving_id is None:
+            return self.default
+        for serving in self.servings:
+            if serving.serving_id == str(serving_id):
+                return serving
+        raise ValueError(f'Нет порции {serving_id} у продукта {self.food_id}')
+
+
+def parse_serving(serving, default_grams=None):
+    """Порция FatSecret -> Serving или None, если вес порции неизвестен"""
+    unit = UNIT_GRAMS.get((serving.get('metric_serving_unit') or 'g').lower())
+    grams = _number(serving.get('metric_serving_amount', serving.get('grams', default_grams)))
+    if unit is None or grams <= 0:
+        return None
+    grams *= unit
+    return Serving(
+        str(serving.get('serving_id', '')),
+        serving.get('serving_description', ''),
+        grams,
+        array('d', (_number(serving.get(name)) / grams for name in NUTRIENTS))
+    )
+
+
+def parse_food(food):
+    servings = (food.get('servings') or {}).get('serving') or []
+    if isinstance(servings, dict):
+        servings = [servings]
+    parsed = [serving for serving in map(parse_serving, servings) if serving is not None]
+    if not parsed and servings:
+        # Ни у одной порции нет веса - как раньше, считаем первую за 100 г
+        fallback = parse_serving(servings[0], default_grams=100)
+        parsed = [fallback] if fallback else []
+    return FoodNutrients(str(food.get('food_id', '')), food.get('food_name', ''), parsed)
+
+
+def as_dict(vector, grams):
+    """Вектор NUTRIENTS -> словарь с округлением как в дневнике"""
+    calories, protein, fat, carbohydrate = vector
+    return {
+        'grams': grams,
+        'calories': round(calories),
+        'protein': round(protein, 1),
+        'fat': round(fat, 1),
+        'carbohydrate': round(carbohydrate, 1),
+    }
+
+
+class NutrientStore:
+    """Кэш разобранных продуктов и результатов расчета (продукт, порция, граммы)"""
+
+    def __init__(self, maxsize=4096, ttl=24 * 3600):
+        self.foods = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.results = TTLCache(maxsize=maxsize * 4, ttl=ttl)
+
+    def parsed(self, food):
+        food_id = str(food.get('food_id', ''))
+        nutrients = self.foods.get(food_id) if food_id else None
+        if nutrients is None:
+            nutrients = parse_food(food)
+            if food_id:
+                self.foods.set(food_id, nutrients)
+        return nutrients
+
+    def vector(self, food, grams=None, serving_id=None, units=None):
+        """Вектор NUTRIENTS для количества: граммы или число порций (units)"""
+        serving = self.parsed(food).serving(serving_id)
+        if grams is None:
+            grams = serving.grams * (1 if units is None else units)
+        return [value * grams for value in serving.per_gram], grams
+
+    def calculate(self, food, grams=None, serving_id=None, units=None):
+        serving_id = None if serving_id is None else str(serving_id)
+        key = (str(food.get('food_id', '')), serving_id, grams, units)
+        result = self.results.get(key) if key[0] else None
+        if result is None:
+            result = as_dict(*self.vector(food, grams, serving_id, units))
+            if key[0]:
+                self.results.set(key, result)
+        return dict(result)
+
+    def per_100g(self, food):
+        return self.calculate(food, grams=100)
+
+    def calculate_many(self, items):
+        """Пакетный расчет: items - [(food, grams, serving_id), ...].
+
+        Возвращает (массив (n, 4) по позициям, итоговый вектор)."""
+        if not items:
+            return np.zeros((0, len(NUTRIENTS))), np.zeros(len(NUTRIENTS))
+        per_gram = np.array([self.parsed(food).serving(serving_id).per_gram
+                             for food, _, serving_id in items])
+        grams = np.array([grams for _, grams, _ in items], dtype=float)
+        rows = per_gram * grams[:, None]
+        return rows, rows.sum(axis=0)
+
+    def stats(self):
+        return {'foods': self.foods.stats(), 'results': self.results.stats()}
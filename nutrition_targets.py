@@ -0,0 +1,75 @@
+"""Нормы пользователя: ИМТ, базовый обмен (BMR), суточная норма калорий (DCI/TDEE) и БЖУ.
+
+Формулы те же, что в dci.html: Миффлина-Сан Жеора или Харриса-Бенедикта,
+DCI = BMR x коэффициент активности, БЖУ 30/25/45% калорий.
+Расчет кэшируется по (возраст, рост, вес, пол, активность, формула), так
+что изменение профиля само дает новый ключ и сбрасывать кэш не нужно."""
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+ACTIVITY_LEVELS = (1.2, 1.375, 1.55, 1.725, 1.9)
+FORMULAS = ('mifflin', 'harris')
+
+# Калорийность грамма белков, жиров и углеводов
+KCAL_PER_GRAM = {'proteins': 4, 'fats': 9, 'carbs': 4}
+
+# Доли калорий из белков, жиров и углеводов
+MACRO_SPLIT = {'proteins': 0.30, 'fats': 0.25, 'carbs': 0.45}
+
+Targets = namedtuple('Targets', 'bmi bmi_category bmr dci proteins fats carbs')
+
+
+def body_mass_index(weight, height):
+    return round(weight / ((height / 100) ** 2), 1)
+
+
+def bmi_category(value):
+    if value < 18.5:
+        return "Недостаточный вес"
+    if value < 25:
+        return "Нормальный вес"
+    if value < 30:
+        return "Избыточный вес"
+    return "Ожирение"
+
+
+def basal_metabolic_rate(age, height, weight, gender, formula='mifflin'):
+    if formula == 'mifflin':
+        value = 10 * weight + 6.25 * height - 5 * age
+        return value - 161 if gender == 'female' else value + 5
+    if gender == 'female':
+        return 655.1 + 9.563 * weight + 1.85 * height - 4.676 * age
+    return 66.5 + 13.75 * weight + 5.003 * height - 6.755 * age
+
+
+@lru_cache(maxsize=4096)
+def compute_targets(age, height, weight, gender, activity=ACTIVITY_LEVELS[0], formula='mifflin'):
+    """Нормы по полям профиля; то, что нельзя посчитать по неполному профилю, - None"""
+    bmi = body_mass_index(weight, height) if height and weight else None
+    if not (age and height and weight and gender):
+        return Targets(bmi, bmi_category(bmi) if bmi else None, None, None, None, None, None)
+
+    bmr = basal_metabolic_rate(age, height, weight, gender, formula)
+    dci = round(bmr * activity)
+    macros = {name: round(dci * share / KCAL_PER_GRAM[name]) for name, share in MACRO_SPLIT.items()}
+    return Targets(bmi, bmi_category(bmi), round(bmr), dci, **macros)
+
+
+def targets_for(user, activity=ACTIVITY_LEVELS[0], formula='mifflin'):
+    if user is None:
+        return None
+    return compute_targets(user.age, user.height, user.weight, user.gender, activity, formula)
+
+
+def progress_vs_target(calories, proteins, fats, carbs, targets):
+    """Выполнение нормы в процентах для всех дней сразу.
+
+    Принимает последовательности итогов дней, возвращает массив (n, 4):
+    калории, белки, жиры, углеводы в % от нормы (NaN, если нормы нет)."""
+    eaten = np.array([calories, proteins, fats, carbs], dtype=float).T
+    if targets is None or not targets.dci:
+        return np.full(eaten.shape, np.nan)
+    norm = np.array([targets.dci, targets.proteins, targets.fats, targets.carbs], dtype=float)
+    return np.round(np.nan_to_num(eaten) * 100 / norm, 1)
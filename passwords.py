@@ -0,0 +1,115 @@
+"""Версионированные хеши паролей на медленных KDF (scrypt или PBKDF2-SHA256).
+
+Формат хеша (помещается в users.password, String(120)):
+    scrypt$<log2 N>$<r>$<p>$<соль>$<хеш>
+    pbkdf2_sha256$<итерации>$<соль>$<хеш>
+соль и хеш - base64 без '='. Старые хеши - 64 hex-символа несоленого SHA-256,
+они проверяются по-старому и после успешного входа перехешируются.
+
+Вычисление KDF выполняется в ограниченном пуле потоков: hashlib отпускает GIL,
+одновременно считается не больше workers хешей, в очереди ждет не больше
+queue_size, остальные сразу получают PasswordHasherBusy, а не занимают воркер
+веб-сервера на неопределенное время."""
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+SCHEMES = ('scrypt', 'pbkdf2_sha256')
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+
+class PasswordHasherBusy(Exception):
+    """Пул хеширования переполнен - запрос стоит повторить позже"""
+
+
+def _b64encode(data):
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+
+def _b64decode(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def is_legacy_hash(stored):
+    return len(stored) == 64 and '$' not in stored
+
+
+class PasswordHasher:
+
+    def __init__(self, scheme='scrypt', scrypt_log_n=14, scrypt_r=8, scrypt_p=1,
+                 pbkdf2_iterations=600000, workers=4, queue_size=32, timeout=10):
+        if scheme not in SCHEMES:
+            raise ValueError(f'Неизвестная схема хеширования: {scheme}')
+        self.scheme = scheme
+        self.scrypt_log_n = scrypt_log_n
+        self.scrypt_r = scrypt_r
+        self.scrypt_p = scrypt_p
+        self.pbkdf2_iterations = pbkdf2_iterations
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self.rejected = 0
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=0):
+            self.rejected += 1
+            raise PasswordHasherBusy('Слишком много одновременных проверок пароля')
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise PasswordHasherBusy('Проверка пароля не уложилась в отведенное время')
+
+    def _params(self):
+        if self.scheme == 'scrypt':
+            return [str(self.scrypt_log_n), str(self.scrypt_r), str(self.scrypt_p)]
+        return [str(self.pbkdf2_iterations)]
+
+    @staticmethod
+    def _derive(scheme, params, password, salt):
+        if scheme == 'scrypt':
+            n, r, p = 2 ** int(params[0]), int(params[1]), int(params[2])
+            return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+                                  maxmem=256 * n * r * p, dklen=HASH_BYTES)
+        return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt,
+                                   int(params[0]), dklen=HASH_BYTES)
+
+    def hash(self, password):
+        salt = os.urandom(SALT_BYTES)
+        params = self._params()
+        digest = self._run(self._derive, self.scheme, params, password, salt)
+        return '$'.join([self.scheme, *params, _b64encode(salt), _b64encode(digest)])
+
+    def verify(self, password, stored):
+        """Возвращает (пароль верный, хеш стоит пересчитать текущей схемой)"""
+        if not stored:
+            return False, False
+        if is_legacy_hash(stored):
+            legacy = hashlib.sha256(password.encode('utf-8')).hexdigest()
+            ok = hmac.compare_digest(legacy, stored)
+            return ok, ok
+
+        scheme, *fields = stored.split('$')
+        if scheme not in SCHEMES:
+            return False, False
+        *params, salt, expected = fields
+        digest = self._run(self._derive, scheme, params, password, _b64decode(salt))
+        ok = hmac.compare_digest(digest, _b64decode(expected))
+        return ok, ok and (scheme != self.scheme or params != self._params())
+
+    def dummy_verify(self, password):
+        """Тратит столько же времени, сколько проверка настоящего хеша -
+        чтобы по времени ответа нельзя было понять, существует ли логин"""
+        self._run(self._derive, self.scheme, self._params(), password, bytes(SALT_BYTES))
+
+    def stats(self):
+        return {'scheme': self.scheme, 'params': self._params(), 'rejected': self.rejected}
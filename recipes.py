@@ -0,0 +1,140 @@
+"""Рецепты (составные блюда) с сохраненной пищевой ценностью на 100 г.
+
+Ценность ингредиента считается один раз при добавлении (из кэша продуктов
+FatSecret через NutrientStore или из ручного ввода) и хранится в строке
+ингредиента, итог рецепта на 100 г пересчитывается только при изменении
+состава. Запись рецепта в дневник - один Meal без обращений к FatSecret."""
+from datetime import date
+
+from models import Meal, Recipe, RecipeIngredient
+
+NUTRIENT_COLUMNS = ('calories', 'proteins', 'fats', 'carbs')
+
+# Максимум ингредиентов в рецепте
+MAX_INGREDIENTS = 100
+
+
+def _positive(value, field):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{field}: не число ({value})')
+    if not 0 < value < 100000:
+        raise ValueError(f'{field}: недопустимое значение {value}')
+    return value
+
+
+def _parse_item(data, load_food, nutrient_store):
+    """Словарь из запроса -> (RecipeIngredient, (food, grams, serving_id) или None).
+
+    Для продукта FatSecret ценность заполняет parse_ingredients пакетным расчетом."""
+    if not isinstance(data, dict):
+        raise ValueError('Ингредиент должен быть объектом')
+    grams = _positive(data['grams'], 'grams') if data.get('grams') is not None else None
+
+    if data.get('food_id'):
+        food = load_food(str(data['food_id']))
+        if not food:
+            raise ValueError(f"Продукт {data['food_id']} не найден")
+        serving_id = data.get('serving_id')
+        units = _positive(data['units'], 'units') if data.get('units') is not None else None
+        if grams is None and units is None:
+            raise ValueError('Укажите grams или units')
+        if grams is None:
+            grams = nutrient_store.parsed(food).serving(serving_id).grams * units
+        ingredient = RecipeIngredient(
+            food_id=str(data['food_id']),
+            serving_id=str(serving_id) if serving_id is not None else None,
+            name=(food.get('food_name') or 'Неизвестный продукт')[:100],
+            grams=grams,
+        )
+        return ingredient, (food, grams, serving_id)
+
+    name = str(data.get('name') or '').strip()
+    if not name:
+        raise ValueError('Укажите food_id или название ингредиента')
+    if grams is None:
+        raise ValueError('Укажите grams')
+    values = {}
+    for column in NUTRIENT_COLUMNS:
+        try:
+            values[column] = float(data.get(column) or 0)
+        except (TypeError, ValueError):
+            raise ValueError(f'{column}: не число ({data.get(column)})')
+    return RecipeIngredient(name=name[:100], grams=grams, **values), None
+
+
+def parse_ingredients(items, load_food, nutrient_store):
+    """Список словарей из запроса -> [RecipeIngredient].
+
+    {"food_id": ..., "grams": ..., "serving_id": ...} или {"food_id": ..., "serving_id": ..., "units": 2} -
+    продукт FatSecret (load_food(food_id)),
+    {"name": ..., "grams": ..., "calories": ..., "proteins": ..., ...} - ручной ввод.
+    Ценность всех продуктов FatSecret считается одним NutrientStore.calculate_many."""
+    parsed = [_parse_item(data, load_food, nutrient_store) for data in items]
+    rows, _ = nutrient_store.calculate_many([item for _, item in parsed if item is not None])
+    rows = iter(rows.tolist())
+    for ingredient, item in parsed:
+        if item is not None:
+            for column, value in zip(NUTRIENT_COLUMNS, next(rows)):
+                setattr(ingredient, column, value)
+    return [ingredient for ingredient, _ in parsed]
+
+
+def parse_ingredient(data, load_food, nutrient_store):
+    return parse_ingredients([data], load_food, nutrient_store)[0]
+
+
+def recompute_recipe(recipe):
+    """Пересчитывает вес и ценность рецепта на 100 г по сохраненным ингредиентам"""
+    total_grams = sum(ingredient.grams for ingredient in recipe.ingredients)
+    recipe.total_grams = total_grams
+    for column in NUTRIENT_COLUMNS:
+        total = sum(getattr(ingredient, column) or 0 for ingredient in recipe.ingredients)
+        setattr(recipe, f'{column}_100g', total * 100 / total_grams if total_grams else 0)
+
+
+def meal_from_recipe(recipe, user_id, grams, meal_type, day=None):
+    """Один прием пищи из рецепта по сохраненной ценности на 100 г"""
+    ratio = grams / 100
+    return Meal(
+        user_id=user_id,
+        date=day or date.today(),
+        meal_type=meal_type,
+        name=recipe.name,
+        grams=grams,
+        **{column: round(getattr(recipe, f'{column}_100g') * ratio, 1) for column in NUTRIENT_COLUMNS}
+    )
+
+
+def recipe_as_dict(recipe):
+    return {
+        'id': recipe.id,
+        'name': recipe.name,
+        'total_grams': round(recipe.total_grams or 0, 1),
+        'per_100g': {column: round(getattr(recipe, f'{column}_100g') or 0, 1) for column in NUTRIENT_COLUMNS},
+        'ingredients': [
+            {
+                'id': ingredient.id,
+                'food_id': ingredient.food_id,
+                'serving_id': ingredient.serving_id,
+                'name': ingredient.name,
+                'grams': ingredient.grams,
+                **{column: round(getattr(ingredient, column) or 0, 1) for column in NUTRIENT_COLUMNS},
+            }
+            for ingredient in recipe.ingredients
+        ],
+    }
+
+
+def new_recipe(user_id, name, ingredients):
+    name = str(name or '').strip()
+    if not name:
+        raise ValueError('Укажите название рецепта')
+    if not ingredients:
+        raise ValueError('В рецепте нет ингредиентов')
+    if len(ingredients) > MAX_INGREDIENTS:
+        raise ValueError(f'Не более {MAX_INGREDIENTS} ингредиентов')
+    recipe = Recipe(user_id=user_id, name=name[:100], ingredients=ingredients)
+    recompute_recipe(recipe)
+    return recipe
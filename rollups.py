@@ -0,0 +1,197 @@
+"""Недельные и месячные сводки статистики (stat_rollups) и выборка диапазонов для графиков.
+
+Сводка хранит суммы, число дней с записями и min/max калорий за период,
+поэтому средние и доли БЖУ считаются при чтении, а год на графике - это
+12 месячных или 53 недельные строки вместо 365 строк daily_stats.
+Сводки обновляются вместе с daily_stats (refresh_rollups) и
+пересобираются целиком одним INSERT ... SELECT (rebuild_rollups)."""
+from datetime import timedelta
+
+from sqlalchemy import delete, func, or_, select, text
+
+from models import db, insert_on_conflict, DailyStat, StatRollup
+from nutrition_targets import KCAL_PER_GRAM
+
+GRANULARITIES = ('week', 'month')
+
+# Колонка DailyStat -> колонка StatRollup
+ROLLUP_COLUMNS = (
+    ('total_grams', 'sum_grams'),
+    ('total_calories', 'sum_calories'),
+    ('total_proteins', 'sum_proteins'),
+    ('total_fats', 'sum_fats'),
+    ('total_carbs', 'sum_carbs'),
+)
+
+# Больше стольких периодов (после импорта) - сводки пользователя пересобираются одним запросом
+REFRESH_REBUILD_LIMIT = 16
+
+# Выбор уровня для granularity=auto по длине диапазона в днях
+AUTO_DAY_LIMIT = 62
+AUTO_WEEK_LIMIT = 366
+
+# Начало периода в SQL: неделя с понедельника, месяц с первого числа
+_SQLITE_PERIOD = {
+    'week': "date(date, '-' || ((CAST(strftime('%w', date) AS INTEGER) + 6) % 7) || ' days')",
+    'month': "date(date, 'start of month')",
+}
+_POSTGRESQL_PERIOD = {
+    'week': "CAST(date_trunc('week', date) AS DATE)",
+    'month': "CAST(date_trunc('month', date) AS DATE)",
+}
+
+
+def period_start(granularity, day):
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def period_end(granularity, day):
+    """Первый день следующего периода"""
+    start = period_start(granularity, day)
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    if granularity == 'month':
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def _logged():
+    # Пустые дни (все приемы пищи удалены) в средние не попадают
+    return or_(DailyStat.total_grams > 0, DailyStat.total_calories > 0)
+
+
+def _refresh_period(user_id, granularity, start):
+    end = period_end(granularity, start)
+    row = db.session.execute(
+        select(
+            func.count(),
+            *[func.coalesce(func.sum(getattr(DailyStat, column)), 0) for column, _ in ROLLUP_COLUMNS],
+            func.min(DailyStat.total_calories), func.max(DailyStat.total_calories)
+        ).where(
+            DailyStat.user_id == user_id,
+            DailyStat.date >= start, DailyStat.date < end,
+            _logged()
+        )
+    ).one()
+
+    if not row[0]:
+        db.session.execute(delete(StatRollup).where(
+            StatRollup.user_id == user_id,
+            StatRollup.granularity == granularity,
+            StatRollup.period_start == start
+        ))
+        return
+
+    values = dict(zip([rollup for _, rollup in ROLLUP_COLUMNS], row[1:-2]))
+    values.update(days=row[0], min_calories=row[-2], max_calories=row[-1])
+    db.session.execute(insert_on_conflict(
+        StatRollup,
+        dict(user_id=user_id, granularity=granularity, period_start=start, **values),
+        ['user_id', 'granularity', 'period_start'],
+        lambda excluded: {column: getattr(excluded, column) for column in values}
+    ))
+
+
+def refresh_rollups(user_id, *days):
+    """Пересчитывает недельные и месячные сводки, в которые входят дни,
+    по строкам daily_stats в текущей транзакции (каждый период - один раз)"""
+    db.session.flush()
+    periods = {
+        (granularity, period_start(granularity, day))
+        for granularity in GRANULARITIES for day in days
+    }
+    if len(periods) > REFRESH_REBUILD_LIMIT:
+        rebuild_rollups(db.session.connection(), user_id=user_id)
+        return
+    for granularity, start in sorted(periods):
+        _refresh_period(user_id, granularity, start)
+
+
+def rebuild_rollups(conn, user_id=None):
+    """Пересобирает stat_rollups по daily_stats одним INSERT ... SELECT на уровень.
+    conn - соединение SQLAlchemy (сессии или миграции)"""
+    periods = _POSTGRESQL_PERIOD if conn.dialect.name == 'postgresql' else _SQLITE_PERIOD
+    user_filter = ' AND user_id = :user_id' if user_id is not None else ''
+    params = {'user_id': user_id}
+
+    conn.execute(text('DELETE FROM stat_rollups WHERE 1 = 1' + user_filter), params)
+    for granularity in GRANULARITIES:
+        conn.execute(text(
+            'INSERT INTO stat_rollups (user_id, granularity, period_start, days, '
+            + ', '.join(rollup for _, rollup in ROLLUP_COLUMNS) + ', min_calories, max_calories) '
+            f"SELECT user_id, '{granularity}', {periods[granularity]} AS period, COUNT(*), "
+            + ', '.join(f'COALESCE(SUM({column}), 0)' for column, _ in ROLLUP_COLUMNS)
+            + ', MIN(total_calories), MAX(total_calories) '
+            'FROM daily_stats WHERE (total_grams > 0 OR total_calories > 0)' + user_filter
+            + ' GROUP BY user_id, period'
+        ), params)
+
+
+def choose_granularity(start, end):
+    days = (end - start).days + 1
+    if days <= AUTO_DAY_LIMIT:
+        return 'day'
+    if days <= AUTO_WEEK_LIMIT:
+        return 'week'
+    return 'month'
+
+
+def _point(start, days, sums, min_calories, max_calories):
+    grams, calories, proteins, fats, carbs = sums
+    macro_kcal = {
+        'proteins': proteins * KCAL_PER_GRAM['proteins'],
+        'fats': fats * KCAL_PER_GRAM['fats'],
+        'carbs': carbs * KCAL_PER_GRAM['carbs'],
+    }
+    macro_total = sum(macro_kcal.values())
+    return {
+        'period_start': start.isoformat(),
+        'days': days,
+        'avg_calories': round(calories / days, 1),
+        'avg_grams': round(grams / days, 1),
+        'avg_proteins': round(proteins / days, 1),
+        'avg_fats': round(fats / days, 1),
+        'avg_carbs': round(carbs / days, 1),
+        'min_calories': round(min_calories or 0, 1),
+        'max_calories': round(max_calories or 0, 1),
+        'macro_percent': {
+            name: round(kcal * 100 / macro_total, 1) if macro_total else 0
+            for name, kcal in macro_kcal.items()
+        },
+    }
+
+
+def load_stats_range(user_id, start, end, granularity):
+    """Точки графика за [start, end]: дни из daily_stats, недели и месяцы из stat_rollups.
+    Для недель и месяцев берутся все периоды, пересекающиеся с диапазоном."""
+    if granularity == 'day':
+        rows = db.session.execute(
+            select(DailyStat.date, *[getattr(DailyStat, column) for column, _ in ROLLUP_COLUMNS])
+            .where(DailyStat.user_id == user_id, DailyStat.date >= start, DailyStat.date <= end, _logged())
+            .order_by(DailyStat.date)
+        )
+        return [
+            _point(row[0], 1, [value or 0 for value in row[1:]], row[2], row[2])
+            for row in rows
+        ]
+
+    rows = db.session.execute(
+        select(
+            StatRollup.period_start, StatRollup.days,
+            *[getattr(StatRollup, rollup) for _, rollup in ROLLUP_COLUMNS],
+            StatRollup.min_calories, StatRollup.max_calories
+        ).where(
+            StatRollup.user_id == user_id,
+            StatRollup.granularity == granularity,
+            StatRollup.period_start >= period_start(granularity, start),
+            StatRollup.period_start <= end
+        ).order_by(StatRollup.period_start)
+    )
+    return [
+        _point(row[0], row[1], [value or 0 for value in row[2:-2]], row[-2], row[-1])
+        for row in rows
+    ]
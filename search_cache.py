@@ -0,0 +1,42 @@
+from cache import SingleFlight, TTLCache
+
+
+def normalize_query(query):
+    """Приводит запрос к каноническому виду: регистр и лишние пробелы не важны"""
+    return ' '.join(query.lower().split())
+
+
+class SearchCache:
+    """Кэш результатов foods.search с объединением одинаковых запросов в полёте"""
+
+    def __init__(self, maxsize=512, ttl=600):
+        self.results = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.flight = SingleFlight()
+
+    @staticmethod
+    def make_key(query, region, language, max_results):
+        return (normalize_query(query), (region or '').upper(), (language or '').lower(), max_results)
+
+    def get_or_search(self, query, region, language, max_results, search):
+        """search(query, region, language, max_results) вызывается только при промахе,
+        причём один раз на все одновременные одинаковые запросы"""
+        key = self.make_key(query, region, language, max_results)
+        foods = self.results.get(key)
+        if foods is not None:
+            return foods
+
+        def load():
+            # Пока ждали блокировку, результат мог положить другой поток
+            cached = self.results.get(key)
+            if cached is not None:
+                return cached
+            found = search(key[0], key[1], key[2], max_results) or []
+            self.results.set(key, found)
+            return found
+
+        return self.flight.do(key, load)
+
+    def stats(self):
+        stats = self.results.stats()
+        stats['coalesced'] = self.flight.coalesced
+        return stats
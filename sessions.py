@@ -0,0 +1,390 @@
+"""Серверные сессии: в cookie - только случайный id, данные - в хранилище.
+
+Хранилища (SESSION_BACKEND):
+  memory - LRU в памяти процесса (один воркер, сессии теряются при перезапуске);
+  sqlite - таблица sessions в instance/sessions.db (по умолчанию, общая для воркеров);
+  redis  - Redis или совместимый сервер (KeyDB, Valkey) по SESSION_REDIS_URL,
+           нужен пакет redis.
+
+Перед хранилищем - горячий кэш в памяти с разобранными данными сессии. Страницы,
+требующие входа (login_required), дополнительно сверяют по хранилищу, что сессия
+не удалена, - поиск по ключу без чтения данных. Поэтому выход и смена пароля
+отзывают сессии сразу во всех процессах. Срок жизни скользящий: при активности
+сессия продлевается, но в хранилище это пишется не чаще раза в SESSION_REFRESH секунд."""
+import json
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, jsonify, redirect, session, url_for
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from cache import TTLCache
+from storage import apply_pragmas
+
+
+class ServerSession(CallbackDict, SessionMixin):
+
+    def __init__(self, initial=None, sid=None, expires_at=None, touched_at=None, verified=False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.touched_at = touched_at
+        self.new = sid is None
+        self.modified = False
+        self.accessed = False
+        self.rotate = False
+        # Загружена из хранилища в этом запросе (а не из кэша процесса)
+        self.verified = verified
+
+    # Как в SecureCookieSession: чтение отмечается, чтобы Vary: Cookie ставить только там,
+    # где ответ действительно зависит от сессии (статика кэшируется общими кэшами)
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+    def setdefault(self, key, default=None):
+        self.accessed = True
+        return super().setdefault(key, default)
+
+    def regenerate(self):
+        """Новый id сессии с теми же данными - после входа (защита от фиксации сессии)"""
+        self.rotate = True
+        self.modified = True
+
+
+class MemorySessionStore:
+    """Сессии в памяти процесса с вытеснением самых давно использованных"""
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, sid):
+        with self._lock:
+            record = self._data.get(sid)
+            if record is None:
+                return None
+            self._data.move_to_end(sid)
+            return record
+
+    def save(self, sid, user_id, data, expires_at):
+        with self._lock:
+            self._data[sid] = (user_id, data, expires_at)
+            self._data.move_to_end(sid)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def exists(self, sid):
+        with self._lock:
+            record = self._data.get(sid)
+        return record is not None and record[2] > time.time()
+
+    def touch(self, sid, expires_at):
+        with self._lock:
+            record = self._data.get(sid)
+            if record is not None:
+                self._data[sid] = record[:2] + (expires_at,)
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+    def delete_user(self, user_id, keep=None):
+        with self._lock:
+            sids = [sid for sid, record in self._data.items() if record[0] == user_id and sid != keep]
+            for sid in sids:
+                del self._data[sid]
+        return sids
+
+    def purge_expired(self, now=None):
+        now = now or time.time()
+        with self._lock:
+            expired = [sid for sid, record in self._data.items() if record[2] < now]
+            for sid in expired:
+                del self._data[sid]
+        return len(expired)
+
+
+class SQLiteSessionStore:
+    """Сессии в отдельной SQLite базе - переживают перезапуск и общие для воркеров"""
+
+    def __init__(self, path, pragmas=()):
+        self.path = path
+        self.pragmas = pragmas
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS sessions ('
+                ' sid TEXT PRIMARY KEY,'
+                ' user_id INTEGER,'
+                ' data TEXT NOT NULL,'
+                ' expires_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_sessions_user ON sessions (user_id)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_sessions_expires ON sessions (expires_at)')
+
+    def _connect(self):
+        # Каждому потоку своё соединение - sqlite3 не любит общие соединения
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            apply_pragmas(conn, self.pragmas)
+            self._local.conn = conn
+        return conn
+
+    def load(self, sid):
+        row = self._connect().execute(
+            'SELECT user_id, data, expires_at FROM sessions WHERE sid = ?', (sid,)
+        ).fetchone()
+        if row is None:
+            return None
+        user_id, data, expires_at = row
+        return user_id, json.loads(data), expires_at
+
+    def save(self, sid, user_id, data, expires_at):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO sessions (sid, user_id, data, expires_at) VALUES (?, ?, ?, ?)',
+                (sid, user_id, json.dumps(data, ensure_ascii=False), expires_at)
+            )
+
+    def exists(self, sid):
+        return self._connect().execute(
+            'SELECT 1 FROM sessions WHERE sid = ? AND expires_at > ?', (sid, time.time())
+        ).fetchone() is not None
+
+    def touch(self, sid, expires_at):
+        with self._connect() as conn:
+            conn.execute('UPDATE sessions SET expires_at = ? WHERE sid = ?', (expires_at, sid))
+
+    def delete(self, sid):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+
+    def delete_user(self, user_id, keep=None):
+        with self._connect() as conn:
+            sids = [row[0] for row in conn.execute(
+                'SELECT sid FROM sessions WHERE user_id = ? AND sid IS NOT ?', (user_id, keep)
+            )]
+            conn.executemany('DELETE FROM sessions WHERE sid = ?', [(sid,) for sid in sids])
+        return sids
+
+    def purge_expired(self, now=None):
+        with self._connect() as conn:
+            return conn.execute('DELETE FROM sessions WHERE expires_at < ?', (now or time.time(),)).rowcount
+
+
+class RedisSessionStore:
+    """Сессии в Redis: ключ session:<sid> со сроком жизни и множество session_user:<user_id>
+    для отзыва всех сессий пользователя"""
+
+    def __init__(self, url):
+        import redis  # Нужен только для SESSION_BACKEND=redis
+
+        self.redis = redis.Redis.from_url(url)
+
+    @staticmethod
+    def _ttl(expires_at):
+        return max(1, int(expires_at - time.time()))
+
+    def load(self, sid):
+        pipe = self.redis.pipeline()
+        pipe.get(f'session:{sid}')
+        pipe.ttl(f'session:{sid}')
+        raw, ttl = pipe.execute()
+        if raw is None:
+            return None
+        record = json.loads(raw)
+        # Срок - по EXPIRE ключа: touch продлевает только его
+        return record['user_id'], record['data'], time.time() + max(ttl, 0)
+
+    def save(self, sid, user_id, data, expires_at):
+        record = json.dumps({'user_id': user_id, 'data': data}, ensure_ascii=False)
+        pipe = self.redis.pipeline()
+        pipe.set(f'session:{sid}', record, ex=self._ttl(expires_at))
+        if user_id is not None:
+            pipe.sadd(f'session_user:{user_id}', sid)
+        pipe.execute()
+
+    def exists(self, sid):
+        return bool(self.redis.exists(f'session:{sid}'))
+
+    def touch(self, sid, expires_at):
+        self.redis.expire(f'session:{sid}', self._ttl(expires_at))
+
+    def delete(self, sid):
+        self.redis.delete(f'session:{sid}')
+
+    def delete_user(self, user_id, keep=None):
+        key = f'session_user:{user_id}'
+        sids = [sid.decode() for sid in self.redis.smembers(key)]
+        sids = [sid for sid in sids if sid != keep]
+        if sids:
+            pipe = self.redis.pipeline()
+            pipe.delete(*[f'session:{sid}' for sid in sids])
+            pipe.srem(key, *sids)
+            pipe.execute()
+        return sids
+
+    def purge_expired(self, now=None):
+        # Истекшие ключи удаляет сам Redis; из индексов пользователей они уходят при отзыве
+        return 0
+
+
+class ServerSessionInterface(SessionInterface):
+    """Flask SessionInterface поверх хранилища сессий и горячего кэша в памяти"""
+
+    def __init__(self, store, lifetime=14 * 24 * 3600, refresh=300, cache_size=10000, cache_ttl=30):
+        self.store = store
+        self.lifetime = lifetime
+        self.refresh = refresh
+        # Для хранилища в памяти кэш не нужен - оно само словарь
+        self.cache = None if isinstance(store, MemorySessionStore) else TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self.revoked = 0
+        self.revoked_elsewhere = 0
+
+    def _load(self, sid):
+        """(запись, прочитана ли из хранилища)"""
+        record = self.cache.get(sid) if self.cache is not None else None
+        if record is not None:
+            return record, False
+        record = self.store.load(sid)
+        if record is not None and self.cache is not None:
+            self.cache.set(sid, record)
+        return record, True
+
+    def _forget(self, sid):
+        if self.cache is not None:
+            self.cache.pop(sid)
+        self.store.delete(sid)
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            record, from_store = self._load(sid)
+            if record is not None:
+                user_id, data, expires_at = record
+                if expires_at > time.time():
+                    return ServerSession(data, sid=sid, expires_at=expires_at,
+                                         touched_at=expires_at - self.lifetime, verified=from_store)
+                self._forget(sid)
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.sid is not None and (session.accessed or session.modified):
+            # Ответ зависит от сессии - общие кэши не должны отдавать его другим
+            response.vary.add('Cookie')
+
+        if not session:
+            # Пустая сессия (выход) - удаляем запись и cookie
+            if session.sid is not None:
+                self._forget(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        now = time.time()
+        if session.modified:
+            if session.rotate and session.sid is not None:
+                self._forget(session.sid)
+                session.sid = None
+            if session.sid is None:
+                session.sid = secrets.token_urlsafe(32)
+            session.expires_at = now + self.lifetime
+            record = (session.get('user_id'), dict(session), session.expires_at)
+            self.store.save(session.sid, *record)
+            if self.cache is not None:
+                self.cache.set(session.sid, record)
+        elif now - session.touched_at >= self.refresh:
+            # Скользящий срок: продлеваем не чаще раза в refresh секунд
+            session.expires_at = now + self.lifetime
+            self.store.touch(session.sid, session.expires_at)
+            if self.cache is not None:
+                record = self.cache.get(session.sid)
+                if record is not None:
+                    self.cache.set(session.sid, record[:2] + (session.expires_at,))
+        else:
+            return
+
+        response.set_cookie(
+            name, session.sid,
+            expires=session.expires_at,
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+    def verify(self, session):
+        """Сессия из кэша процесса еще есть в хранилище? Отозванную (выход или смена пароля
+        в другом воркере) очищает - cookie удалится в save_session"""
+        if session.sid is None or session.verified or self.cache is None:
+            return True
+        if self.store.exists(session.sid):
+            session.verified = True
+            return True
+        self.cache.pop(session.sid)
+        self.revoked_elsewhere += 1
+        session.clear()
+        return False
+
+    def revoke_user(self, user_id, keep=None):
+        """Удаляет все сессии пользователя, кроме keep (текущей). Возвращает их число"""
+        sids = self.store.delete_user(user_id, keep=keep)
+        if self.cache is not None:
+            for sid in sids:
+                self.cache.pop(sid)
+        self.revoked += len(sids)
+        return len(sids)
+
+    def stats(self):
+        stats = {'backend': type(self.store).__name__, 'revoked': self.revoked,
+                 'revoked_elsewhere': self.revoked_elsewhere}
+        if self.cache is not None:
+            stats['cache'] = self.cache.stats()
+        return stats
+
+
+def create_store(backend, path=None, redis_url=None, maxsize=100000, pragmas=()):
+    if backend == 'memory':
+        return MemorySessionStore(maxsize=maxsize)
+    if backend == 'sqlite':
+        return SQLiteSessionStore(path, pragmas=pragmas)
+    if backend == 'redis':
+        return RedisSessionStore(redis_url)
+    raise ValueError(f'Неизвестное хранилище сессий: {backend}')
+
+
+def login_required(view=None, api=False):
+    """Пускает только вошедших: страницы - редирект на вход, API (api=True) - 401 JSON.
+    Сессия из кэша процесса сверяется с хранилищем - отзыв действует сразу.
+
+    @login_required или @login_required(api=True)"""
+    if view is None:
+        return lambda view: login_required(view, api=api)
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if session.get('user_id') is None or not current_app.session_interface.verify(session):
+            if api:
+                return jsonify({"error": "Требуется авторизация"}), 401
+            return redirect(url_for('login'))
+        return view(*args, **kwargs)
+
+    return wrapper
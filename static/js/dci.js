@@ -0,0 +1,209 @@
+// Текущая выбранная формула
+let selectedFormula = 'mifflin';
+
+// Инициализация выбора формулы
+document.addEventListener('DOMContentLoaded', function() {
+    // Обработчики для кнопок выбора формулы
+    document.querySelectorAll('.formula-btn').forEach(btn => {
+        btn.addEventListener('click', function() {
+            document.querySelectorAll('.formula-btn').forEach(b => b.classList.remove('active'));
+            this.classList.add('active');
+            selectedFormula = this.getAttribute('data-formula');
+            updateFormulaDisplay();
+
+            if (userData) {
+                calculateDCI();
+            }
+        });
+    });
+
+    // Обновляем отображение формулы при загрузке
+    updateFormulaDisplay();
+
+    // Автоматически рассчитываем при загрузке страницы
+    if (userData) {
+        calculateDCI();
+    }
+
+    // Обработчик мобильного меню
+    const mobileMenuToggle = document.getElementById('mobileMenuToggle');
+    const footerNav = document.getElementById('footerNav');
+
+    // Функция для переключения видимости меню
+    function toggleMenu() {
+        if (footerNav.classList.contains('hidden')) {
+            footerNav.classList.remove('hidden');
+            footerNav.classList.add('visible');
+            mobileMenuToggle.textContent = '✕ Скрыть меню';
+        } else {
+            footerNav.classList.remove('visible');
+            footerNav.classList.add('hidden');
+            mobileMenuToggle.textContent = '📋 Показать меню';
+        }
+    }
+
+    // Обработчик клика по кнопке меню
+    mobileMenuToggle.addEventListener('click', function(e) {
+        e.stopPropagation();
+        toggleMenu();
+    });
+
+    // Закрытие меню при клике вне его области
+    document.addEventListener('click', function(e) {
+        if (footerNav.classList.contains('visible') && 
+            !footerNav.contains(e.target) && 
+            e.target !== mobileMenuToggle) {
+            footerNav.classList.remove('visible');
+            footerNav.classList.add('hidden');
+            mobileMenuToggle.textContent = '📋 Показать меню';
+        }
+    });
+
+    // Предотвращение закрытия меню при клике внутри него
+    footerNav.addEventListener('click', function(e) {
+        e.stopPropagation();
+    });
+
+    // Настройка начального состояния для мобильных устройств
+    if (window.innerWidth < 768) {
+        footerNav.classList.add('hidden');
+        footerNav.classList.remove('visible');
+        mobileMenuToggle.style.display = 'block';
+    } else {
+        footerNav.classList.remove('hidden');
+        footerNav.classList.add('visible');
+        mobileMenuToggle.style.display = 'none';
+    }
+});
+
+// Обработчик изменения размера окна
+window.addEventListener('resize', function() {
+    const mobileMenuToggle = document.getElementById('mobileMenuToggle');
+    const footerNav = document.getElementById('footerNav');
+
+    if (window.innerWidth < 768) {
+        footerNav.classList.add('hidden');
+        footerNav.classList.remove('visible');
+        mobileMenuToggle.style.display = 'block';
+        mobileMenuToggle.textContent = '📋 Показать меню';
+    } else {
+        footerNav.classList.remove('hidden');
+        footerNav.classList.add('visible');
+        mobileMenuToggle.style.display = 'none';
+    }
+});
+
+// Функция для показа информации о диетологах
+function showDietitianInfo() {
+    alert("👨‍⚕️ Консультация диетолога\n\nДля получения профессиональной помощи:\n\n• Обратитесь в медицинский центр\n• Посетите сайты: nutritionist.ru, docdoc.ru\n• Проконсультируйтесь с врачом в поликлинике\n\nПрофессиональная консультация поможет:\n• Получить точный расчет потребностей\n• Учесть индивидуальные особенности\n• Составить оптимальный план питания");
+}
+
+// Обновление отображения формулы
+function updateFormulaDisplay() {
+    const formulaDisplay = document.getElementById('formula-display');
+
+    if (selectedFormula === 'mifflin') {
+        formulaDisplay.innerHTML = `
+            <div class="formula-line">
+                <span class="label">BMR =</span>
+                <span class="operation">(10 × вес) + (6.25 × рост) - (5 × возраст)</span>
+                <span class="operation">${userData.gender === 'female' ? '- 161' : '+ 5'}</span>
+            </div>
+            <div class="formula-line">
+                <span class="label">DCI =</span>
+                <span class="operation">BMR × коэффициент активности</span>
+            </div>
+            <div class="formula-description">
+                Формула Миффлина-Сан Жеора (современная, более точная)
+            </div>
+        `;
+    } else {
+        formulaDisplay.innerHTML = `
+            <div class="formula-line">
+                <span class="label">BMR =</span>
+                <span class="operation">${userData.gender === 'female' ? '655.1 + (9.563 × вес) + (1.85 × рост) - (4.676 × возраст)' : '66.5 + (13.75 × вес) + (5.003 × рост) - (6.755 × возраст)'}</span>
+            </div>
+            <div class="formula-line">
+                <span class="label">DCI =</span>
+                <span class="operation">BMR × коэффициент активности</span>
+            </div>
+            <div class="formula-description">
+                Формула Харриса-Бенедикта (классическая, немного завышает показатели)
+            </div>
+        `;
+    }
+}
+
+// Расчет BMR по формуле Миффлина-Сан Жеора
+function calculateMifflinBMR(weight, height, age, gender) {
+    let bmr = (10 * weight) + (6.25 * height) - (5 * age);
+
+    if (gender === 'female') {
+        bmr -= 161;
+    } else {
+        bmr += 5;
+    }
+
+    return bmr;
+}
+
+// Расчет BMR по формуле Харриса-Бенедикта
+function calculateHarrisBMR(weight, height, age, gender) {
+    if (gender === 'female') {
+        return 655.1 + (9.563 * weight) + (1.85 * height) - (4.676 * age);
+    } else {
+        return 66.5 + (13.75 * weight) + (5.003 * height) - (6.755 * age);
+    }
+}
+
+function calculateDCI() {
+    if (!userData) {
+        alert('Для расчета необходимо заполнить профиль!');
+        return;
+    }
+
+    // Получаем значения из формы
+    const activity = parseFloat(document.getElementById('activity').value);
+
+    // Используем данные из профиля
+    const weight = userData.weight;
+    const height = userData.height;
+    const age = userData.age;
+    const gender = userData.gender;
+
+    // Рассчитываем базовый метаболизм (BMR) по выбранной формуле
+    let bmr;
+    let formulaName;
+
+    if (selectedFormula === 'mifflin') {
+        bmr = calculateMifflinBMR(weight, height, age, gender);
+        formulaName = "Миффлина-Сан Жеора";
+    } else {
+        bmr = calculateHarrisBMR(weight, height, age, gender);
+        formulaName = "Харриса-Бенедикта";
+    }
+
+    // Умножаем на коэффициент активности
+    const dci = Math.round(bmr * activity);
+
+    // Рассчитываем БЖУ (в граммах)
+    const proteinPercent = 0.3;   // 30% белка
+    const fatPercent = 0.25;      // 25% жиров
+    const carbsPercent = 0.45;    // 45% углеводов
+
+    // 1г белка = 4 ккал, 1г жира = 9 ккал, 1г углеводов = 4 ккал
+    const proteinGrams = Math.round((dci * proteinPercent) / 4);
+    const fatGrams = Math.round((dci * fatPercent) / 9);
+    const carbsGrams = Math.round((dci * carbsPercent) / 4);
+
+    // Отображаем результаты
+    document.getElementById('dci-result').textContent = dci + ' ккал';
+    document.getElementById('formula-used').textContent = 'По формуле ' + formulaName;
+    document.getElementById('protein-value').textContent = proteinGrams + ' г';
+    document.getElementById('fat-value').textContent = fatGrams + ' г';
+    document.getElementById('carbs-value').textContent = carbsGrams + ' г';
+
+    document.getElementById('protein-percent').textContent = (proteinPercent * 100) + '%';
+    document.getElementById('fat-percent').textContent = (fatPercent * 100) + '%';
+    document.getElementById('carbs-percent').textContent = (carbsPercent * 100) + '%';
+}
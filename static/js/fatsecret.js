@@ -0,0 +1,394 @@
+// Переменные для хранения текущего выбранного продукта
+let currentFoodId = null;
+let currentFoodName = null;
+let currentFoodDetails = null;
+let selectedMeal = 'lunch';
+let baseNutrition = null; // Базовая пищевая ценность на 100г
+let foodDetailsCache = {}; // Детали продуктов, загруженные пачкой после поиска
+
+function escapeHtml(unsafe) {
+    if (!unsafe) return '';
+    return unsafe
+        .replace(/&/g, "&amp;")
+        .replace(/</g, "&lt;")
+        .replace(/>/g, "&gt;")
+        .replace(/"/g, "&quot;")
+        .replace(/'/g, "&#039;");
+}
+
+// Функция для открытия модального окна
+function openModal(foodId, foodName) {
+    currentFoodId = foodId;
+    currentFoodName = foodName;
+    selectedMeal = 'lunch';
+
+    // Установка названия продукта в модальном окне
+    document.getElementById('modal-food-name').textContent = foodName;
+
+    // Сброс активного класса у всех опций
+    document.querySelectorAll('.meal-option').forEach(option => {
+        option.classList.remove('active');
+    });
+
+    // Установка активного класса для обеда (по умолчанию)
+    document.querySelector('.meal-option[data-meal="lunch"]').classList.add('active');
+
+    // Сброс значения граммов к 100
+    document.getElementById('grams-input').value = 100;
+
+    // Скрываем информацию о питательной ценности до получения данных
+    document.getElementById('nutrition-info').style.display = 'none';
+
+    // Получение деталей продукта для расчета питательных веществ
+    getFoodDetails(foodId);
+
+    document.getElementById('meal-modal').style.display = 'block';
+}
+
+// Пищевая ценность на 100г по первой порции продукта
+function nutritionPer100g(food) {
+    if (!food || !food.servings) return null;
+    const servings = food.servings.serving;
+    const serving = Array.isArray(servings) ? servings[0] : servings;
+    if (!serving) return null;
+
+    // Получаем количество грамм в стандартной порции
+    const servingGrams = parseFloat(serving.metric_serving_amount || serving.grams || 100);
+
+    return {
+        calories: Math.round(parseFloat(serving.calories) * (100 / servingGrams)),
+        protein: Math.round(parseFloat(serving.protein || 0) * (100 / servingGrams) * 10) / 10,
+        fat: Math.round(parseFloat(serving.fat || 0) * (100 / servingGrams) * 10) / 10,
+        carbs: Math.round(parseFloat(serving.carbohydrate || 0) * (100 / servingGrams) * 10) / 10
+    };
+}
+
+// Функция для получения деталей продукта
+async function getFoodDetails(foodId) {
+    try {
+        if (foodDetailsCache[foodId]) {
+            currentFoodDetails = foodDetailsCache[foodId];
+        } else {
+            const response = await fetch(`/get-food-details/${foodId}`);
+            if (!response.ok) return;
+            const data = await response.json();
+            currentFoodDetails = data.food;
+            foodDetailsCache[foodId] = data.food;
+        }
+
+        // Извлекаем базовую пищевую ценность на 100г
+        baseNutrition = nutritionPer100g(currentFoodDetails);
+        if (baseNutrition) {
+            // Обновляем информацию о питательной ценности
+            updateNutritionInfo();
+
+            // Показываем блок с информацией
+            document.getElementById('nutrition-info').style.display = 'block';
+        }
+    } catch (error) {
+        console.error('Ошибка получения деталей продукта:', error);
+    }
+}
+
+// Загружает детали всех найденных продуктов одним запросом
+async function prefetchFoodDetails(foods) {
+    const ids = foods.map(food => food.food_id).filter(id => id && !foodDetailsCache[id]);
+    if (ids.length === 0) return;
+
+    try {
+        const response = await fetch('/api/foods/batch', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ ids: ids })
+        });
+        if (!response.ok) return;
+        const data = await response.json();
+
+        for (const [foodId, food] of Object.entries(data.foods || {})) {
+            foodDetailsCache[foodId] = food;
+            const nutrition = nutritionPer100g(food);
+            const kcal = document.getElementById(`kcal-${foodId}`);
+            if (kcal && nutrition) {
+                kcal.textContent = `${nutrition.calories} ккал · Б ${nutrition.protein} · Ж ${nutrition.fat} · У ${nutrition.carbs} на 100 г`;
+            }
+        }
+    } catch (error) {
+        console.error('Ошибка загрузки деталей продуктов:', error);
+    }
+}
+
+// Функция для обновления информации о питательной ценности
+function updateNutritionInfo() {
+    if (!baseNutrition) return;
+
+    const grams = parseInt(document.getElementById('grams-input').value) || 100;
+    const ratio = grams / 100;
+
+    // Обновляем количество грамм в заголовке
+    document.getElementById('nutrition-grams').textContent = grams;
+
+    // Рассчитываем и обновляем значения
+    document.getElementById('nutrition-calories').textContent = Math.round(baseNutrition.calories * ratio);
+    document.getElementById('nutrition-protein').textContent = (baseNutrition.protein * ratio).toFixed(1);
+    document.getElementById('nutrition-fat').textContent = (baseNutrition.fat * ratio).toFixed(1);
+    document.getElementById('nutrition-carbs').textContent = (baseNutrition.carbs * ratio).toFixed(1);
+}
+
+// Функция для расчета питательных веществ на основе веса
+function calculateNutrition(serving, grams) {
+    if (!serving || !serving.calories) return null;
+
+    const servingGrams = parseFloat(serving.metric_serving_amount || serving.grams || 100);
+    const ratio = grams / servingGrams;
+
+    return {
+        calories: Math.round(parseFloat(serving.calories) * ratio),
+        protein: Math.round(parseFloat(serving.protein || 0) * ratio * 10) / 10,
+        fat: Math.round(parseFloat(serving.fat || 0) * ratio * 10) / 10,
+        carbs: Math.round(parseFloat(serving.carbohydrate || 0) * ratio * 10) / 10,
+        grams: grams
+    };
+}
+
+function closeModal() {
+    document.getElementById('meal-modal').style.display = 'none';
+    currentFoodId = null;
+    currentFoodName = null;
+    baseNutrition = null;
+}
+
+// Функция для подтверждения выбора
+function confirmMealSelection() {
+    const grams = parseInt(document.getElementById('grams-input').value) || 100;
+
+    if (grams <= 0) {
+        alert('Пожалуйста, введите корректное количество граммов');
+        return;
+    }
+
+    if (currentFoodId && currentFoodName) {
+        addToDiary(currentFoodId, currentFoodName, selectedMeal, grams, currentFoodDetails);
+    }
+    closeModal();
+}
+
+// Инициализация выбора приема пищи в модальном окне
+function initMealSelection() {
+    document.querySelectorAll('.meal-option').forEach(option => {
+        option.addEventListener('click', function() {
+            // Удаляем активный класс у всех опций
+            document.querySelectorAll('.meal-option').forEach(opt => {
+                opt.classList.remove('active');
+            });
+
+            // Добавляем активный класс к выбранной опции
+            this.classList.add('active');
+            selectedMeal = this.getAttribute('data-meal');
+        });
+    });
+}
+
+// Функция для поиска продуктов
+async function searchFood() {
+    const originalQuery = document.getElementById('food-query').value.trim();
+    if (!originalQuery) {
+        alert('Пожалуйста, введите название продукта');
+        return;
+    }
+
+    const resultsDiv = document.getElementById('results-container');
+    const translationInfo = document.getElementById('translation-info');
+    const translationText = document.getElementById('translation-text');
+
+    // Запрос переводится на английский на сервере
+    resultsDiv.innerHTML = `
+        <div class="loading">
+            <div class="loading-spinner"></div>
+            <p>Ищем "${escapeHtml(originalQuery)}" в базе FatSecret...</p>
+        </div>
+    `;
+
+    try {
+        const response = await fetch(`/search-food?query=${encodeURIComponent(originalQuery)}&region=RU&language=ru`);
+
+        let data;
+        if (response.ok) {
+            data = await response.json();
+            console.log('Ответ API:', data);
+        } else {
+            throw new Error('Ошибка API, используем демо-данные');
+        }
+
+        const englishQuery = data.translated_query || originalQuery;
+        if (originalQuery !== englishQuery) {
+            translationText.innerHTML = `Поиск: "<strong>${escapeHtml(originalQuery)}</strong>" → "<strong>${escapeHtml(englishQuery)}</strong>"`;
+            translationInfo.style.display = 'block';
+        } else {
+            translationInfo.style.display = 'none';
+        }
+
+        if (data.foods && data.foods.food && data.foods.food.length > 0) {
+            displayResults(data.foods.food, originalQuery, englishQuery);
+        } else if (data.food) {
+            displayResults([data.food], originalQuery, englishQuery);
+        } else {
+            throw new Error('Не найдено продуктов');
+        }
+
+    } catch (error) {
+        console.error('Ошибка поиска:', error);
+        resultsDiv.innerHTML = `
+            <div class="error-message">
+                <h3><i class="fas fa-exclamation-triangle"></i> Ошибка поиска</h3>
+                <p>${escapeHtml(error.message) || 'Не удалось выполнить поиск'}</p>
+                <button class="retry-btn" onclick="searchFood()">
+                    <i class="fas fa-redo"></i> Попробовать снова
+                </button>
+            </div>
+        `;
+    }
+}
+
+// Функция для отображения результатов (пищевая ценность подгружается пачкой)
+function displayResults(foods, originalQuery, englishQuery) {
+    const container = document.getElementById('results-container');
+
+    if (!foods || foods.length === 0) {
+        container.innerHTML = `
+            <div class="no-results">
+                <div class="no-results-icon">🔍</div>
+                <p>Ничего не найдено для "${escapeHtml(originalQuery)}"</p>
+                ${originalQuery !== englishQuery ? `<p>Поисковый запрос: "${escapeHtml(englishQuery)}"</p>` : ''}
+                <p>Попробуйте другой запрос</p>
+            </div>
+        `;
+        return;
+    }
+
+    let html = `
+        <div class="api-info">
+            <i class="fas fa-info-circle"></i> 
+            Найдено продуктов: ${foods.length} | 
+            Поиск: "${escapeHtml(originalQuery)}" 
+            ${originalQuery !== englishQuery ? `→ "${escapeHtml(englishQuery)}"` : ''}
+        </div>
+        <div class="food-grid">
+    `;
+
+    foods.forEach(food => {
+        const foodName = escapeHtml(food.food_name || 'Неизвестный продукт');
+        const foodId = escapeHtml(food.food_id || '');
+        const foodType = escapeHtml(food.food_type || 'продукт');
+
+        html += `
+        <div class="food-card">
+            <div class="food-name">${foodName}</div>
+
+            <div class="food-image">
+                ${food.food_image ? 
+                  `<img src="${escapeHtml(food.food_image)}" alt="${foodName}" style="width:100%;height:100%;border-radius:10px;">` : 
+                  '🍎'}
+            </div>
+
+            <div class="serving-info">
+                ${food.food_type ? `Тип: ${escapeHtml(foodType)}` : 'Основной продукт'}
+            </div>
+            <div class="serving-info" id="kcal-${foodId}"></div>
+
+            <button class="add-btn" onclick="openModal('${foodId}', '${foodName.replace(/'/g, "\\'")}')">
+                <i class="fas fa-plus"></i> Добавить в рацион
+            </button>
+        </div>
+        `;
+    });
+
+    html += '</div>';
+    container.innerHTML = html;
+
+    prefetchFoodDetails(foods);
+}
+
+function getMealName(mealType) {
+    const meals = {
+        'breakfast': 'завтрак',
+        'lunch': 'обед',
+        'dinner': 'ужин',
+        'snack': 'перекус'
+    };
+    return meals[mealType] || 'дневник';
+}
+
+// Функция для добавления продукта в дневник
+async function addToDiary(foodId, foodName, mealType, grams, foodDetails = null) {
+    const buttons = document.querySelectorAll('.add-btn');
+    buttons.forEach(btn => {
+        if (btn.textContent.includes(foodName)) {
+            btn.disabled = true;
+            btn.innerHTML = `<i class="fas fa-spinner fa-spin"></i> Добавляем...`;
+        }
+    });
+
+    try {
+        // Если у нас есть детали продукта, рассчитаем питательные вещества
+        let nutritionData = null;
+        if (foodDetails && foodDetails.servings) {
+            const servings = foodDetails.servings.serving;
+            const serving = Array.isArray(servings) ? servings[0] : servings;
+            nutritionData = calculateNutrition(serving, grams);
+        }
+
+        const response = await fetch('/add-from-fatsecret', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+                food_id: foodId,
+                meal_type: mealType,
+                grams: grams,
+                nutrition_data: nutritionData
+            })
+        });
+
+        if (response.ok) {
+            const result = await response.json();
+            if (result.success) {
+                alert(`✅ "${foodName}" (${grams}г) добавлен в ${getMealName(mealType)}!`);
+            } else {
+                throw new Error(result.error || 'Ошибка при добавлении');
+            }
+        } else {
+            throw new Error('Ошибка сервера');
+        }
+    } catch (error) {
+        alert('❌ Ошибка: ' + error.message);
+    } finally {
+        buttons.forEach(btn => {
+            if (btn.textContent.includes('Добавляем')) {
+                btn.disabled = false;
+                btn.innerHTML = `<i class="fas fa-plus"></i> Добавить в рацион`;
+            }
+        });
+    }
+}
+
+// Поиск по нажатию Enter
+document.getElementById('food-query').addEventListener('keypress', function(e) {
+    if (e.key === 'Enter') searchFood();
+});
+
+// Закрытие модального окна при клике вне его
+window.addEventListener('click', function(event) {
+    const modal = document.getElementById('meal-modal');
+    if (event.target === modal) {
+        closeModal();
+    }
+});
+
+// Инициализация при загрузке
+document.addEventListener('DOMContentLoaded', function() {
+    initMealSelection();
+    document.getElementById('food-query').focus();
+});
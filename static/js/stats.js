@@ -0,0 +1,150 @@
+// Инициализация графиков
+document.addEventListener('DOMContentLoaded', function() {
+    if (sortedStats) {
+        const ctx = document.getElementById('caloriesChart').getContext('2d');
+        let currentChart = null;
+
+        const colors = {
+            calories: '#4a6cfa',
+            proteins: '#4caf50',
+            fats: '#ff6b6b',
+            carbs: '#ffa726',
+            grams: '#9c27b0'
+        };
+
+        function createChart(type) {
+            if (currentChart) {
+                currentChart.destroy();
+            }
+
+            let datasets = [];
+            let title = '';
+
+            switch(type) {
+                case 'calories':
+                    title = 'Калории';
+                    datasets = [{
+                        label: 'Калории',
+                        data: sortedStats.map(stat => stat.calories),
+                        borderColor: colors.calories,
+                        tension: 0.4,
+                        fill: false,
+                        pointBackgroundColor: colors.calories,
+                        pointRadius: 4,
+                    }];
+                    break;
+
+                case 'bju':
+                    title = 'БЖУ';
+                    datasets = [
+                        {
+                            label: 'Белки',
+                            data: sortedStats.map(stat => stat.proteins),
+                            borderColor: colors.proteins,
+                            tension: 0.4,
+                            fill: false,
+                            pointBackgroundColor: colors.proteins,
+                            pointRadius: 3,
+                        },
+                        {
+                            label: 'Жиры',
+                            data: sortedStats.map(stat => stat.fats),
+                            borderColor: colors.fats,
+                            tension: 0.4,
+                            fill: false,
+                            pointBackgroundColor: colors.fats,
+                            pointRadius: 3,
+                        },
+                        {
+                            label: 'Углеводы',
+                            data: sortedStats.map(stat => stat.carbs),
+                            borderColor: colors.carbs,
+                            tension: 0.4,
+                            fill: false,
+                            pointBackgroundColor: colors.carbs,
+                            pointRadius: 3,
+                        }
+                    ];
+                    break;
+
+                case 'weight':
+                    title = 'Вес';
+                    datasets = [{
+                        label: 'Вес',
+                        data: sortedStats.map(stat => stat.grams),
+                        borderColor: colors.grams,
+                        tension: 0.4,
+                        fill: false,
+                        pointBackgroundColor: colors.grams,
+                        pointRadius: 4,
+                    }];
+                    break;
+            }
+
+            document.querySelector('.chart-title').textContent = title;
+
+            currentChart = new Chart(ctx, {
+                type: 'line',
+                data: {
+                    labels: sortedStats.map(stat => stat.date),
+                    datasets: datasets
+                },
+                options: {
+                    scales: {
+                        y: {
+                            beginAtZero: false,
+                            grid: {
+                                display: true,
+                                drawBorder: false
+                            },
+                            ticks: {
+                                stepSize: 50
+                            }
+                        },
+                        x: {
+                            grid: {
+                                display: false
+                            }
+                        }
+                    },
+                    plugins: {
+                        legend: {
+                            display: type === 'bju',
+                            position: 'top'
+                        }
+                    }
+                }
+            });
+        }
+
+        // Инициализируем график калорий по умолчанию
+        createChart('calories');
+
+        // Переключение между графиками
+        document.querySelectorAll('.chart-toggle button').forEach((button, index) => {
+            button.addEventListener('click', function() {
+                document.querySelectorAll('.chart-toggle button').forEach(btn => {
+                    btn.classList.remove('active');
+                });
+                this.classList.add('active');
+
+                const chartTypes = ['calories', 'bju', 'weight'];
+                createChart(chartTypes[index]);
+            });
+        });
+    }
+
+    // Переключение между периодами
+    document.querySelectorAll('.time-filter button').forEach(button => {
+        button.addEventListener('click', function() {
+            document.querySelectorAll('.time-filter button').forEach(btn => {
+                btn.classList.remove('active');
+            });
+            this.classList.add('active');
+
+            const period = this.getAttribute('data-period');
+            // Здесь будет загрузка данных за выбранный период
+            alert('Загрузка данных за ' + period);
+        });
+    });
+});
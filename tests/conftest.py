@@ -0,0 +1,59 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# main.py настраивается при импорте - база и instance во временном каталоге
+WORKDIR = tempfile.mkdtemp(prefix='nutrition-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(WORKDIR, 'test.db')}"
+os.environ['INSTANCE_PATH'] = WORKDIR
+os.environ['SESSION_BACKEND'] = 'sqlite'
+os.environ['TRANSLATOR_BACKEND'] = 'stub'
+os.environ['PASSWORD_SCHEME'] = 'pbkdf2_sha256'
+os.environ['PASSWORD_PBKDF2_ITERATIONS'] = '1000'
+os.environ.pop('FATSECRET_CONSUMER_KEY', None)
+
+
+@pytest.fixture
+def app():
+    import main
+
+    with main.app.app_context():
+        main.db.drop_all()
+        main.db.create_all()
+    with main.app.session_interface.store._connect() as conn:
+        conn.execute('DELETE FROM sessions')
+    main.app.session_interface.cache.clear()
+    main.user_loader.cache.clear()
+    main.fragment_cache.cache.clear()
+    main.trend_analytics.cache.clear()
+    yield main.app
+    main.app.config['DAILY_STATS_MODE'] = 'incremental'
+
+
+@pytest.fixture
+def user_id(app):
+    from models import db, User
+
+    with app.app_context():
+        user = User(login='user@example.com', password='-', age=30, height=180, weight=80, gender='male')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+@pytest.fixture
+def client(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+    return client
+
+
+@pytest.fixture
+def db_path():
+    return os.path.join(WORKDIR, 'test.db')
@@ -0,0 +1,20 @@
+import sqlite3
+from datetime import date
+
+from test_daily_stats import add_meal
+
+
+def write_from_other_worker(db_path, user_id, calories):
+    # Другой воркер: своя транзакция мимо сессии и кэшей этого процесса
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('UPDATE daily_stats SET total_calories = ? WHERE user_id = ? AND date = ?',
+                     (calories, user_id, date.today().isoformat()))
+        conn.execute('UPDATE users SET diary_version = diary_version + 1 WHERE id = ?', (user_id,))
+
+
+def test_trends_follow_other_worker_writes(client, user_id, db_path):
+    add_meal(client, 100)
+    assert client.get('/api/analytics/trends').json['calories'][-1] == 100
+
+    write_from_other_worker(db_path, user_id, 700)
+    assert client.get('/api/analytics/trends').json['calories'][-1] == 700
@@ -0,0 +1,32 @@
+from datetime import date
+
+import pytest
+
+from models import DailyStat, Meal
+
+
+def add_meal(client, calories):
+    response = client.post('/add_meal', data={
+        'meal_type': 'lunch', 'name': f'meal {calories}', 'grams': 100, 'calories': calories,
+        'proteins': 1, 'fats': 1, 'carbs': 1,
+    })
+    assert response.status_code == 302
+
+
+def day_total(app, user_id):
+    with app.app_context():
+        stat = DailyStat.query.filter_by(user_id=user_id, date=date.today()).one()
+        return stat.total_calories
+
+
+@pytest.mark.parametrize('mode', ['incremental', 'recompute'])
+def test_delete_meal_updates_daily_total(app, client, user_id, mode):
+    app.config['DAILY_STATS_MODE'] = mode
+    add_meal(client, 100)
+    add_meal(client, 200)
+    assert day_total(app, user_id) == 300
+
+    with app.app_context():
+        meal_id = Meal.query.filter_by(user_id=user_id, calories=100).one().id
+    assert client.post(f'/delete_meal/{meal_id}').status_code == 302
+    assert day_total(app, user_id) == 200
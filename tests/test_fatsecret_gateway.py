@@ -0,0 +1,30 @@
+import time
+
+import pytest
+
+from benchmarks.fatsecret_stub import start_stub
+from fatsecret_gateway import CircuitBreaker, FatSecretGateway, FatSecretUnavailable
+
+
+def test_call_returns_within_budget_when_upstream_hangs():
+    server, api_url = start_stub(latency=10)
+    gateway = FatSecretGateway('key', 'secret', connect_timeout=3.05, read_timeout=8, retries=2,
+                               budget=1.5, breaker=CircuitBreaker(failure_threshold=10), api_url=api_url)
+    try:
+        started = time.monotonic()
+        with pytest.raises(FatSecretUnavailable):
+            gateway.food_get('1')
+        assert time.monotonic() - started < 1.5 + 0.5
+    finally:
+        gateway.close()
+        server.shutdown()
+
+
+def test_call_succeeds_with_fast_upstream():
+    server, api_url = start_stub(latency=0)
+    gateway = FatSecretGateway('key', 'secret', budget=5, api_url=api_url)
+    try:
+        assert gateway.food_get('7')['food_id'] == '7'
+    finally:
+        gateway.close()
+        server.shutdown()
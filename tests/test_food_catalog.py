@@ -0,0 +1,31 @@
+from food_catalog import FoodCatalog
+
+
+def make_catalog(tmp_path, names):
+    catalog = FoodCatalog(str(tmp_path / 'foods.db'))
+    catalog.add_many([{'food_id': str(i), 'food_name': name} for i, name in enumerate(names, 1)])
+    return catalog
+
+
+def names(foods):
+    return [food['food_name'] for food in foods]
+
+
+def test_prefix_search_without_fuzzy(tmp_path):
+    catalog = make_catalog(tmp_path, ['Beef Steak', 'Beer', 'Light Beer', 'Ground Beef'])
+    assert sorted(names(catalog.search('beef', fuzzy=False))) == ['Beef Steak', 'Ground Beef']
+
+
+def test_fuzzy_skips_neighbour_words(tmp_path):
+    catalog = make_catalog(tmp_path, ['Beer', 'Light Beer', 'Beer (Regular)', 'Mild Salsa', 'Mild Cheddar'])
+    assert catalog.search('beef') == []
+    assert catalog.search('milk') == []
+
+
+def test_fuzzy_forgives_typos(tmp_path):
+    catalog = make_catalog(tmp_path, ['Chicken Breast', 'Banana'])
+    if not catalog.fuzzy:
+        return
+    assert names(catalog.search('chiken')) == ['Chicken Breast']
+    assert names(catalog.search('banan')) == ['Banana']
+    assert catalog.search('chiken', fuzzy=False) == []
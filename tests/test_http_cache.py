@@ -0,0 +1,48 @@
+import sqlite3
+from datetime import date
+
+from test_daily_stats import add_meal
+
+
+def add_meal_from_other_worker(db_path, user_id, name):
+    # Другой воркер: запись и bump_diary_version мимо кэшей этого процесса
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            'INSERT INTO meals (user_id, date, meal_type, name, grams, calories, proteins, fats, carbs) '
+            "VALUES (?, ?, 'dinner', ?, 100, 50, 1, 1, 1)",
+            (user_id, date.today().isoformat(), name)
+        )
+        conn.execute('UPDATE users SET diary_version = diary_version + 1 WHERE id = ?', (user_id,))
+
+
+def test_diary_etag_changes_after_write_in_other_worker(client, user_id, db_path):
+    add_meal(client, 100)
+    response = client.get('/api/diary/today')
+    etag = response.headers['ETag']
+    assert client.get('/api/diary/today', headers={'If-None-Match': etag}).status_code == 304
+
+    add_meal_from_other_worker(db_path, user_id, 'from other worker')
+    response = client.get('/api/diary/today', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert [food['name'] for food in response.json['dinner']['foods']] == ['from other worker']
+
+
+def test_index_etag_changes_after_write_in_other_worker(client, user_id, db_path):
+    etag = client.get('/index').headers['ETag']
+    add_meal_from_other_worker(db_path, user_id, 'from other worker')
+    assert client.get('/index', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_index_fragments_follow_other_worker_writes(client, user_id, db_path, monkeypatch):
+    import main
+
+    # Ключ фрагментов не должен полагаться на то, что ETag уже перечитал профиль
+    monkeypatch.setattr(main, 'diary_etag', lambda *args, **kwargs: None)
+    add_meal(client, 100)
+    html = client.get('/index').data.decode()
+    assert 'from other worker' not in html and '<span>100.0 ккал</span>' in html
+
+    add_meal_from_other_worker(db_path, user_id, 'from other worker')
+    html = client.get('/index').data.decode()
+    assert 'from other worker' in html and '<span>150.0 ккал</span>' in html
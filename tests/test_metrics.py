@@ -0,0 +1,24 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import StaticPool
+
+from metrics import Metrics
+
+
+def test_failed_statement_does_not_shift_sql_timings():
+    metrics = Metrics()
+    engine = create_engine('sqlite://', poolclass=StaticPool)
+    metrics.instrument_engine(engine)
+
+    with engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.execute(text('SELECT * FROM missing_table'))
+    with engine.connect() as conn:
+        conn.execute(text('SELECT 1'))
+        conn.execute(text('SELECT 2'))
+
+    # На соединении из пула не копятся метки времени упавших запросов
+    with engine.connect() as conn:
+        assert 'metrics_started' not in conn.info
+    assert 'sql_query_duration_seconds_count{operation="SELECT",table=""} 2' in metrics.render()
@@ -0,0 +1,41 @@
+import pytest
+
+from benchmarks.fatsecret_stub import make_food
+
+
+@pytest.fixture
+def foods(app):
+    import main
+
+    foods = [make_food(i) for i in (1, 2)]
+    for food in foods:
+        main.food_cache.put(food['food_id'], food)
+    return foods
+
+
+def test_create_recipe_computes_ingredients_in_one_batch(client, foods, monkeypatch):
+    import main
+
+    calls = []
+    calculate_many = main.nutrient_store.calculate_many
+    monkeypatch.setattr(main.nutrient_store, 'calculate_many', lambda items: calls.append(items) or calculate_many(items))
+
+    serving = foods[1]['servings']['serving'][1]
+    response = client.post('/api/recipes', json={'name': 'Салат', 'ingredients': [
+        {'food_id': '1', 'grams': 150},
+        {'food_id': '2', 'serving_id': serving['serving_id'], 'units': 2},
+        {'name': 'Масло', 'grams': 10, 'calories': 90, 'fats': 10},
+    ]})
+    assert response.status_code == 201
+    assert len(calls) == 1 and len(calls[0]) == 2
+
+    ingredients = response.json['ingredients']
+    per_100g = float(foods[0]['servings']['serving'][0]['calories'])
+    assert ingredients[0]['calories'] == pytest.approx(per_100g * 1.5, abs=0.1)
+    assert ingredients[1]['grams'] == pytest.approx(2 * float(serving['metric_serving_amount']))
+    assert ingredients[1]['calories'] == pytest.approx(2 * float(serving['calories']), abs=0.1)
+    assert ingredients[2]['calories'] == 90
+
+    total = sum(item['calories'] for item in ingredients)
+    grams = sum(item['grams'] for item in ingredients)
+    assert response.json['per_100g']['calories'] == pytest.approx(total * 100 / grams, abs=0.2)
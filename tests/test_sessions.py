@@ -0,0 +1,17 @@
+import os
+
+from sessions import SQLiteSessionStore
+
+
+def test_revocation_in_other_worker_applies_immediately(app, client, user_id):
+    assert client.get('/api/diary/today').status_code == 200
+    assert client.get('/api/diary/today').status_code == 200  # сессия уже в кэше процесса
+
+    # Другой воркер (свой процесс, общий instance/sessions.db) меняет пароль пользователя
+    other_worker = SQLiteSessionStore(os.path.join(app.instance_path, 'sessions.db'))
+    assert len(other_worker.delete_user(user_id)) == 1
+
+    assert client.get('/api/diary/today').status_code == 401
+    response = client.get('/index')
+    assert response.status_code == 302 and '/login' in response.headers['Location']
+
@@ -0,0 +1,210 @@
+"""Перевод поисковых запросов ru -> en на сервере.
+
+FatSecret ищет по английским названиям, поэтому русский запрос нужно перевести.
+Переводы хранятся в SQLite (словарь частых продуктов + выученные фразы) и в
+LRU-кэше в памяти, так что повторный запрос не ходит во внешний переводчик.
+Переводчик подключаемый: GoogleTranslateBackend для работы, StubTranslator -
+локальный словарный перевод без сети (для тестов и как запасной вариант)."""
+import re
+import sqlite3
+import threading
+import time
+
+import requests
+
+from cache import TTLCache
+from storage import apply_pragmas
+
+_CYRILLIC_RE = re.compile('[а-яё]', re.IGNORECASE)
+
+SEED_DICTIONARY = {
+    'яйцо': 'egg', 'яйца': 'eggs', 'яичный': 'egg',
+    'яблоко': 'apple', 'яблоки': 'apples',
+    'курица': 'chicken', 'куриный': 'chicken', 'куриная грудка': 'chicken breast',
+    'говядина': 'beef',
+    'свинина': 'pork',
+    'индейка': 'turkey',
+    'рыба': 'fish',
+    'лосось': 'salmon',
+    'тунец': 'tuna',
+    'творог': 'cottage cheese',
+    'молоко': 'milk',
+    'кефир': 'kefir',
+    'йогурт': 'yogurt',
+    'сметана': 'sour cream',
+    'сыр': 'cheese',
+    'хлеб': 'bread',
+    'рис': 'rice',
+    'гречка': 'buckwheat',
+    'овсянка': 'oatmeal',
+    'макароны': 'pasta',
+    'картофель': 'potato', 'картошка': 'potato',
+    'морковь': 'carrot',
+    'капуста': 'cabbage',
+    'лук': 'onion',
+    'помидор': 'tomato',
+    'огурец': 'cucumber',
+    'банан': 'banana',
+    'апельсин': 'orange',
+    'груша': 'pear',
+    'виноград': 'grapes',
+    'клубника': 'strawberry',
+    'малина': 'raspberry',
+    'орехи': 'nuts',
+    'миндаль': 'almonds',
+    'грецкий': 'walnut',
+    'мед': 'honey',
+    'сахар': 'sugar',
+    'соль': 'salt',
+    'перец': 'pepper',
+    'масло': 'oil',
+    'сливочное масло': 'butter',
+    'оливковое': 'olive oil',
+    'подсолнечное': 'sunflower oil',
+    'вода': 'water',
+    'кофе': 'coffee',
+    'чай': 'tea',
+}
+
+
+def normalize_phrase(text):
+    return ' '.join((text or '').lower().split())
+
+
+def needs_translation(text):
+    return bool(_CYRILLIC_RE.search(text or ''))
+
+
+class StubTranslator:
+    """Пословный перевод по словарю без сети: точное совпадение слова,
+    затем вхождение словарного корня, иначе слово остается как есть"""
+
+    def __init__(self, dictionary=None):
+        self.dictionary = dict(SEED_DICTIONARY if dictionary is None else dictionary)
+
+    def translate(self, text):
+        phrase = normalize_phrase(text)
+        if phrase in self.dictionary:
+            return self.dictionary[phrase]
+
+        words = []
+        for word in phrase.split(' '):
+            if word in self.dictionary:
+                words.append(self.dictionary[word])
+                continue
+            for russian, english in self.dictionary.items():
+                if russian in word:
+                    words.append(english)
+                    break
+            else:
+                words.append(word)
+        return ' '.join(words)
+
+
+class GoogleTranslateBackend:
+    """Публичный endpoint translate.googleapis.com (тот же, что раньше вызывал браузер)"""
+
+    URL = 'https://translate.googleapis.com/translate_a/single'
+
+    def __init__(self, timeout=2.0, source='ru', target='en'):
+        self.timeout = timeout
+        self.source = source
+        self.target = target
+        self.session = requests.Session()
+
+    def translate(self, text):
+        response = self.session.get(self.URL, params={
+            'client': 'gtx', 'sl': self.source, 'tl': self.target, 'dt': 't', 'q': text
+        }, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        translated = ''.join(segment[0] for segment in data[0] if segment and segment[0])
+        if not translated:
+            raise ValueError('Пустой ответ переводчика')
+        return translated
+
+
+class TranslationStore:
+    """Постоянный словарь переводов: source -> target, origin = seed | learned"""
+
+    def __init__(self, path, pragmas=()):
+        self.path = path
+        self.pragmas = pragmas
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS translations ('
+                ' source TEXT PRIMARY KEY,'
+                ' target TEXT NOT NULL,'
+                ' origin TEXT NOT NULL,'
+                ' updated_at REAL NOT NULL)'
+            )
+            # Словарь частых продуктов - не перетирая уже выученные переводы
+            conn.executemany(
+                "INSERT OR IGNORE INTO translations (source, target, origin, updated_at) VALUES (?, ?, 'seed', ?)",
+                [(source, target, time.time()) for source, target in SEED_DICTIONARY.items()]
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            apply_pragmas(conn, self.pragmas)
+            self._local.conn = conn
+        return conn
+
+    def get(self, source):
+        row = self._connect().execute(
+            'SELECT target FROM translations WHERE source = ?', (source,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, source, target, origin='learned'):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO translations (source, target, origin, updated_at) VALUES (?, ?, ?, ?)',
+                (source, target, origin, time.time())
+            )
+
+
+class Translator:
+    """Перевод запроса: память -> SQLite-словарь -> внешний переводчик (с запоминанием).
+    Если внешний переводчик недоступен, используется пословный словарный перевод,
+    который не запоминается, чтобы позже получить нормальный перевод."""
+
+    def __init__(self, store, backend, fallback=None, maxsize=4096):
+        self.store = store
+        self.backend = backend
+        self.fallback = fallback or StubTranslator()
+        self.memory = TTLCache(maxsize=maxsize, ttl=24 * 3600)
+        self.backend_calls = 0
+        self.backend_errors = 0
+
+    def translate(self, text):
+        if not needs_translation(text):
+            return text
+        phrase = normalize_phrase(text)
+
+        translated = self.memory.get(phrase)
+        if translated is not None:
+            return translated
+
+        translated = self.store.get(phrase)
+        if translated is None:
+            try:
+                self.backend_calls += 1
+                translated = normalize_phrase(self.backend.translate(phrase))
+                self.store.put(phrase, translated)
+            except Exception as e:
+                self.backend_errors += 1
+                print(f"⚠️ Переводчик недоступен, перевод по словарю: {str(e)}")
+                return self.fallback.translate(phrase)
+
+        self.memory.set(phrase, translated)
+        return translated
+
+    def stats(self):
+        stats = self.memory.stats()
+        stats['backend_calls'] = self.backend_calls
+        stats['backend_errors'] = self.backend_errors
+        return stats